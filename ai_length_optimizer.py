@@ -1,8 +1,15 @@
 import google.generativeai as genai
 import os
 import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Tuple
 from dotenv import load_dotenv
+from config import OPTIMIZATION_CONFIG
+from model_registry import get_registry
+from length_predictor import log_decision
+from query_cache import PersistentLRUCache, normalize_query
 
 # Load environment variables
 load_dotenv()
@@ -11,6 +18,13 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DECISION_CACHE_KEY = f"length_decision_cache:{OPTIMIZATION_CONFIG['length_decision_cache_path']}"
+DECISION_POOL_KEY = "length_decision_pool"
+
+# Cache keys whose Gemini analysis is running in the background, across sessions
+_pending_decisions = set()
+_pending_lock = threading.Lock()
+
 class AILengthOptimizer:
     """AI-powered response length optimizer using separate Gemini API for cost-effectiveness."""
     
@@ -23,20 +37,61 @@ class AILengthOptimizer:
         
         # Configure separate Gemini instance for optimization
         genai.configure(api_key=self.optimizer_api_key)
-        self.optimizer_model = genai.GenerativeModel('gemini-1.5-flash')
+        self.model_key = "gemini:gemini-1.5-flash"
+        registry = get_registry()
+        self.optimizer_model = registry.acquire(
+            self.model_key,
+            lambda: genai.GenerativeModel('gemini-1.5-flash')
+        )
+        self._release_model = weakref.finalize(self, registry.release, self.model_key)
+        
+        # Decisions memoized across sessions and restarts; misses are filled
+        # in the background by a small shared pool
+        self.decision_cache = None
+        if OPTIMIZATION_CONFIG["enable_length_decision_cache"]:
+            self.decision_cache = registry.acquire(
+                DECISION_CACHE_KEY,
+                lambda: PersistentLRUCache(
+                    OPTIMIZATION_CONFIG["length_decision_cache_path"],
+                    max_size=OPTIMIZATION_CONFIG["length_decision_cache_size"],
+                    ttl_seconds=OPTIMIZATION_CONFIG["length_decision_cache_ttl"]
+                )
+            )
+            self.decision_pool = registry.acquire(
+                DECISION_POOL_KEY,
+                lambda: ThreadPoolExecutor(max_workers=2, thread_name_prefix="length-decision")
+            )
+            self._release_cache = weakref.finalize(self, registry.release, DECISION_CACHE_KEY)
+            self._release_pool = weakref.finalize(self, registry.release, DECISION_POOL_KEY)
         
         # Cost parameters
         self.cost_per_char_tts = 0.000016  # Google TTS cost
         self.cost_per_token_gemini = 0.00000075  # Gemini Flash cost (approximate)
         
-    def analyze_optimal_length(self, user_query: str, context: str = "", conversation_history: list = None) -> Dict:
+    def close(self):
+        """Release this instance's references to the shared optimizer model and decision cache."""
+        self._release_model()
+        if self.decision_cache is not None:
+            self.decision_cache.flush()
+            self._release_cache()
+            self._release_pool()
+    
+    def analyze_optimal_length(self, user_query: str, context: str = "", conversation_history: list = None,
+                               wait: bool = False, timeout: float = None) -> Dict:
         """
         Use AI to determine optimal response length based on information density and cost.
         
+        Decisions are cached by normalized question and conversation stage. On a
+        cache miss the heuristic fallback is returned immediately and Gemini is
+        asked in the background, unless wait is set.
+        
         Args:
             user_query (str): The user's question
             context (str): RAG context available
             conversation_history (list): Previous conversation exchanges
+            wait (bool): On a cache miss, wait for Gemini instead of falling back
+            timeout (float): Seconds to wait for a Gemini call made for this
+                question; background fills are not bounded
             
         Returns:
             Dict: Optimization recommendations
@@ -45,6 +100,37 @@ class AILengthOptimizer:
         # Build conversation context
         history_summary = self._summarize_conversation_history(conversation_history or [])
         
+        if self.decision_cache is None:
+            return self._analyze_remote(user_query, context, history_summary, timeout)
+        
+        key = f"{normalize_query(user_query)}\n{self._history_key(conversation_history or [])}"
+        cached = self.decision_cache.get(key)
+        if cached is not None:
+            return dict(cached, optimization_source='ai_cached')
+        if wait:
+            return self._fill_decision(key, user_query, context, history_summary, timeout)
+        
+        with _pending_lock:
+            already_pending = key in _pending_decisions
+            _pending_decisions.add(key)
+        if not already_pending:
+            self.decision_pool.submit(self._fill_decision, key, user_query, context, history_summary)
+        return self._fallback_optimization(user_query)
+    
+    def _fill_decision(self, key: str, user_query: str, context: str, history_summary: str,
+                       timeout: float = None) -> Dict:
+        """Ask Gemini for a decision and cache it if it was not a fallback."""
+        try:
+            result = self._analyze_remote(user_query, context, history_summary, timeout)
+            if result['optimization_source'] == 'ai_powered':
+                self.decision_cache.put(key, result)
+            return result
+        finally:
+            with _pending_lock:
+                _pending_decisions.discard(key)
+    
+    def _analyze_remote(self, user_query: str, context: str, history_summary: str, timeout: float = None) -> Dict:
+        """Run the Gemini length analysis for one question, giving up on Gemini after timeout seconds."""
         # Create optimization prompt
         optimization_prompt = f"""
 You are a response length optimizer for an AI system simulating J. Robert Oppenheimer. 
@@ -58,7 +144,7 @@ COST CONSIDERATIONS:
 
 CONTEXT ANALYSIS:
 User Query: "{user_query}"
-Available Context: "{context[:500]}..."
+Available Context: {f'"{context[:500]}..."' if context else "(not retrieved yet; judge from the question)"}
 Conversation History: {history_summary}
 
 RESPONSE TYPE CLASSIFICATION:
@@ -91,7 +177,8 @@ Analyze and respond with the optimal length recommendation:
 """
 
         try:
-            response = self.optimizer_model.generate_content(optimization_prompt)
+            request_options = {"timeout": timeout} if timeout is not None else None
+            response = self.optimizer_model.generate_content(optimization_prompt, request_options=request_options)
             
             if response and response.text:
                 # Parse the JSON response
@@ -104,14 +191,33 @@ Analyze and respond with the optimal length recommendation:
                     optimization_data = json.loads(json_match.group())
                     
                     # Validate and sanitize the response
-                    return self._validate_optimization_response(optimization_data, user_query)
+                    result = self._validate_optimization_response(optimization_data, user_query)
+                    if result['optimization_source'] == 'ai_powered':
+                        # Logged decisions are the training data of the local LengthPredictor
+                        log_decision(OPTIMIZATION_CONFIG["length_decision_log"], user_query,
+                                     history_summary, result)
+                    return result
                 else:
                     logger.warning("Failed to parse optimization response, using fallback")
                     return self._fallback_optimization(user_query)
                     
         except Exception as e:
             logger.error(f"AI optimization failed: {e}")
-            return self._fallback_optimization(user_query)
+        return self._fallback_optimization(user_query)
+    
+    @staticmethod
+    def _history_key(history: list) -> str:
+        """
+        Coarse conversation state for the decision cache: how far the
+        conversation has got and the types of the last answers. The question
+        text of earlier turns is left out, so keys repeat across conversations.
+        """
+        if not history:
+            return "new"
+        stage = "early" if len(history) <= 3 else "late"
+        last_types = [getattr(exchange.get('type'), 'value', exchange.get('type'))
+                      for exchange in history[-2:] if isinstance(exchange, dict)]
+        return f"{stage}:{','.join(str(response_type) for response_type in last_types)}"
     
     def _summarize_conversation_history(self, history: list) -> str:
         """Summarize conversation history for context."""
@@ -222,12 +328,15 @@ def test_ai_length_optimizer():
         
         for query in test_queries:
             print(f"\nQuery: {query}")
-            result = optimizer.analyze_optimal_length(query)
+            result = optimizer.analyze_optimal_length(query, wait=True)
             print(f"Type: {result['response_type']}")
             print(f"Optimal length: {result['optimal_min_length']}-{result['optimal_max_length']} chars")
             print(f"Reasoning: {result['reasoning'][:100]}...")
             print(f"Cost: ${result['estimated_cost']:.4f}")
             print(f"Source: {result['optimization_source']}")
+        
+        # Asked again, the same question is answered from the decision cache
+        print(f"\nCached: {optimizer.analyze_optimal_length(test_queries[0])['optimization_source']}")
             
     except Exception as e:
         print(f"Test failed: {e}")
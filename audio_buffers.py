@@ -0,0 +1,151 @@
+import io
+import wave
+import logging
+import threading
+from collections import OrderedDict
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+AUDIO_FORMATS = {
+    "wav": "audio/wav",      # 16-bit PCM at the model's rate (24 kHz for XTTS)
+    "wav16k": "audio/wav",   # 16-bit PCM resampled to 16 kHz, two thirds the size
+    "ogg": "audio/ogg",      # Opus in OGG, needs soundfile with libsndfile >= 1.1
+}
+EXTENSIONS = {"audio/wav": ".wav", "audio/ogg": ".ogg"}
+
+def mime_for_path(path):
+    """MIME type of an audio file from its extension."""
+    return "audio/ogg" if path.lower().endswith(".ogg") else "audio/wav"
+
+def _read_wav(data):
+    import numpy as np
+
+    with wave.open(io.BytesIO(data), "rb") as wav_file:
+        rate = wav_file.getframerate()
+        samples = np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype="<i2")
+    return samples, rate
+
+def _write_wav(samples, rate):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(samples.astype("<i2").tobytes())
+    return buffer.getvalue()
+
+def _resample(samples, rate, target_rate):
+    """Low-pass filter (windowed sinc) and linearly resample 16-bit samples."""
+    import numpy as np
+
+    signal = samples.astype(np.float32)
+    if target_rate < rate:
+        cutoff = 0.45 * target_rate / rate
+        taps = np.arange(-32, 33)
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(len(taps))
+        signal = np.convolve(signal, kernel / kernel.sum(), mode="same")
+    positions = np.arange(int(len(signal) * target_rate / rate)) * (rate / target_rate)
+    resampled = np.interp(positions, np.arange(len(signal)), signal)
+    return np.clip(np.round(resampled), -32768, 32767).astype(np.int16)
+
+def encode_audio(wav_bytes, audio_format="wav"):
+    """
+    Re-encode synthesized WAV audio for the browser.
+
+    Args:
+        wav_bytes (bytes): Mono 16-bit WAV.
+        audio_format (str): One of AUDIO_FORMATS. "ogg" falls back to "wav16k"
+            when Opus encoding is unavailable.
+
+    Returns:
+        Tuple[bytes, str]: The encoded audio and its MIME type.
+    """
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"Unknown audio format: {audio_format}")
+    if audio_format == "wav":
+        return wav_bytes, AUDIO_FORMATS["wav"]
+
+    samples, rate = _read_wav(wav_bytes)
+    if audio_format == "ogg":
+        try:
+            import soundfile
+            buffer = io.BytesIO()
+            soundfile.write(buffer, samples, rate, format="OGG", subtype="OPUS")
+            return buffer.getvalue(), AUDIO_FORMATS["ogg"]
+        except Exception as e:
+            logger.warning(f"Opus encoding unavailable ({e}); using 16 kHz WAV")
+    if rate != 16000:
+        samples = _resample(samples, rate, 16000)
+    return _write_wav(samples, 16000), AUDIO_FORMATS["wav16k"]
+
+class SessionAudioStore:
+    """
+    One session's synthesized audio, kept in memory under a byte budget.
+
+    Audio is stored per message id; when the budget is exceeded the oldest
+    messages lose their audio first. The store lives in the session's state,
+    so it is released with the session.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        """
+        Args:
+            max_bytes (int): Total audio bytes kept for the session.
+        """
+        self.max_bytes = max_bytes
+        self._buffers = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def put(self, message_id, data, mime):
+        with self._lock:
+            self._discard(message_id)
+            self._buffers[message_id] = (data, mime)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(self._buffers) > 1:
+                oldest = next(iter(self._buffers))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def get(self, message_id):
+        """The audio bytes and MIME type of a message, or None."""
+        with self._lock:
+            return self._buffers.get(message_id)
+
+    def _discard(self, message_id):
+        item = self._buffers.pop(message_id, None)
+        if item is not None:
+            self._bytes -= len(item[0])
+
+    def clear(self):
+        with self._lock:
+            self._buffers.clear()
+            self._bytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "messages": len(self._buffers),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+def test_audio_buffers():
+    """Encode a synthetic tone in each format and keep it under a small budget."""
+    import numpy as np
+
+    tone = (np.sin(np.arange(24000 * 2) * 2 * np.pi * 220 / 24000) * 12000).astype(np.int16)
+    wav_bytes = _write_wav(tone, 24000)
+    store = SessionAudioStore(max_bytes=3 * len(wav_bytes) // 2)
+    for i, audio_format in enumerate(AUDIO_FORMATS):
+        data, mime = encode_audio(wav_bytes, audio_format)
+        logger.info(f"{audio_format}: {len(data):,} bytes ({mime})")
+        store.put(f"msg_{i}", data, mime)
+    logger.info(f"Store: {store.get_stats()}")
+
+if __name__ == "__main__":
+    test_audio_buffers()
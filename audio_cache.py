@@ -0,0 +1,204 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads in this process are serialized
+    fcntl = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSION = ".wav"
+LOCK_FILE = ".lock"
+
+def audio_key(text, speaker_hash, model_id, voice_settings):
+    """Content address of a synthesized utterance."""
+    payload = json.dumps(
+        {"text": text.strip(), "speaker": speaker_hash, "model": model_id, "voice": voice_settings},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class AudioCache:
+    """
+    Content-addressed store of synthesized audio files with a size cap.
+
+    Files are named by audio_key(), so identical text in the same voice and
+    settings is synthesized once. Recency is the file's modification time,
+    refreshed on every hit, so LRU order survives restarts without an index.
+    Writes go to a temporary file that is renamed into place.
+
+    The directory may be shared by several app processes. Lookups go to the
+    file itself, and every write re-scans the directory under a file lock
+    before evicting, so the size cap covers all processes' files.
+    """
+
+    def __init__(self, path, max_bytes=500 * 1024 * 1024):
+        """
+        Args:
+            path (str): Directory holding the audio files.
+            max_bytes (int): Total size above which least recently used files are evicted.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # key -> (size, last used), as of the last scan of the directory
+        self._entries = {}
+        self._bytes = 0
+        with self._locked():
+            self._scan()
+
+    def _file(self, key):
+        return os.path.join(self.path, key + AUDIO_EXTENSION)
+
+    @contextmanager
+    def _locked(self):
+        """Serialize access across threads and, where supported, processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.path, LOCK_FILE), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _scan(self):
+        """Rebuild the index from the directory, including other processes' files."""
+        entries = {}
+        for name in os.listdir(self.path):
+            if not name.endswith(AUDIO_EXTENSION):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except FileNotFoundError:
+                continue
+            entries[name[:-len(AUDIO_EXTENSION)]] = (stat.st_size, stat.st_mtime)
+        self._entries = entries
+        self._bytes = sum(size for size, _ in entries.values())
+
+    def get(self, key):
+        """Path of the cached audio for a key, or None on a miss."""
+        with self._lock:
+            path = self._file(key)
+            try:
+                os.utime(path)
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Never written, or evicted by this or another process
+                if key in self._entries:
+                    self._bytes -= self._entries.pop(key)[0]
+                self.misses += 1
+                return None
+            if key not in self._entries:
+                self._bytes += stat.st_size
+            self._entries[key] = (stat.st_size, stat.st_mtime)
+            self.hits += 1
+            return path
+
+    def put(self, key, source_path):
+        """Copy an audio file into the cache; returns the cached path."""
+        return self._store(key, lambda tmp_path: shutil.copyfile(source_path, tmp_path))
+
+    def put_bytes(self, key, data):
+        """Write audio bytes into the cache; returns the cached path."""
+        def write(tmp_path):
+            with open(tmp_path, "wb") as file:
+                file.write(data)
+        return self._store(key, write)
+
+    def _store(self, key, write):
+        path = self._file(key)
+        tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not cache audio: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+
+        with self._locked():
+            self._scan()
+            self._evict(keep=key)
+        return path
+
+    def _evict(self, keep):
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = min((key for key in self._entries if key != keep), key=lambda key: self._entries[key][1])
+            size, _ = self._entries.pop(oldest)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._file(oldest))
+            except OSError:
+                pass
+
+    def clear(self):
+        """Remove every cached file."""
+        with self._locked():
+            self._scan()
+            for key in list(self._entries):
+                try:
+                    os.remove(self._file(key))
+                except OSError:
+                    pass
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self):
+        """Hit rate of this process and disk usage as of the last write."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "disk_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+def test_audio_cache():
+    """Store, hit and evict small fake audio files."""
+    import tempfile
+
+    directory = tempfile.mkdtemp(prefix="audio_cache_")
+    try:
+        cache = AudioCache(os.path.join(directory, "cache"), max_bytes=2500)
+        keys = []
+        for i in range(3):
+            source = os.path.join(directory, f"source_{i}.wav")
+            with open(source, "wb") as file:
+                file.write(os.urandom(1000))
+            key = audio_key(f"Utterance {i}", "speaker", "model", {"rate": 24000})
+            cache.put(key, source)
+            keys.append(key)
+        logger.info(f"Oldest evicted: {cache.get(keys[0]) is None}, newest cached: {cache.get(keys[2]) is not None}")
+        logger.info(f"Reopened cache entries: {AudioCache(cache.path, 2500).get_stats()['entries']}")
+        # Another process's write counts towards the same cap
+        other = AudioCache(cache.path, max_bytes=2500)
+        other.put_bytes(audio_key("Utterance 3", "speaker", "model", {"rate": 24000}), os.urandom(1000))
+        logger.info(f"Entries after another instance's write: {AudioCache(cache.path, 2500).get_stats()['entries']} (cap 2)")
+        logger.info(f"Stats: {cache.get_stats()}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    test_audio_cache()
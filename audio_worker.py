@@ -0,0 +1,190 @@
+import time
+import uuid
+import queue
+import itertools
+import logging
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+AUDIO_WORKER_KEY = "audio_worker"
+JOB_STATES = ("queued", "running", "done", "failed", "cancelled")
+# Queued jobs run lowest priority first, in submission order within a priority
+PRIORITY_ANSWER = 0
+PRIORITY_BACKGROUND = 1
+
+class AudioSynthesisWorker:
+    """
+    Background thread that owns the TTS model and synthesizes queued texts.
+
+    Sessions submit a text and get a job id back straight away; the UI polls
+    status() on later runs instead of blocking on synthesis. Jobs run one at
+    a time (the model is not safe for concurrent inference anyway), in
+    submission order, except that background jobs (PRIORITY_BACKGROUND) only
+    start while no answer is waiting. Cancelling a queued job drops it; a running job stops
+    after the segment being synthesized.
+    """
+
+    def __init__(self, tts_factory=None):
+        """
+        Args:
+            tts_factory (Callable): Builds the TTS service; defaults to LocalTTS.
+        """
+        if tts_factory is None:
+            from local_tts_service import LocalTTS
+            tts_factory = LocalTTS
+        self.tts = tts_factory()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._thread = threading.Thread(target=self._run, name="audio-synthesis", daemon=True)
+        self._thread.start()
+
+    def submit(self, text, session_id=None, audio_format=None, priority=PRIORITY_ANSWER):
+        """
+        Queue a text for synthesis.
+
+        Args:
+            text (str): The text to be synthesized.
+            session_id (str): Owner of the job, for cancel_session.
+            audio_format (str): Encoding of the result (see audio_buffers.AUDIO_FORMATS).
+            priority (int): PRIORITY_ANSWER, or PRIORITY_BACKGROUND for work
+                nobody is waiting on.
+
+        Returns:
+            str: The job id.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._jobs[job_id] = {
+                "id": job_id,
+                "session_id": session_id,
+                "text": text,
+                "audio_format": audio_format,
+                "state": "queued",
+                "audio": None,
+                "mime": None,
+                "error": None,
+                "submitted": time.time(),
+                "synthesis_ms": None,
+                "cancel_requested": False,
+            }
+        self._queue.put((priority, next(self._order), job_id))
+        return job_id
+
+    def status(self, job_id):
+        """A snapshot of a job (state, audio bytes and mime, error, synthesis_ms), or None if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def wait(self, job_id, timeout=None, poll_seconds=0.1):
+        """Block until a job has finished (or timeout seconds pass) and return its status."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.status(job_id)
+            if job is None or job["state"] not in ("queued", "running"):
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(poll_seconds)
+
+    def cancel(self, job_id):
+        """Cancel a job that has not finished; returns whether it was still pending."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["state"] not in ("queued", "running"):
+                return False
+            job["cancel_requested"] = True
+            if job["state"] == "queued":
+                job["state"] = "cancelled"
+            return True
+
+    def cancel_session(self, session_id):
+        """Cancel a session's unfinished jobs and forget all of its jobs."""
+        with self._lock:
+            job_ids = [job_id for job_id, job in self._jobs.items() if job["session_id"] == session_id]
+        cancelled = sum(self.cancel(job_id) for job_id in job_ids)
+        for job_id in job_ids:
+            self.forget(job_id)
+        if cancelled:
+            logger.info(f"Cancelled {cancelled} audio jobs of session {session_id}")
+        return cancelled
+
+    def forget(self, job_id):
+        """Drop a job's record once its result has been collected."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            # A running job is only marked; the worker drops it when it stops
+            if job is not None and job["state"] != "running":
+                del self._jobs[job_id]
+
+    def get_stats(self):
+        """Number of jobs in each state."""
+        with self._lock:
+            counts = {state: 0 for state in JOB_STATES}
+            for job in self._jobs.values():
+                counts[job["state"]] += 1
+        return counts
+
+    def shutdown(self):
+        """Stop the worker thread once the jobs queued so far have run."""
+        self._queue.put((float("inf"), next(self._order), None))
+
+    def _run(self):
+        while True:
+            _, _, job_id = self._queue.get()
+            if job_id is None:
+                return
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job["state"] != "queued":
+                    continue
+                job["state"] = "running"
+                text, audio_format = job["text"], job["audio_format"]
+
+            start = time.perf_counter()
+            try:
+                result = self.tts.synthesize_audio(text, audio_format, cancelled=lambda: job["cancel_requested"])
+                error = None if result or job["cancel_requested"] else "synthesis failed"
+            except Exception as e:
+                logger.error(f"Audio job {job_id} failed: {e}")
+                result, error = None, str(e)
+
+            with self._lock:
+                job["synthesis_ms"] = (time.perf_counter() - start) * 1000
+                job["audio"], job["mime"] = result or (None, None)
+                job["error"] = error
+                if job["cancel_requested"]:
+                    job["state"] = "cancelled"
+                    # cancel_session already tried to forget it while it was running
+                    self._jobs.pop(job_id, None)
+                else:
+                    job["state"] = "failed" if error else "done"
+
+def test_audio_worker():
+    """Queue jobs on a fake TTS service, cancel one, and poll the rest."""
+    class FakeTTS:
+        def synthesize_audio(self, text, audio_format=None, cancelled=None):
+            time.sleep(0.2)
+            return None if cancelled and cancelled() else (text.encode(), "audio/wav")
+
+    worker = AudioSynthesisWorker(tts_factory=FakeTTS)
+    first = worker.submit("First answer.", session_id="a")
+    background = worker.submit("Pooled introduction.", session_id="pool", priority=PRIORITY_BACKGROUND)
+    second = worker.submit("Second answer.", session_id="a")
+    other = worker.submit("Another session.", session_id="b")
+    worker.cancel(second)
+    worker.wait(other)
+    # Submitted before the other session's answer, the background job only starts after it
+    logger.info(f"First: {worker.status(first)['state']}, second: {worker.status(second)['state']}, "
+                f"other: {worker.status(other)['state']}, background: {worker.status(background)['state']}")
+    worker.wait(background)
+    logger.info(f"Stats: {worker.get_stats()}")
+    worker.shutdown()
+
+if __name__ == "__main__":
+    test_audio_worker()
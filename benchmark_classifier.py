@@ -0,0 +1,147 @@
+"""
+Throughput benchmark for the ResponseOptimizer query classifier.
+
+Compares the previous classifier (one re.findall per pattern, about 20 per
+query) with the single-scan QueryClassifier, one query at a time and in
+batches via classify_many, and checks that both agree.
+
+Usage:
+    python benchmark_classifier.py [--queries 20000] [--repeats 3]
+"""
+import argparse
+import random
+import re
+import time
+
+from response_optimizer import ResponseOptimizer, ResponseType
+
+# The classifier's patterns before they were compiled into one scanner
+LEGACY_RESPONSE_PATTERNS = {
+    ResponseType.SIMPLE_FACT: [
+        r'\b(when|where|who|what year|how old|born|died)\b',
+        r'\b(yes|no)\b questions',
+        r'\b(name|date|location)\b'
+    ],
+    ResponseType.PHILOSOPHICAL: [
+        r'\b(think|feel|believe|philosophy|moral|ethics|regret)\b',
+        r'\b(bhagavad|gita|meaning|purpose|responsibility)\b',
+        r'\b(why|should|ought|right|wrong)\b'
+    ],
+    ResponseType.HISTORICAL_NARRATIVE: [
+        r'\b(tell me about|describe|what happened|story|experience)\b',
+        r'\b(trinity|los alamos|manhattan project|bomb|war)\b',
+        r'\b(relationship|worked with|knew)\b'
+    ],
+    ResponseType.PERSONAL_REFLECTION: [
+        r'\b(how did you feel|personal|private|family|emotions)\b',
+        r'\b(guilt|pride|fear|hope|regret|memory)\b'
+    ],
+    ResponseType.SCIENTIFIC_EXPLANATION: [
+        r'\b(physics|quantum|nuclear|atoms|science|theory)\b',
+        r'\b(explain|how does|mechanism|process)\b'
+    ],
+    ResponseType.GREETING: [
+        r'\b(hello|hi|who are you|introduce|meet)\b'
+    ]
+}
+LEGACY_SIMPLE_INDICATORS = [
+    r'\b(when|where|who|what year|how old|born|died)\b',
+    r'\b(yes|no)\b',
+    r'\b(name|date|location)\b',
+    r'^(who|what|when|where)\s+\w+\s*\?*$'
+]
+LEGACY_COMPLEX_INDICATORS = [
+    r'\b(why|how|explain|describe|tell me about|what was.*like)\b',
+    r'\b(relationship|experience|thoughts|feelings|philosophy)\b',
+    r'\b(compare|contrast|difference|similar)\b',
+    r'\s+and\s+',
+    r'\?.*\?'
+]
+
+SUBJECTS = [
+    "the Trinity test", "Los Alamos", "the Manhattan Project", "your childhood", "Einstein",
+    "quantum theory", "the hydrogen bomb", "Edward Teller", "your security hearing", "Kitty",
+    "the Bhagavad Gita", "nuclear fission", "Göttingen", "your brother Frank", "Hiroshima",
+]
+TEMPLATES = [
+    "When did you first hear about {}?", "Tell me about {}.", "What do you think about {}?",
+    "How did you feel about {}?", "Explain {} to me.", "Describe {} and why it mattered.",
+    "Do you regret {}?", "What was {} like?", "Who introduced you to {}?", "{}?",
+    "How does {} compare with what came before? And what came after?",
+    "Hello, who are you and what did {} mean to you?",
+]
+
+def legacy_classify_query(query):
+    query_lower = query.lower()
+    scores = {
+        response_type: sum(len(re.findall(pattern, query_lower)) for pattern in patterns)
+        for response_type, patterns in LEGACY_RESPONSE_PATTERNS.items()
+    }
+    if max(scores.values()) == 0:
+        return ResponseType.HISTORICAL_NARRATIVE
+    return max(scores, key=scores.get)
+
+def legacy_query_complexity(query):
+    query_lower = query.lower()
+    simple_score = sum(len(re.findall(pattern, query_lower)) for pattern in LEGACY_SIMPLE_INDICATORS)
+    complex_score = sum(len(re.findall(pattern, query_lower)) for pattern in LEGACY_COMPLEX_INDICATORS)
+    if len(query) > 100:
+        complex_score += 1
+    elif len(query) < 20:
+        simple_score += 1
+    if complex_score > simple_score:
+        return 'complex'
+    elif simple_score > complex_score:
+        return 'simple'
+    return 'medium'
+
+def make_queries(count, seed=0):
+    rng = random.Random(seed)
+    return [rng.choice(TEMPLATES).format(rng.choice(SUBJECTS)) for _ in range(count)]
+
+def _best_of(repeats, function):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run_benchmark(count=20000, repeats=3):
+    """Print per-query and batch throughput of the old and new classifiers."""
+    optimizer = ResponseOptimizer()
+    classifier = optimizer.classifier
+    queries = make_queries(count)
+
+    legacy = [(legacy_classify_query(query), legacy_query_complexity(query)) for query in queries]
+    current = [(optimizer.classify_query(query), optimizer._analyze_query_complexity(query)) for query in queries]
+    batch = classifier.score_many(queries)
+    batched = [(classifier.response_type(row), classifier.complexity(row)) for row in batch]
+    print(f"{count} generated queries; agreement with the previous classifier: "
+          f"{sum(a == b for a, b in zip(legacy, current)) / count:.2%} (single), "
+          f"{sum(a == b for a, b in zip(legacy, batched)) / count:.2%} (batch)")
+
+    variants = [
+        ("previous (re.findall per pattern)",
+         lambda: [(legacy_classify_query(q), legacy_query_complexity(q)) for q in queries]),
+        ("single scan, type + complexity",
+         lambda: [(optimizer.classify_query(q), optimizer._analyze_query_complexity(q)) for q in queries]),
+        ("single scan, shared scores",
+         lambda: [(classifier.response_type(s), classifier.complexity(s))
+                  for s in map(classifier.score, queries)]),
+        ("classify_many (score matrices)", lambda: optimizer.classify_many(queries)),
+    ]
+    print(f"\n{'classifier':<36}{'us/query':>10}{'queries/s':>12}{'speedup':>9}")
+    print("-" * 67)
+    baseline = None
+    for label, function in variants:
+        seconds = _best_of(repeats, function)
+        baseline = baseline or seconds
+        print(f"{label:<36}{seconds / count * 1e6:>10.2f}{count / seconds:>12,.0f}{baseline / seconds:>8.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", type=int, default=20000, help="Number of generated queries")
+    parser.add_argument("--repeats", type=int, default=3, help="Timing runs per variant (best is reported)")
+    args = parser.parse_args()
+    run_benchmark(args.queries, args.repeats)
@@ -0,0 +1,109 @@
+"""
+Per-query latency and memory benchmark of the query embedding backends.
+
+Every variant is loaded in its own Python process, so the reported RSS is
+what that backend costs on its own. Agreement is the mean cosine similarity
+of each variant's query embeddings with the first variant that loaded (the
+torch model when it is installed).
+
+Usage:
+    python benchmark_embeddings.py [--repeats 20] [--threads 1]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmark_retrieval import LABELED_QUERIES, _percentile
+
+# (label, embedding backend, int8 quantization)
+VARIANTS = [
+    ("torch", "torch", False),
+    ("onnx", "onnx", False),
+    ("onnx-int8", "onnx", True),
+]
+
+def _load_function(backend, quantize, threads):
+    if backend == "torch":
+        from rag_system import _create_torch_embedding_function
+        return _create_torch_embedding_function()
+    from onnx_embedder import OnnxEmbeddingFunction
+    return OnnxEmbeddingFunction(quantize=quantize, num_threads=threads)
+
+def run_variant(backend, quantize, threads, repeats):
+    """Load one backend in this process and time single-query embedding calls."""
+    from model_registry import _current_rss_bytes
+
+    queries = [query for query, _ in LABELED_QUERIES]
+    rss_before = _current_rss_bytes()
+    start = time.perf_counter()
+    function = _load_function(backend, quantize, threads)
+    function(queries[:1])
+    load_ms = (time.perf_counter() - start) * 1000
+
+    latencies = []
+    for query in queries:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            function([query])
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "load_ms": load_ms,
+        "rss_mb": _current_rss_bytes() / 1e6,
+        "model_rss_mb": (_current_rss_bytes() - rss_before) / 1e6,
+        "mean_ms": statistics.mean(latencies),
+        "p50_ms": _percentile(latencies, 0.5),
+        "p95_ms": _percentile(latencies, 0.95),
+        "embeddings": function(queries),
+    }
+
+def _run_in_subprocess(backend, quantize, threads, repeats):
+    command = [sys.executable, __file__, "--worker", backend, "--repeats", str(repeats)]
+    if quantize:
+        command.append("--quantize")
+    if threads:
+        command += ["--threads", str(threads)]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        error = (result.stderr.strip().splitlines() or ["unknown error"])[-1]
+        print(f"  ({backend}{'-int8' if quantize else ''} unavailable: {error})")
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def benchmark_embeddings(repeats=20, threads=None):
+    """Compare load time, RSS and per-query latency of the embedding backends."""
+    rows = []
+    for label, backend, quantize in VARIANTS:
+        row = _run_in_subprocess(backend, quantize, None if backend == "torch" else threads, repeats)
+        if row is not None:
+            rows.append((label, row))
+    if not rows:
+        return
+
+    reference = np.asarray(rows[0][1]["embeddings"])
+    print(f"{'backend':<11}{'load ms':>9}{'RSS MB':>9}{'model MB':>10}{'query ms':>10}"
+          f"{'p95 ms':>9}{'agreement':>11}")
+    print("-" * 69)
+    for label, row in rows:
+        embeddings = np.asarray(row["embeddings"])
+        agreement = float(np.mean(np.sum(embeddings * reference, axis=1)))
+        print(f"{label:<11}{row['load_ms']:>9.0f}{row['rss_mb']:>9.0f}{row['model_rss_mb']:>10.0f}"
+              f"{row['mean_ms']:>10.2f}{row['p95_ms']:>9.2f}{agreement:>11.4f}")
+    print(f"(agreement: mean cosine with {rows[0][0]})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=20, help="Timed runs per query")
+    parser.add_argument("--threads", type=int, help="ONNX Runtime intra-op threads")
+    parser.add_argument("--worker", choices=["torch", "onnx"], help=argparse.SUPPRESS)
+    parser.add_argument("--quantize", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        print(json.dumps(run_variant(args.worker, args.quantize, args.threads, args.repeats)))
+    else:
+        benchmark_embeddings(args.repeats, args.threads)
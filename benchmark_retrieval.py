@@ -0,0 +1,221 @@
+"""
+Latency and recall benchmark for the knowledge base retrieval modes and vector backends.
+
+Usage:
+    python benchmark_retrieval.py [--repeats 20] [--backends]
+    python benchmark_retrieval.py --compression [--scale 1000]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from rag_system import (
+    OppenheimerRAG, RETRIEVAL_MODES, VECTOR_BACKENDS,
+    CHROMA_PATH, NUMPY_INDEX_PATH, COLLECTION_NAME, TEST_QUERIES
+)
+from vector_store import NumpyVectorStore, EMBEDDINGS_FILE, CHUNKS_FILE
+
+# (label, NumpyVectorStore options) for the compact storage comparison
+COMPRESSION_VARIANTS = [
+    ("float32", {}),
+    ("int8", {"compression": "int8"}),
+    ("int8+pca128", {"compression": "int8", "projection_dim": 128}),
+    ("int8+pca64", {"compression": "int8", "projection_dim": 64}),
+]
+
+# (query, keywords) pairs: a hit is any top-k chunk containing one of the keywords
+LABELED_QUERIES = [
+    ("What did Oppenheimer say about the Trinity test?", ["Trinity"]),
+    ("Tell me about Oppenheimer's childhood and education", ["Harvard", "Ethical Culture"]),
+    ("What was Oppenheimer's role in the Manhattan Project?", ["Manhattan Project"]),
+    ("What did Oppenheimer think about the hydrogen bomb?", ["hydrogen bomb"]),
+    ("Ethical Culture School", ["Ethical Culture"]),
+    ("1954 hearing", ["1954"]),
+    ("Bhagavad Gita verses", ["Gita"]),
+    ("Lewis Strauss", ["Strauss"]),
+    ("Göttingen doctorate", ["Göttingen"]),
+    ("Edward Teller", ["Teller"]),
+]
+
+def _is_hit(results, keywords):
+    return any(
+        keyword.lower() in result['content'].lower()
+        for result in results
+        for keyword in keywords
+    )
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def benchmark_mode(rag, mode, repeats, n_results=5):
+    """Measure uncached per-query latency and recall@k for one retrieval mode."""
+    latencies = []
+    hits = 0
+    for query, keywords in LABELED_QUERIES:
+        for _ in range(repeats):
+            # Clear both cache levels so every call pays the full retrieval cost
+            rag.cache.embeddings.clear()
+            rag.cache.results.clear()
+            start = time.perf_counter()
+            results = rag.search_knowledge(query, n_results=n_results, mode=mode)
+            latencies.append((time.perf_counter() - start) * 1000)
+        hits += _is_hit(results, keywords)
+
+    return {
+        "mode": mode,
+        "mean_ms": statistics.mean(latencies),
+        "p50_ms": _percentile(latencies, 0.5),
+        "p95_ms": _percentile(latencies, 0.95),
+        "recall_at_k": hits / len(LABELED_QUERIES),
+    }
+
+def benchmark_retrieval(repeats=20):
+    """Run every retrieval mode over the labeled queries and print a summary table."""
+    rag = OppenheimerRAG()
+    # Warm up the embedding model so its load time is not counted as query latency
+    rag.search_knowledge(LABELED_QUERIES[0][0], mode="vector")
+
+    print(f"{'mode':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'recall@5':>10}")
+    print("-" * 50)
+    for mode in RETRIEVAL_MODES:
+        row = benchmark_mode(rag, mode, repeats)
+        print(f"{row['mode']:<10}{row['mean_ms']:>10.2f}{row['p50_ms']:>10.2f}"
+              f"{row['p95_ms']:>10.2f}{row['recall_at_k']:>10.2f}")
+
+# Opens each backend's store from scratch; run in a fresh interpreter so imports count too
+COLD_OPEN_SNIPPETS = {
+    "chroma": "import chromadb; store = chromadb.PersistentClient(path={path!r}).get_collection({name!r})",
+    "numpy": "from vector_store import NumpyVectorStore; store = NumpyVectorStore({path!r})",
+}
+
+def _cold_open(backend):
+    """Time a cold open of a backend's vector store in a fresh Python process."""
+    path = CHROMA_PATH if backend == "chroma" else NUMPY_INDEX_PATH
+    code = (
+        "import json, time; start = time.perf_counter(); "
+        + COLD_OPEN_SNIPPETS[backend].format(path=path, name=COLLECTION_NAME)
+        + "; print(json.dumps({'open_ms': (time.perf_counter() - start) * 1000, "
+          "'chunks': store.count()}))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1]
+    return json.loads(output)
+
+def benchmark_backends(repeats=20):
+    """Compare cold-open time and exact vector query latency of the vector backends."""
+    rags = {backend: OppenheimerRAG(backend=backend) for backend in VECTOR_BACKENDS}
+    queries = [query for query, _ in LABELED_QUERIES]
+    embeddings = rags["chroma"].embed_queries(queries)
+
+    print(f"{'backend':<10}{'cold open ms':>14}{'query ms':>10}{'p95 ms':>10}{'top-5 overlap':>15}")
+    print("-" * 59)
+    reference = None
+    for backend, rag in rags.items():
+        cold = _cold_open(backend)
+
+        latencies = []
+        for embedding in embeddings:
+            for _ in range(repeats):
+                start = time.perf_counter()
+                rag._vector_search_many([embedding], 5)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        top_ids = [[hit['id'] for hit in hits] for hits in rag._vector_search_many(embeddings, 5)]
+        if reference is None:
+            reference = top_ids
+        overlap = statistics.mean(
+            len(set(ids) & set(ref)) / max(1, len(ref)) for ids, ref in zip(top_ids, reference)
+        )
+        print(f"{backend:<10}{cold['open_ms']:>14.1f}{statistics.mean(latencies):>10.3f}"
+              f"{_percentile(latencies, 0.95):>10.3f}{overlap:>15.2f}")
+
+def _make_scaled_store(directory, scale):
+    """Copy the numpy index into directory, tiled scale times with small noise."""
+    source = NumpyVectorStore(NUMPY_INDEX_PATH)
+    matrix = np.asarray(source._matrix, dtype=np.float32)
+    if scale <= 1:
+        for name in (EMBEDDINGS_FILE, CHUNKS_FILE):
+            shutil.copy(os.path.join(NUMPY_INDEX_PATH, name), os.path.join(directory, name))
+        return
+
+    rng = np.random.default_rng(0)
+    tiled = np.vstack([matrix] + [
+        matrix + rng.normal(scale=0.05, size=matrix.shape).astype(np.float32)
+        for _ in range(scale - 1)
+    ])
+    ids = [f"{doc_id}#{copy}" for copy in range(scale) for doc_id in source.ids]
+    NumpyVectorStore(directory).upsert(
+        ids,
+        source.documents * scale,
+        source.metadatas * scale,
+        embeddings=tiled
+    )
+
+def benchmark_compression(repeats=20, scale=1):
+    """
+    Compare float32 and compact int8 (optionally PCA-projected) vector storage:
+    bytes scanned per query, query latency and recall@5 against exact float32
+    search, on the test_rag_system queries.
+    """
+    rag = OppenheimerRAG(backend="numpy")
+    queries = rag.embed_queries(TEST_QUERIES)
+
+    workdir = tempfile.mkdtemp(prefix="compression_bench_")
+    try:
+        _make_scaled_store(workdir, scale)
+        exact_ids = None
+        baseline = None
+        print(f"Corpus: {NumpyVectorStore(workdir).count()} vectors "
+              f"({len(TEST_QUERIES)} test queries, {repeats} repeats)")
+        print(f"{'storage':<14}{'scan bytes':>12}{'saved':>8}{'query ms':>10}{'speedup':>9}{'recall@5':>10}")
+        print("-" * 63)
+        for label, options in COMPRESSION_VARIANTS:
+            store = NumpyVectorStore(workdir, **options)
+            scan_bytes = store.compact.nbytes if store.compact is not None else store._matrix.nbytes
+
+            latencies = []
+            for query in queries:
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    store.query([query], n_results=5)
+                    latencies.append((time.perf_counter() - start) * 1000)
+            top_ids = store.query(queries, n_results=5)["ids"]
+
+            if baseline is None:
+                baseline = (scan_bytes, statistics.mean(latencies))
+                exact_ids = top_ids
+            recall = statistics.mean(
+                len(set(ids) & set(exact)) / len(exact) for ids, exact in zip(top_ids, exact_ids)
+            )
+            mean_ms = statistics.mean(latencies)
+            print(f"{label:<14}{scan_bytes:>12,}{1 - scan_bytes / baseline[0]:>8.0%}"
+                  f"{mean_ms:>10.3f}{baseline[1] / mean_ms:>8.1f}x{recall:>10.2f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=20, help="Timed runs per query")
+    parser.add_argument("--backends", action="store_true",
+                        help="Compare the chroma and numpy vector backends instead of retrieval modes")
+    parser.add_argument("--compression", action="store_true",
+                        help="Compare float32 and int8/PCA vector storage on the numpy backend")
+    parser.add_argument("--scale", type=int, default=1,
+                        help="Tile the corpus this many times (with noise) for --compression")
+    args = parser.parse_args()
+    if args.compression:
+        benchmark_compression(args.repeats, args.scale)
+    elif args.backends:
+        benchmark_backends(args.repeats)
+    else:
+        benchmark_retrieval(args.repeats)
@@ -0,0 +1,102 @@
+"""
+Startup import-time report for the Streamlit entry point.
+
+Imports a module in a fresh interpreter under ``python -X importtime`` and
+prints the slowest imports by cumulative time, plus which of the heavy model
+libraries were loaded. Everything imported before ``main()`` runs delays the
+first paint of the page.
+
+Usage:
+    python benchmark_startup.py [--module main] [--top 15] [--compare REF]
+
+With --compare, the same module is also imported from a checkout of the given
+git ref (e.g. the commit before the lazy-import change) to show the difference.
+"""
+import argparse
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# Libraries that should only load once a session needs them
+HEAVY_MODULES = ["torch", "TTS", "chromadb", "langchain", "sentence_transformers", "google.generativeai"]
+
+def measure_imports(module, cwd=None):
+    """
+    Import a module in a fresh interpreter and parse the -X importtime output.
+
+    Returns:
+        List[Dict]: One entry per imported module with name, depth, self_us
+            and cumulative_us.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=cwd
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # Nested imports are indented two spaces per level after the leading space
+        name = name.rstrip()[1:]
+        entries.append({
+            "name": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+        })
+    return entries
+
+def _total_us(entries):
+    # Cumulative times of the top-level imports add up to the whole import
+    return sum(entry["cumulative_us"] for entry in entries if entry["depth"] == 0)
+
+def _checkout(ref):
+    """Extract the tree at a git ref into a temporary directory."""
+    directory = tempfile.mkdtemp(prefix="startup_bench_")
+    archive = subprocess.run(["git", "archive", ref], capture_output=True, check=True).stdout
+    subprocess.run(["tar", "-x", "-C", directory], input=archive, check=True)
+    return directory
+
+def startup_report(module="main", top=15, compare=None):
+    """Print the total import time of a module and its most expensive imports."""
+    entries = measure_imports(module)
+    names = {entry["name"] for entry in entries}
+    total_us = _total_us(entries)
+
+    print(f"import {module}: {total_us / 1000:.1f} ms, {len(entries)} modules")
+    print()
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    print("-" * 50)
+    for entry in sorted(entries, key=lambda entry: entry["cumulative_us"], reverse=True)[:top]:
+        print(f"{entry['cumulative_us'] / 1000:>14.1f}{entry['self_us'] / 1000:>10.1f}  {entry['name'].strip()}")
+
+    print()
+    print("Heavy libraries loaded at import:")
+    for heavy in HEAVY_MODULES:
+        print(f"  {heavy:<24}{'yes' if heavy in names else 'no (deferred)'}")
+
+    if compare:
+        directory = _checkout(compare)
+        try:
+            baseline = measure_imports(module, cwd=directory)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        baseline_us = _total_us(baseline)
+        print()
+        print(f"import {module} at {compare}: {baseline_us / 1000:.1f} ms, {len(baseline)} modules")
+        print(f"Saved: {(baseline_us - total_us) / 1000:.1f} ms "
+              f"({1 - total_us / max(1, baseline_us):.0%}), {len(baseline) - len(entries)} fewer modules")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="main", help="Module to import")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to list")
+    parser.add_argument("--compare", metavar="REF",
+                        help="Also measure the import at this git ref, e.g. HEAD~1")
+    args = parser.parse_args()
+    startup_report(args.module, args.top, args.compare)
@@ -0,0 +1,79 @@
+"""
+Per-utterance latency benchmark for local XTTS synthesis.
+
+Compares conditioning on the reference clip on every call (what tts_to_file
+does) with the cached speaker conditioning LocalTTS now uses, and reports
+the one-off cost of computing and loading that conditioning.
+
+Usage:
+    python benchmark_tts.py [--repeats 3] [--reference-seconds 10]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from local_tts_service import LocalTTS, compute_speaker_conditioning, load_speaker_conditioning, to_pcm16
+
+UTTERANCES = [
+    "Now I am become Death, the destroyer of worlds.",
+    "We knew the world would not be the same.",
+    "The optimistic thinks this is the best of all possible worlds, and the pessimist fears it is true.",
+    "In some sort of crude sense, which no vulgarity, no humor, no overstatement can quite extinguish, "
+    "the physicists have known sin.",
+]
+
+def _time_utterances(tts, repeats):
+    latencies, audio_seconds = [], 0.0
+    for _ in range(repeats):
+        for text in UTTERANCES:
+            start = time.perf_counter()
+            pcm = to_pcm16(tts._synthesize_segment(text))
+            latencies.append((time.perf_counter() - start) * 1000)
+            audio_seconds += len(pcm) / 2 / tts.sample_rate
+    return latencies, sum(latencies) / 1000 / audio_seconds
+
+def run_benchmark(repeats=3, reference_seconds=None):
+    """Print per-utterance latency with and without cached conditioning."""
+    tts = LocalTTS()
+    if tts.conditioning is None:
+        print("Cached conditioning is unavailable (see TTS_CONFIG['cache_speaker_latents'])")
+        return
+    xtts, cached = tts._xtts, tts.conditioning
+
+    # One-off costs: computing conditioning from the clip, and loading it from disk
+    cache_dir = tempfile.mkdtemp(prefix="voice_cache_")
+    try:
+        for seconds in dict.fromkeys([None, reference_seconds]):
+            start = time.perf_counter()
+            compute_speaker_conditioning(xtts, tts.speaker_wav, seconds)
+            label = f"{seconds:g} s" if seconds else "default"
+            print(f"Compute conditioning ({label} reference): {(time.perf_counter() - start) * 1000:.0f} ms")
+        load_speaker_conditioning(xtts, tts.speaker_wav, cache_dir, reference_seconds, tts.device)
+        start = time.perf_counter()
+        load_speaker_conditioning(xtts, tts.speaker_wav, cache_dir, reference_seconds, tts.device)
+        print(f"Load cached conditioning from disk: {(time.perf_counter() - start) * 1000:.1f} ms\n")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print(f"{'variant':<32}{'mean ms':>9}{'p95 ms':>9}{'RTF':>7}")
+    print("-" * 57)
+    for label, conditioning in (("speaker_wav on every call", None), ("cached conditioning", cached)):
+        tts.conditioning = conditioning
+        tts._synthesize_segment(UTTERANCES[0])  # warm-up
+        latencies, rtf = _time_utterances(tts, repeats)
+        p95 = sorted(latencies)[int(0.95 * (len(latencies) - 1))]
+        print(f"{label:<32}{statistics.mean(latencies):>9.0f}{p95:>9.0f}{rtf:>7.2f}")
+    tts.conditioning = cached
+    tts.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=3, help="Passes over the sample utterances")
+    parser.add_argument("--reference-seconds", type=float, default=10,
+                        help="Shorter reference duration to compare against the default")
+    args = parser.parse_args()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    run_benchmark(args.repeats, args.reference_seconds)
@@ -0,0 +1,133 @@
+"""
+Real-time factor, load time and memory of the CPU XTTS inference modes.
+
+Every mode is loaded in its own CPU-only Python process, so the reported RSS
+is what that mode costs on its own, and load time includes quantization,
+compilation and warm-up. Each sample utterance is synthesized with a fixed
+seed. Sampling makes outputs differ in length between modes, so fidelity is
+checked on the long-term average log spectrum: the mean dB difference from
+the fp32 run. fp32 with another seed is included as the noise floor.
+
+Usage:
+    python benchmark_tts_modes.py [--repeats 2] [--threads 4]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmark_tts import UTTERANCES
+
+# (label, TTS_CONFIG["cpu_inference_mode"], seed offset)
+VARIANTS = [
+    ("fp32", "fp32", 0),
+    ("fp32, other seed", "fp32", 1000),
+    ("int8", "int8", 0),
+    ("int8+compile", "int8+compile", 0),
+]
+
+def log_spectrum(waveform, frame=1024, hop=256):
+    """Long-term average power spectrum of a waveform, in dB."""
+    waveform = np.asarray(waveform, dtype=np.float32)
+    if len(waveform) < frame:
+        waveform = np.pad(waveform, (0, frame - len(waveform)))
+    frames = np.lib.stride_tricks.sliding_window_view(waveform, frame)[::hop] * np.hanning(frame)
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+    return 10 * np.log10(power.mean(axis=0) + 1e-10)
+
+def spectral_distance(waveform, reference):
+    """Mean absolute difference of two long-term average spectra, in dB."""
+    return float(np.mean(np.abs(log_spectrum(waveform) - log_spectrum(reference))))
+
+def run_variant(mode, seed_offset, repeats, output_path):
+    """Load LocalTTS in one mode in this process and time the sample utterances."""
+    import torch
+
+    from config import TTS_CONFIG
+    from local_tts_service import LocalTTS
+    from model_registry import _current_rss_bytes
+
+    TTS_CONFIG["cpu_inference_mode"] = mode
+    TTS_CONFIG["enable_audio_cache"] = False
+    TTS_CONFIG["warmup_on_load"] = True
+
+    start = time.perf_counter()
+    tts = LocalTTS()
+    load_s = time.perf_counter() - start
+
+    latencies, audio_seconds, waveforms = [], 0.0, {}
+    for _ in range(repeats):
+        for i, text in enumerate(UTTERANCES):
+            torch.manual_seed(seed_offset + i)
+            start = time.perf_counter()
+            waveform = np.asarray(tts._synthesize_segment(text), dtype=np.float32)
+            latencies.append(time.perf_counter() - start)
+            audio_seconds += len(waveform) / tts.sample_rate
+            waveforms.setdefault(f"u{i}", waveform)
+    np.savez(output_path, **waveforms)
+
+    return {
+        "load_s": load_s,
+        "warmup_s": tts.warmup_seconds,
+        "rss_mb": _current_rss_bytes() / 1e6,
+        "mean_s": statistics.mean(latencies),
+        "rtf": sum(latencies) / audio_seconds,
+    }
+
+def _run_in_subprocess(mode, seed_offset, repeats, threads, output_path):
+    command = [sys.executable, __file__, "--worker", mode, "--seed-offset", str(seed_offset),
+               "--repeats", str(repeats), "--output", output_path]
+    env = dict(os.environ, CUDA_VISIBLE_DEVICES="")
+    if threads:
+        env["OMP_NUM_THREADS"] = str(threads)
+    result = subprocess.run(command, capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        print(f"{mode} failed:\n{result.stderr.strip().splitlines()[-1] if result.stderr else ''}")
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def benchmark_modes(repeats=2, threads=None):
+    """Print load time, RSS, RTF and spectral distance from fp32 for each mode."""
+    directory = tempfile.mkdtemp(prefix="tts_modes_")
+    rows, reference = [], None
+    for label, mode, seed_offset in VARIANTS:
+        output_path = os.path.join(directory, f"{len(rows)}.npz")
+        row = _run_in_subprocess(mode, seed_offset, repeats, threads, output_path)
+        if row is None:
+            continue
+        waveforms = dict(np.load(output_path))
+        if reference is None and mode == "fp32":
+            reference = waveforms
+        row["distance_db"] = statistics.mean(
+            spectral_distance(waveforms[name], reference[name]) for name in reference
+        ) if reference else None
+        rows.append((label, row))
+
+    print(f"\n{'mode':<20}{'load s':>8}{'warmup s':>10}{'RSS MB':>9}{'mean s':>8}{'RTF':>7}{'dist dB':>9}")
+    print("-" * 71)
+    for label, row in rows:
+        warmup = f"{row['warmup_s']:.1f}" if row["warmup_s"] is not None else "-"
+        distance = f"{row['distance_db']:.2f}" if row["distance_db"] is not None else "-"
+        print(f"{label:<20}{row['load_s']:>8.1f}{warmup:>10}{row['rss_mb']:>9.0f}"
+              f"{row['mean_s']:>8.2f}{row['rtf']:>7.2f}{distance:>9}")
+    print(f"\nWaveforms kept in {directory}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=2, help="Passes over the sample utterances")
+    parser.add_argument("--threads", type=int, help="OMP_NUM_THREADS for every mode")
+    parser.add_argument("--worker", choices=["fp32", "int8", "int8+compile"], help=argparse.SUPPRESS)
+    parser.add_argument("--seed-offset", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    if args.worker:
+        print(json.dumps(run_variant(args.worker, args.seed_offset, args.repeats, args.output)))
+    else:
+        benchmark_modes(args.repeats, args.threads)
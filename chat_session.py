@@ -0,0 +1,298 @@
+import time
+import logging
+import threading
+from datetime import timedelta
+
+from context_packer import TokenCounter
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# google.generativeai is imported where it is first used, so importing this
+# module stays cheap.
+
+# Appended to the persona's system prompt in chat mode, in place of the
+# instructions the single-prompt mode repeats at the end of every prompt
+CHAT_INSTRUCTIONS = """
+HOW THE CONVERSATION IS STRUCTURED:
+Earlier messages are the visitor's questions and your answers. The latest message gives RESPONSE GUIDANCE, any summary of the EARLIER conversation, the RELEVANT KNOWLEDGE CONTEXT and the USER QUESTION. Respond as J. Robert Oppenheimer, following the response guidance and drawing on the context. Provide complete, thoughtful responses - do not end mid-sentence or add trailing dots."""
+
+def prompt_token_count(response, fallback):
+    """
+    Prompt tokens billed for a finished response, from its usage metadata.
+    
+    Returns:
+        Tuple[int, str]: The count and where it came from, "usage_metadata"
+            or "local" (fallback(), when the response carries no usage).
+    """
+    usage = getattr(response, "usage_metadata", None)
+    count = getattr(usage, "prompt_token_count", None)
+    if count:
+        return int(count), "usage_metadata"
+    return fallback(), "local"
+
+def cached_token_count(response):
+    """Prompt tokens of a finished response that Gemini served from cached content."""
+    usage = getattr(response, "usage_metadata", None)
+    return int(getattr(usage, "cached_content_token_count", None) or 0)
+
+class PersonaModel:
+    """
+    The Gemini model chat mode talks to, with the persona as its system instruction.
+    
+    Shared by every session in the process. The system instruction is offered
+    to Gemini once as CachedContent (google.generativeai.caching), so that turns
+    bill it at the cached-token rate; the cache's TTL is extended while it is in
+    use and it is recreated once it has expired. Gemini rejects instructions
+    below the model's minimum cacheable size, and the persona prompt may well be
+    one: the rejection and its reason are logged, the plain system instruction
+    is used, and caching is tried again one TTL later. Whether a turn was
+    actually served from the cache is in its cached_content_token_count.
+    """
+    
+    def __init__(self, model_name, system_instruction, cache_ttl=3600, use_cache=True, token_counter=None):
+        """
+        Args:
+            model_name (str): Gemini model, e.g. "gemini-2.5-flash".
+            system_instruction (str): The persona prompt and chat instructions.
+            cache_ttl (int): Seconds the cached instruction lives after its last use.
+            use_cache (bool): Offer the instruction to Gemini as CachedContent.
+            token_counter (TokenCounter): Estimates the instruction's size for the logs.
+        """
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.cache_ttl = cache_ttl
+        self.use_cache = use_cache
+        self.instruction_tokens = (token_counter or TokenCounter()).count(system_instruction)
+        self._lock = threading.Lock()
+        self._plain_model = None
+        self._cache = None
+        self._cached_model = None
+        # When the cache expires, and when to extend it or retry creating it
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        # Why Gemini last refused to cache the instruction, if it did
+        self.cache_error = None
+    
+    def model(self):
+        """The GenerativeModel to send the next turn to."""
+        with self._lock:
+            if self.use_cache and time.time() >= self._refresh_at:
+                self._refresh_cache()
+            if self._cached_model is not None:
+                return self._cached_model
+            if self._plain_model is None:
+                self._plain_model = self._create_plain_model()
+            return self._plain_model
+    
+    def _create_plain_model(self):
+        import google.generativeai as genai
+        return genai.GenerativeModel(self.model_name, system_instruction=self.system_instruction)
+    
+    def _create_cached_model(self, ttl):
+        import google.generativeai as genai
+        from google.generativeai import caching
+        self._cache = caching.CachedContent.create(
+            model=f"models/{self.model_name}",
+            display_name="oppenheimer-persona",
+            system_instruction=self.system_instruction,
+            ttl=ttl
+        )
+        return genai.GenerativeModel.from_cached_content(cached_content=self._cache)
+    
+    def _refresh_cache(self):
+        now = time.time()
+        ttl = timedelta(seconds=self.cache_ttl)
+        if self._cache is not None and now < self._expires_at:
+            try:
+                self._cache.update(ttl=ttl)
+                self._expires_at = now + self.cache_ttl
+                self._refresh_at = now + self.cache_ttl / 2
+                return
+            except Exception as e:
+                logger.warning(f"Could not extend the cached persona, recreating it: {e}")
+        
+        self._cache = None
+        self._cached_model = None
+        try:
+            self._cached_model = self._create_cached_model(ttl)
+            self._expires_at = now + self.cache_ttl
+            self._refresh_at = now + self.cache_ttl / 2
+            self.cache_error = None
+            logger.info(f"Cached the persona system instruction (~{self.instruction_tokens} tokens) "
+                       f"for {self.cache_ttl}s")
+        except Exception as e:
+            self._cache = None
+            self._cached_model = None
+            self._refresh_at = now + self.cache_ttl
+            self.cache_error = str(e)
+            logger.warning(f"Gemini did not cache the persona system instruction (~{self.instruction_tokens} "
+                          f"tokens), sending it in full for the next {self.cache_ttl}s: {e}")
+    
+    def generate(self, contents, stream=True):
+        return self.model().generate_content(contents, stream=stream)
+    
+    def get_stats(self):
+        with self._lock:
+            return {
+                "cached": self._cached_model is not None,
+                "instruction_tokens": self.instruction_tokens,
+                "cache_error": self.cache_error,
+            }
+
+class PersonaChat:
+    """
+    One session's chat-mode prompts, built from its ConversationMemory.
+    
+    Past exchanges go to the model as structured question/answer messages:
+    the recent ones the memory keeps verbatim, with the answers as they were
+    recorded. The latest message carries everything else: the response
+    guidance, the summary and clipped older exchanges if there are any, the
+    context retrieved for this question and the question itself. Retrieved
+    passages therefore travel with their own turn only and never accumulate
+    in the history.
+    """
+    
+    def __init__(self, persona_model, memory, token_counter=None):
+        """
+        Args:
+            persona_model (PersonaModel): Shared model with the persona as system instruction.
+            memory (ConversationMemory): The session's conversation history.
+            token_counter (TokenCounter): Counts prompt tokens when responses carry no usage metadata.
+        """
+        self.persona_model = persona_model
+        self.memory = memory
+        self.token_counter = token_counter or memory.token_counter
+    
+    def build_contents(self, question, context, guidance):
+        """The messages of a turn: past exchanges, then the current question with its context."""
+        earlier, recent = self.memory.split()
+        contents = []
+        for exchange in recent:
+            contents.append({"role": "user", "parts": [exchange['user']]})
+            contents.append({"role": "model", "parts": [exchange['oppenheimer']]})
+        
+        sections = [guidance]
+        if earlier:
+            sections.append("EARLIER IN OUR CONVERSATION:\n" + "\n".join(earlier))
+        sections.append(f"RELEVANT KNOWLEDGE CONTEXT:\n{context}")
+        sections.append(f"USER QUESTION: {question}")
+        contents.append({"role": "user", "parts": ["\n\n".join(sections)]})
+        return contents
+    
+    def send_stream(self, contents):
+        """Send a turn's messages; returns the streamed response."""
+        return self.persona_model.generate(contents, stream=True)
+    
+    def count_tokens(self, contents):
+        """Local estimate of a turn's prompt tokens, system instruction included."""
+        return self.token_counter.count(self.persona_model.system_instruction) + sum(
+            self.token_counter.count(part) for message in contents for part in message["parts"]
+        )
+
+# Gemini 2.5 Flash's minimum prompt size for explicit caching; the fake model enforces it
+MIN_CACHED_TOKENS = 1024
+
+class _FakeModel:
+    """Stands in for a Gemini GenerativeModel; replies with canned text and reports usage."""
+    
+    class _Response:
+        def __init__(self, text, prompt_tokens, cached_tokens):
+            self.text = text
+            self._chunks = [type("Chunk", (), {"text": word + " "})() for word in text.split(" ")]
+            self.usage_metadata = type("Usage", (), {
+                "prompt_token_count": prompt_tokens, "cached_content_token_count": cached_tokens
+            })()
+        
+        def __iter__(self):
+            return iter(self._chunks)
+    
+    def __init__(self, counter, system_instruction="", cached=False):
+        self.counter = counter
+        self.system_instruction = system_instruction
+        self.cached = cached
+        self.calls = 0
+    
+    def generate_content(self, contents, stream=False):
+        self.calls += 1
+        if isinstance(contents, str):
+            prompt = contents
+        else:
+            prompt = "\n".join(part for message in contents for part in message["parts"])
+        instruction_tokens = self.counter.count(self.system_instruction) if self.system_instruction else 0
+        answer = f"Answer {self.calls} from beyond the grave." + " And so it went." * 20
+        return self._Response(answer, instruction_tokens + self.counter.count(prompt),
+                              instruction_tokens if self.cached else 0)
+
+class _FakePersonaModel(PersonaModel):
+    """PersonaModel on the fake model, which refuses to cache instructions below MIN_CACHED_TOKENS."""
+    
+    def __init__(self, system_instruction, counter):
+        super().__init__("fake-gemini", system_instruction, token_counter=counter)
+        self.counter = counter
+    
+    def _create_plain_model(self):
+        return _FakeModel(self.counter, self.system_instruction)
+    
+    def _create_cached_model(self, ttl):
+        tokens = self.counter.count(self.system_instruction)
+        if tokens < MIN_CACHED_TOKENS:
+            raise ValueError(f"Cached content is too small. total_token_count={tokens}, "
+                             f"min_total_token_count={MIN_CACHED_TOKENS}")
+        self._cache = object()
+        return _FakeModel(self.counter, self.system_instruction, cached=True)
+
+def test_chat_session():
+    """Compare prompt tokens per turn with chat mode off and on, through OppenheimerPersona on a fake model."""
+    from config import OPTIMIZATION_CONFIG, RAG_CONFIG
+    from oppenheimer_persona import OppenheimerPersona
+    
+    questions = [
+        "What do you remember about the Trinity test?",
+        "How did you choose Los Alamos for the laboratory?",
+        "What did General Groves expect of you?",
+        "Do you regret your role in creating the atomic bomb?",
+        "Why did you oppose the hydrogen bomb?",
+        "What happened at your security hearing in 1954?",
+        "What did the Bhagavad Gita mean to you?",
+        "What was your relationship with Einstein like?",
+    ]
+    saved_config = dict(OPTIMIZATION_CONFIG)
+    saved_retrieval_mode = RAG_CONFIG["retrieval_mode"]
+    totals = {}
+    try:
+        # Every question goes to the model, with rule-based guidance and BM25
+        # retrieval, so nothing but the knowledge base is needed
+        OPTIMIZATION_CONFIG["enable_response_cache"] = False
+        RAG_CONFIG["retrieval_mode"] = "lexical"
+        for chat_mode in (False, True):
+            OPTIMIZATION_CONFIG["chat_session_mode"] = chat_mode
+            persona = OppenheimerPersona()
+            persona.use_ai_optimization = False
+            counter = persona.memory.token_counter
+            persona.model = _FakeModel(counter)
+            if persona.chat is not None:
+                persona.chat.persona_model = _FakePersonaModel(persona.chat.persona_model.system_instruction, counter)
+            
+            mode = "chat" if chat_mode else "single"
+            totals[mode] = [0, 0]
+            for turn, question in enumerate(questions):
+                persona.generate_response(question)
+                totals[mode][0] += persona.last_prompt_tokens
+                totals[mode][1] += persona.last_prompt_tokens - persona.last_cached_tokens
+                logger.info(f"{mode} turn {turn}: {persona.last_prompt_tokens} prompt tokens, "
+                            f"{persona.last_cached_tokens} cached")
+            if persona.chat is not None:
+                logger.info(f"Persona cache: {persona.chat.persona_model.get_stats()}")
+            persona.close()
+    finally:
+        OPTIMIZATION_CONFIG.clear()
+        OPTIMIZATION_CONFIG.update(saved_config)
+        RAG_CONFIG["retrieval_mode"] = saved_retrieval_mode
+    
+    logger.info(f"Prompt tokens over {len(questions)} turns: single {totals['single'][0]}, chat {totals['chat'][0]}")
+    logger.info(f"Billed at the full input rate: single {totals['single'][1]}, chat {totals['chat'][1]}")
+
+if __name__ == "__main__":
+    test_chat_session()
@@ -31,6 +31,31 @@ TTS_CONFIG = {
         "sample_rate": 24000,        # High quality (vs 16000 for lower cost)
     },
     
+    # Local XTTS streaming synthesis: text is split at sentence boundaries into
+    # segments no longer than XTTS's per-segment limit for English
+    "max_segment_chars": 250,
+    
+    # Speaker conditioning (GPT latents and speaker embedding) of the cloned voice,
+    # computed once per reference file and kept on disk
+    "cache_speaker_latents": True,
+    "speaker_latents_dir": "./voice_cache",
+    "reference_max_seconds": None,   # Seconds of the reference clip to use (None: XTTS default, 30)
+    
+    # Opt-in faster XTTS on CPU-only hosts (see benchmark_tts_modes.py):
+    # "fp32" (as loaded), "int8" (dynamic int8 GPT decoder) or "int8+compile"
+    # (also torch.compile the waveform decoder). Ignored on CUDA.
+    "cpu_inference_mode": "fp32",
+    "warmup_on_load": True,          # Synthesize a short phrase when the model is loaded
+    
+    # Synthesized audio, addressed by text, voice reference, model and settings
+    "enable_audio_cache": True,
+    "audio_cache_dir": "./audio_cache",
+    "audio_cache_max_bytes": 500 * 1024 * 1024,
+    
+    # Audio handed to the browser is kept in memory per session, not in files
+    "audio_format": "wav",          # "wav" (24 kHz), "wav16k" or "ogg" (Opus, needs soundfile)
+    "session_audio_max_bytes": 32 * 1024 * 1024,  # Oldest messages lose their audio beyond this
+    
     # When to skip TTS entirely
     "skip_tts_if": {
         "response_too_long": 1200,   # Skip if response > 1200 characters
@@ -51,7 +76,11 @@ RESPONSE_CONFIG = {
     },
     
     # Context management
-    "max_conversation_history": 5,    # Keep last 5 exchanges
+    "max_conversation_history": 5,    # Exchanges kept for the length optimizers
+    # Prompt history: the latest exchanges verbatim within a token budget, and a
+    # rolling summary of everything older, updated in the background
+    "history_recent_token_budget": 600,
+    "history_summary_token_budget": 200,
     "context_window_chars": 4000,     # Max context length
     
     # Response optimization
@@ -95,6 +124,43 @@ OPTIMIZATION_CONFIG = {
     "enable_response_cache": True,           # Cache similar responses
     "cache_similarity_threshold": 0.85,     # How similar to use cached response
     "max_cache_size": 100,                  # Maximum cached responses
+    "cache_eviction_policy": "lru",         # "lru" or "lfu" once the cache is full
+    "response_cache_dir": "./response_cache",  # Shared on-disk store (text and audio)
+    
+    # Per-turn stage execution: retrieval and AI length optimization run
+    # concurrently; if the optimizer misses its deadline, rule-based guidance is used
+    "parallel_stages": True,
+    "length_guidance_deadline": 1.5,        # Seconds to wait for the AI length optimizer once it has started
+    
+    # Response length guidance: "remote" asks Gemini (AILengthOptimizer) every
+    # turn, "local" uses the kNN LengthPredictor trained on logged Gemini
+    # decisions, "auto" uses the local one once it has been trained
+    "length_optimizer": "auto",
+    "length_decision_log": "./length_decisions.jsonl",  # Gemini decisions, for training
+    "length_predictor_path": "./length_predictor.npz",
+    
+    # Gemini length decisions memoized by normalized question and history
+    # summary; a miss gets heuristic guidance at once and is asked in the background
+    "enable_length_decision_cache": True,
+    "length_decision_cache_path": "./length_decision_cache.json",
+    "length_decision_cache_size": 500,
+    "length_decision_cache_ttl": 7 * 24 * 3600,  # Seconds
+    
+    # Chat mode: the persona prompt is the system instruction of a shared model,
+    # offered to Gemini as CachedContent so it is billed at the cached rate (the
+    # current prompt is below Gemini 2.5 Flash's 1024-token minimum, so it is
+    # sent in full until it grows); turns go as structured messages (past
+    # questions and answers) and the retrieved context is attached to the
+    # current question only
+    "chat_session_mode": False,
+    "persona_cache_ttl": 3600,             # Seconds the cached persona lives after its last use
+    
+    # Introductions generated and synthesized ahead of time, so a new session
+    # starts without waiting for Gemini or TTS; refilled in the background
+    "enable_intro_pool": True,
+    "intro_pool_dir": "./intro_pool",
+    "intro_pool_size": 8,
+    "intro_pool_max_uses": 25,             # Retire an introduction after serving it this often
     
     # Batch processing
     "enable_batching": False,               # Batch multiple requests (if available)
@@ -102,6 +168,52 @@ OPTIMIZATION_CONFIG = {
     "batch_timeout": 30,                   # Seconds to wait for batch completion
 }
 
+# Knowledge Base Retrieval Settings
+RAG_CONFIG = {
+    # Re-index knowledge_base/*.txt in the background when they are edited
+    "watch_knowledge_base": False,
+    "watch_interval_seconds": 2.0,   # How often to check the files for changes
+    
+    # Embedding runtime for all-MiniLM-L6-v2: "onnx" (ONNX Runtime on CPU) or
+    # "torch" (sentence-transformers). Both embed into the same space, so the
+    # other one is used as the fallback if the configured one cannot load
+    "embedding_backend": "onnx",
+    "embedding_quantize": False,      # Dynamic int8 quantization of the ONNX model
+    "embedding_threads": None,        # ONNX Runtime intra-op threads (None = default)
+    
+    # Vector store: "chroma" (ChromaDB persistent client) or "numpy"
+    # (memory-mapped embedding matrix with exact search, shared page cache
+    # between processes and no SQLite/HNSW dependency at query time)
+    "vector_backend": "chroma",
+    
+    # Compact storage for the numpy backend: None scans float32 vectors,
+    # "int8" scans per-vector-scaled int8 codes (optionally PCA-projected to
+    # projection_dim) and re-scores the best candidates exactly in float32
+    "vector_compression": None,
+    "projection_dim": None,
+    "rescore_candidates": 20,
+    
+    # Retrieval: "vector" (dense only), "hybrid" (BM25 + dense, reciprocal-rank
+    # fusion) or "lexical" (BM25 only, no embedding model needed)
+    "retrieval_mode": "vector",
+    "hybrid_candidates": 20,          # Candidates taken from each ranker before fusion
+    "rrf_k": 60,                      # Reciprocal-rank fusion damping constant
+    
+    # Context packing: merge overlapping chunks, drop near-duplicates (MMR) and
+    # irrelevant results, and fill a token budget counted with tiktoken
+    "pack_context": True,
+    "context_candidates": 8,          # Results retrieved before merging/de-duplication
+    "context_token_budget": 750,      # Roughly the old 3000-character limit
+    "relevance_cutoff": 1.5,          # Max vector distance (squared L2) to include
+    "mmr_lambda": 0.7,                # Relevance vs. novelty when ordering chunks
+    "duplicate_threshold": 0.9,       # Word-overlap cosine treated as a duplicate
+    
+    # Query embedding / search result caches
+    "query_cache_size": 256,          # Normalized queries whose embedding is kept
+    "query_cache_ttl_seconds": 3600,  # Expire cached entries after an hour
+    "results_cache_size": 256,        # Cached result lists (per collection version)
+}
+
 # Monitoring and Analytics
 MONITORING_CONFIG = {
     "track_usage": True,            # Track detailed usage statistics
@@ -0,0 +1,214 @@
+import re
+import math
+import logging
+from collections import Counter
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_WORD_PATTERN = re.compile(r"\w+")
+# Places where context may be cut: after a sentence end or at a line break
+_CUT_POINT = re.compile(r"(?<=[.!?])[\"')\]]*\s+|\n+")
+
+class TokenCounter:
+    """Counts prompt tokens with tiktoken, falling back to a 4-characters-per-token estimate."""
+
+    def __init__(self, encoding_name="cl100k_base"):
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._unavailable = False
+
+    def _get_encoding(self):
+        if self._encoding is None and not self._unavailable:
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                logger.warning(f"tiktoken unavailable, estimating tokens from length: {e}")
+                self._unavailable = True
+        return self._encoding
+
+    def count(self, text):
+        encoding = self._get_encoding()
+        if encoding is None:
+            return math.ceil(len(text) / 4)
+        return len(encoding.encode(text))
+
+def _merge_overlap(first, second, max_overlap=400, min_overlap=20):
+    """Join two consecutive chunks, dropping the text they share, if they overlap."""
+    for size in range(min(len(first), len(second), max_overlap), min_overlap - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return None
+
+def _term_vector(text):
+    return Counter(word.lower() for word in _WORD_PATTERN.findall(text))
+
+def _cosine(a, b):
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b[term] for term, count in a.items() if term in b)
+    return dot / (math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values())))
+
+class ContextPacker:
+    """
+    Packs retrieved chunks into the LLM context within a token budget.
+
+    Chunks past the relevance cutoff are dropped, consecutive chunks from the
+    same source are merged without their shared overlap, near-duplicates are
+    removed with maximal marginal relevance (MMR), and segments are added in
+    MMR order until the token budget is full, cutting only at sentence or line ends.
+    """
+
+    def __init__(self, token_budget=750, relevance_cutoff=1.5, mmr_lambda=0.7, duplicate_threshold=0.9,
+                 token_counter=None):
+        """
+        Args:
+            token_budget (int): Maximum tokens of packed context.
+            relevance_cutoff (float): Drop results whose vector distance exceeds
+                this; None disables it. Results without a distance are kept.
+            mmr_lambda (float): Relevance vs. novelty trade-off for MMR ordering.
+            duplicate_threshold (float): Segments at least this similar to an
+                already selected one are dropped.
+        """
+        self.token_budget = token_budget
+        self.relevance_cutoff = relevance_cutoff
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.token_counter = token_counter or TokenCounter()
+
+    def _apply_cutoff(self, results):
+        if self.relevance_cutoff is None:
+            return list(results)
+        return [
+            result for result in results
+            if result.get('distance') is None or result['distance'] <= self.relevance_cutoff
+        ]
+
+    def _merge_adjacent(self, results):
+        """Merge consecutive chunk_ids of the same source; keep the best rank of each run."""
+        ranked = [dict(result, rank=rank) for rank, result in enumerate(results)]
+        by_source = {}
+        loose = []
+        for result in ranked:
+            metadata = result.get('metadata') or {}
+            if 'source' in metadata and 'chunk_id' in metadata:
+                by_source.setdefault(metadata['source'], []).append(result)
+            else:
+                loose.append(result)
+
+        segments, merges = [], 0
+        for chunks in by_source.values():
+            chunks.sort(key=lambda result: result['metadata']['chunk_id'])
+            current = dict(chunks[0])
+            for chunk in chunks[1:]:
+                if chunk['metadata']['chunk_id'] == current['metadata']['chunk_id'] + 1:
+                    merged = _merge_overlap(current['content'], chunk['content'])
+                    if merged is None:
+                        merged = current['content'] + "\n" + chunk['content']
+                    current = dict(
+                        current,
+                        content=merged,
+                        metadata=dict(current['metadata'], chunk_id=chunk['metadata']['chunk_id']),
+                        rank=min(current['rank'], chunk['rank'])
+                    )
+                    merges += 1
+                else:
+                    segments.append(current)
+                    current = dict(chunk)
+            segments.append(current)
+
+        segments.extend(loose)
+        segments.sort(key=lambda segment: segment['rank'])
+        return segments, merges
+
+    def _mmr_order(self, segments):
+        """Order segments by MMR, dropping near-duplicates of already chosen ones."""
+        vectors = [_term_vector(segment['content']) for segment in segments]
+        relevance = [1.0 / (1 + segment['rank']) for segment in segments]
+        remaining = list(range(len(segments)))
+        selected = []
+        dropped = 0
+
+        while remaining:
+            best, best_score = None, -math.inf
+            for i in list(remaining):
+                redundancy = max((_cosine(vectors[i], vectors[j]) for j in selected), default=0.0)
+                if redundancy >= self.duplicate_threshold:
+                    remaining.remove(i)
+                    dropped += 1
+                    continue
+                score = self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * redundancy
+                if score > best_score:
+                    best, best_score = i, score
+            if best is None:
+                break
+            selected.append(best)
+            remaining.remove(best)
+
+        return [segments[i] for i in selected], dropped
+
+    def _truncate_to_tokens(self, text, max_tokens):
+        """Longest prefix ending at a sentence or line break that fits in max_tokens, if any."""
+        cut_points = [match.end() for match in _CUT_POINT.finditer(text)]
+        # Token counts grow with the prefix, so binary search the cut points
+        low, high, best = 0, len(cut_points) - 1, None
+        while low <= high:
+            middle = (low + high) // 2
+            prefix = text[:cut_points[middle]].rstrip()
+            if self.token_counter.count(prefix) <= max_tokens:
+                best, low = prefix, middle + 1
+            else:
+                high = middle - 1
+        return best or None
+
+    def pack(self, results, baseline_context=None):
+        """
+        Pack search results into a context string.
+
+        Args:
+            results (List[Dict]): Search results in rank order.
+            baseline_context (str): What the character-count packer would have
+                produced from the same results, to report the tokens saved
+                (or added) against it.
+
+        Returns:
+            Tuple[str, Dict]: The packed context and packing statistics.
+        """
+        relevant = self._apply_cutoff(results)
+        segments, merges = self._merge_adjacent(relevant)
+        ordered, duplicates = self._mmr_order(segments)
+
+        parts, used_tokens = [], 0
+        separator_tokens = self.token_counter.count("\n\n")
+        for segment in ordered:
+            remaining = self.token_budget - used_tokens - (separator_tokens if parts else 0)
+            if remaining <= 0:
+                break
+            content = segment['content']
+            tokens = self.token_counter.count(content)
+            if tokens > remaining:
+                content = self._truncate_to_tokens(content, remaining)
+                if content is None:
+                    continue
+                tokens = self.token_counter.count(content)
+            parts.append(content)
+            used_tokens += tokens + (separator_tokens if len(parts) > 1 else 0)
+
+        context = "\n\n".join(parts)
+        stats = {
+            "results_in": len(results),
+            "dropped_by_cutoff": len(results) - len(relevant),
+            "merged_chunks": merges,
+            "dropped_duplicates": duplicates,
+            "segments_used": len(parts),
+            "prompt_tokens": self.token_counter.count(context) if context else 0,
+        }
+        if baseline_context is not None:
+            stats["baseline_tokens"] = self.token_counter.count(baseline_context)
+            # Tokens over the baseline are reported separately, so savings never go negative
+            difference = stats["baseline_tokens"] - stats["prompt_tokens"]
+            stats["tokens_saved"] = max(0, difference)
+            stats["tokens_added"] = max(0, -difference)
+        return context, stats
@@ -0,0 +1,159 @@
+import logging
+import threading
+
+from context_packer import TokenCounter
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SUMMARY_POOL_KEY = "history_summary_pool"
+CONVERSATION_START = "This is the beginning of our conversation."
+
+def format_exchange(exchange, max_chars=None):
+    """One exchange as prompt text, the answer optionally clipped."""
+    response = exchange['oppenheimer']
+    if max_chars and len(response) > max_chars:
+        response = response[:max_chars] + "..."
+    return f"User asked: {exchange['user']}\nYou responded: {response}"
+
+class ConversationMemory:
+    """
+    Conversation history for the prompt, bounded however long a session runs.
+
+    The latest exchanges are kept verbatim while they fit recent_token_budget
+    (the newest one always is). Older ones are folded into a rolling summary
+    of at most summary_token_budget tokens by the summarize callable, on a
+    background executor, so the turn that pushes an exchange out never waits
+    for it. Until its fold lands, an exchange is shown clipped, as before.
+    """
+
+    def __init__(self, summarize, recent_token_budget=600, summary_token_budget=200, executor=None,
+                 token_counter=None, max_clipped=3):
+        """
+        Args:
+            summarize (Callable): (current summary, older exchanges as text,
+                token budget) to the updated summary.
+            recent_token_budget (int): Tokens of recent exchanges kept verbatim.
+            summary_token_budget (int): Maximum tokens of the rolling summary.
+            executor (Executor): Runs the summary updates; None runs them inline.
+            token_counter (TokenCounter): Shared counter, one is made otherwise.
+            max_clipped (int): Exchanges awaiting the summary that are shown clipped.
+        """
+        self.summarize = summarize
+        self.recent_token_budget = recent_token_budget
+        self.summary_token_budget = summary_token_budget
+        self.executor = executor
+        self.token_counter = token_counter or TokenCounter()
+        self.max_clipped = max_clipped
+        self.summary = ""
+        self.summarized_exchanges = 0
+        self._recent = []
+        self._recent_tokens = []
+        self._pending = []
+        self._fold = None
+        self._folding = False
+        self._lock = threading.Lock()
+
+    def add(self, exchange):
+        """Record an exchange (a dict with 'user' and 'oppenheimer' text)."""
+        with self._lock:
+            self._recent.append(exchange)
+            self._recent_tokens.append(self.token_counter.count(format_exchange(exchange)))
+            while len(self._recent) > 1 and sum(self._recent_tokens) > self.recent_token_budget:
+                self._pending.append(self._recent.pop(0))
+                self._recent_tokens.pop(0)
+            if not self._pending or self._folding:
+                return
+            self._folding = True
+            if self.executor is not None:
+                self._fold = self.executor.submit(self._fold_pending)
+                return
+        self._fold_pending()
+
+    def _fold_pending(self):
+        """Fold exchanges waiting for the summary into it, until none are left."""
+        while True:
+            with self._lock:
+                batch = list(self._pending)
+                summary = self.summary
+                if not batch:
+                    # Cleared under the lock, so add() never misses starting the next fold
+                    self._folding = False
+                    return
+            older = "\n".join(format_exchange(exchange) for exchange in batch)
+            try:
+                updated = self.summarize(summary, older, self.summary_token_budget).strip()
+            except Exception as e:
+                logger.warning(f"Conversation summary failed, keeping the questions only: {e}")
+                updated = ""
+            if not updated:
+                asked = " ".join(f"They asked: {exchange['user'][:100]}" for exchange in batch)
+                updated = f"{summary} {asked}".strip()
+            updated = self._clip_summary(updated)
+            with self._lock:
+                self.summary = updated
+                del self._pending[:len(batch)]
+                self.summarized_exchanges += len(batch)
+
+    def _clip_summary(self, summary):
+        """Drop the summary's oldest words until it fits its budget."""
+        words = summary.split()
+        while words and self.token_counter.count(" ".join(words)) > self.summary_token_budget:
+            words = words[max(1, len(words) // 10):]
+        return " ".join(words)
+
+    def split(self):
+        """The summary and clipped pending exchanges as text, and the recent exchanges themselves."""
+        with self._lock:
+            earlier = []
+            if self.summary:
+                earlier.append(f"Summary of the earlier conversation: {self.summary}")
+            earlier.extend(format_exchange(exchange, 200) for exchange in self._pending[-self.max_clipped:])
+            return earlier, list(self._recent)
+
+    def context(self):
+        """The history section of the prompt: summary, clipped pending exchanges, then recent ones."""
+        earlier, recent = self.split()
+        parts = earlier + [format_exchange(exchange) for exchange in recent]
+        return "\n".join(parts) if parts else CONVERSATION_START
+
+    def wait(self, timeout=None):
+        """Block until the summary update in progress, if any, has finished."""
+        fold = self._fold
+        if fold is not None:
+            fold.result(timeout)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "recent_exchanges": len(self._recent),
+                "recent_tokens": sum(self._recent_tokens),
+                "pending_exchanges": len(self._pending),
+                "summarized_exchanges": self.summarized_exchanges,
+                "summary_tokens": self.token_counter.count(self.summary) if self.summary else 0,
+            }
+
+def test_conversation_memory():
+    """Run a long fake conversation and check the prompt history stays bounded."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def summarize(summary, older, budget):
+        topics = [line[len("User asked: "):] for line in older.splitlines() if line.startswith("User asked: ")]
+        return f"{summary} Discussed: {'; '.join(topics)}.".strip()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        memory = ConversationMemory(summarize, recent_token_budget=300, summary_token_budget=80, executor=executor)
+        for turn in range(40):
+            memory.add({
+                'user': f"Question {turn} about Los Alamos?",
+                'oppenheimer': f"Answer {turn}. " + "We worked through the night on the implosion design. " * 4,
+            })
+            if turn % 10 == 9:
+                memory.wait()
+                logger.info(f"After {turn + 1} exchanges: {memory.get_stats()}, "
+                            f"{memory.token_counter.count(memory.context())} prompt tokens")
+        logger.info(f"Summary: {memory.summary}")
+
+if __name__ == "__main__":
+    test_conversation_memory()
@@ -0,0 +1,134 @@
+"""
+Train and evaluate the local length predictor against logged Gemini decisions.
+
+The AI length optimizer appends every decision it makes to
+OPTIMIZATION_CONFIG["length_decision_log"]. This script measures how often
+the local kNN predictor agrees with those decisions (k-fold cross-validation),
+alongside the heuristic fallback, and how long a prediction takes.
+
+Usage:
+    python evaluate_length_predictor.py --collect   # ask Gemini about the sample questions
+    python evaluate_length_predictor.py [--folds 5] [--k 5]
+    python evaluate_length_predictor.py --train     # fit on the whole log and save
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from config import OPTIMIZATION_CONFIG
+from length_predictor import LengthPredictor, load_decisions
+from rag_system import _create_embedding_function, embedder_id, TEST_QUERIES
+
+# Questions sent to the Gemini optimizer by --collect to seed the training log
+SAMPLE_QUESTIONS = TEST_QUERIES + [
+    "When were you born?",
+    "Where did you grow up?",
+    "Who was your doctoral advisor?",
+    "What year did the Trinity test take place?",
+    "When did you become director of the Institute for Advanced Study?",
+    "Do you regret building the atomic bomb?",
+    "What does the Bhagavad Gita mean to you?",
+    "Is a scientist responsible for how his discoveries are used?",
+    "Should the world have shared atomic secrets after the war?",
+    "What is the moral cost of scientific progress?",
+    "Tell me about the first days at Los Alamos.",
+    "Describe the morning of the Trinity test.",
+    "What happened at your 1954 security hearing?",
+    "Tell me about your years at Berkeley.",
+    "Describe your time studying in Göttingen.",
+    "How did you feel when you heard about Hiroshima?",
+    "What was your relationship with your brother Frank like?",
+    "How did losing your security clearance affect you personally?",
+    "What do you remember about your childhood in New York?",
+    "Explain how a nuclear chain reaction works.",
+    "What is the Born-Oppenheimer approximation?",
+    "How does implosion compress a plutonium core?",
+    "What did you contribute to the theory of black holes?",
+    "Explain the difference between fission and fusion.",
+]
+
+def _embed(texts):
+    vectors = np.asarray(_create_embedding_function()(texts), dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+def _score(predictions, truths):
+    errors_min = [abs(p["optimal_min_length"] - t["optimal_min_length"]) for p, t in zip(predictions, truths)]
+    errors_max = [abs(p["optimal_max_length"] - t["optimal_max_length"]) for p, t in zip(predictions, truths)]
+    return {
+        "type_agreement": statistics.mean(p["response_type"] == t["response_type"] for p, t in zip(predictions, truths)),
+        "min_mae": statistics.mean(errors_min),
+        "max_mae": statistics.mean(errors_max),
+        "within_100": statistics.mean(
+            a <= 100 and b <= 100 for a, b in zip(errors_min, errors_max)
+        ),
+    }
+
+def collect(questions):
+    """Ask the Gemini optimizer about each question; it logs every decision."""
+    from ai_length_optimizer import AILengthOptimizer
+    optimizer = AILengthOptimizer()
+    for question in questions:
+        decision = optimizer.analyze_optimal_length(question, wait=True)
+        print(f"{decision['response_type']:<14}{decision['optimal_min_length']:>5}-"
+              f"{decision['optimal_max_length']:<5} {question}")
+    optimizer.close()
+
+def train(k=5):
+    """Fit the predictor on the whole decision log and save it."""
+    decisions = load_decisions(OPTIMIZATION_CONFIG["length_decision_log"])
+    predictor = LengthPredictor.train(decisions, _embed, embedder=embedder_id(), k=k)
+    predictor.save(OPTIMIZATION_CONFIG["length_predictor_path"])
+    print(f"Trained on {len(decisions)} decisions -> {OPTIMIZATION_CONFIG['length_predictor_path']}")
+
+def evaluate(folds=5, k=5):
+    """Cross-validate the predictor and the heuristic fallback against the logged decisions."""
+    from ai_length_optimizer import AILengthOptimizer
+
+    decisions = load_decisions(OPTIMIZATION_CONFIG["length_decision_log"])
+    if len(decisions) < folds:
+        print(f"Only {len(decisions)} logged decisions; run with --collect first")
+        return
+    embeddings = _embed([decision["query"] for decision in decisions])
+
+    order = np.random.default_rng(0).permutation(len(decisions))
+    predictions = [None] * len(decisions)
+    latencies = []
+    for fold in range(folds):
+        test = order[fold::folds]
+        train_rows = np.setdiff1d(order, test)
+        predictor = LengthPredictor(embeddings[train_rows], [decisions[i] for i in train_rows], k=k)
+        for i in test:
+            start = time.perf_counter()
+            predictions[i] = predictor.predict(embeddings[i])
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    # The heuristic fallback needs no API key; borrow it without connecting
+    heuristic = AILengthOptimizer.__new__(AILengthOptimizer)
+    heuristic.cost_per_char_tts = 0.000016
+    fallbacks = [heuristic._fallback_optimization(decision["query"]) for decision in decisions]
+
+    print(f"{len(decisions)} logged Gemini decisions, {folds}-fold cross-validation, k={k}")
+    print(f"{'predictor':<18}{'type agree':>11}{'min MAE':>9}{'max MAE':>9}{'both ±100':>11}")
+    print("-" * 58)
+    for label, rows in (("local kNN", predictions), ("heuristic", fallbacks)):
+        score = _score(rows, decisions)
+        print(f"{label:<18}{score['type_agreement']:>11.0%}{score['min_mae']:>9.0f}"
+              f"{score['max_mae']:>9.0f}{score['within_100']:>11.0%}")
+    print(f"\nPrediction latency (embedding precomputed): mean {statistics.mean(latencies):.3f} ms, "
+          f"p95 {sorted(latencies)[int(0.95 * (len(latencies) - 1))]:.3f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--collect", action="store_true", help="Log Gemini decisions for the sample questions")
+    parser.add_argument("--train", action="store_true", help="Fit on the whole log and save the predictor")
+    parser.add_argument("--folds", type=int, default=5, help="Cross-validation folds")
+    parser.add_argument("--k", type=int, default=5, help="Neighbours per prediction")
+    args = parser.parse_args()
+    if args.collect:
+        collect(SAMPLE_QUESTIONS)
+    elif args.train:
+        train(args.k)
+    else:
+        evaluate(args.folds, args.k)
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from contextlib import contextmanager
+
+from audio_buffers import EXTENSIONS
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads in this process are serialized
+    fcntl = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INTRO_POOL_KEY = "intro_pool"
+INDEX_FILE = "index.json"
+LOCK_FILE = ".lock"
+
+class IntroductionPool:
+    """
+    On-disk pool of pre-generated introductions with their synthesized audio.
+
+    A new session takes one at once instead of waiting for Gemini and TTS.
+    The least served introduction is handed out, and one that has been served
+    max_uses times is retired. refill() tops the pool back up on a background
+    thread, so only that thread ever waits for the model.
+
+    Several app processes may share the directory: every change re-reads
+    index.json under a file lock and writes it back before the lock is released.
+    """
+
+    def __init__(self, path, size=8, max_uses=25):
+        """
+        Args:
+            path (str): Directory holding index.json and the audio files.
+            size (int): Number of introductions to keep ready.
+            max_uses (int): Times an introduction is served before it is retired.
+        """
+        self.path = path
+        self.size = size
+        self.max_uses = max_uses
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._refill_thread = None
+        self.served = 0
+        self.misses = 0
+        with self._locked():
+            self._entries = self._load()
+
+    def _index_path(self):
+        return os.path.join(self.path, INDEX_FILE)
+
+    @contextmanager
+    def _locked(self):
+        """Serialize access across threads and, where supported, processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.path, LOCK_FILE), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as file:
+                entries = json.load(file)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable introduction pool index: {e}")
+            return []
+        # Entries whose audio has gone missing are dropped and regenerated
+        return [entry for entry in entries if os.path.exists(os.path.join(self.path, entry["audio"]))]
+
+    def _save(self):
+        tmp_path = f"{self._index_path()}.tmp.{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self._entries, file, indent=1)
+        os.replace(tmp_path, self._index_path())
+
+    def take(self):
+        """
+        Serve an introduction.
+
+        Returns:
+            Optional[Tuple[str, bytes, str]]: The text, its audio and the
+            audio's MIME type, or None while the pool is empty.
+        """
+        with self._locked():
+            self._entries = self._load()
+            while self._entries:
+                entry = min(self._entries, key=lambda item: item["uses"])
+                try:
+                    with open(os.path.join(self.path, entry["audio"]), "rb") as file:
+                        audio = file.read()
+                except OSError:
+                    self._retire(entry)
+                    continue
+                entry["uses"] += 1
+                if entry["uses"] >= self.max_uses:
+                    self._retire(entry)
+                self._save()
+                self.served += 1
+                return entry["text"], audio, entry["mime"]
+            self.misses += 1
+            return None
+
+    def _retire(self, entry):
+        self._entries.remove(entry)
+        try:
+            os.remove(os.path.join(self.path, entry["audio"]))
+        except OSError:
+            pass
+
+    def add(self, text, audio, mime):
+        """Store a generated introduction; duplicates of a pooled text are skipped."""
+        with self._locked():
+            self._entries = self._load()
+            if any(entry["text"] == text for entry in self._entries):
+                return False
+            name = uuid.uuid4().hex[:12] + EXTENSIONS.get(mime, ".wav")
+            tmp_path = os.path.join(self.path, f"{name}.tmp")
+            with open(tmp_path, "wb") as file:
+                file.write(audio)
+            os.replace(tmp_path, os.path.join(self.path, name))
+            self._entries.append({"text": text, "audio": name, "mime": mime, "uses": 0, "created": time.time()})
+            self._save()
+            return True
+
+    def refill(self, introduce, synthesize):
+        """
+        Top the pool up to its size on a background thread, unless it is full
+        or a refill is already running.
+
+        Args:
+            introduce (Callable): Generates an introduction, None on failure.
+            synthesize (Callable): Text to (audio bytes, MIME type), None on failure.
+
+        Returns:
+            bool: Whether a refill was started.
+        """
+        with self._lock:
+            if len(self._entries) >= self.size or (self._refill_thread and self._refill_thread.is_alive()):
+                return False
+            self._refill_thread = threading.Thread(
+                target=self._refill, args=(introduce, synthesize), name="intro-pool-refill", daemon=True
+            )
+            self._refill_thread.start()
+            return True
+
+    def _refill(self, introduce, synthesize):
+        # Bounded, so a failing model does not keep the thread spinning
+        for _ in range(2 * self.size):
+            with self._lock:
+                if len(self._entries) >= self.size:
+                    break
+            try:
+                text = introduce()
+                audio = synthesize(text) if text else None
+            except Exception as e:
+                logger.warning(f"Could not generate a pooled introduction: {e}")
+                continue
+            if audio and self.add(text, *audio):
+                logger.info(f"Added an introduction to the pool ({len(self._entries)}/{self.size})")
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size": self.size,
+                "served": self.served,
+                "misses": self.misses,
+                "refilling": bool(self._refill_thread and self._refill_thread.is_alive()),
+            }
+
+def test_intro_pool():
+    """Fill a pool with fake introductions and serve it until one is retired."""
+    import shutil
+    import tempfile
+
+    directory = tempfile.mkdtemp(prefix="intro_pool_")
+    try:
+        pool = IntroductionPool(directory, size=3, max_uses=2)
+        logger.info(f"Empty pool serves: {pool.take()}")
+        counter = iter(range(100))
+        pool.refill(lambda: f"I am Oppenheimer, version {next(counter)}.",
+                    lambda text: (text.encode(), "audio/wav"))
+        pool._refill_thread.join()
+        for _ in range(4):
+            text, audio, mime = pool.take()
+            logger.info(f"Served: {text} ({len(audio)} bytes, {mime})")
+        # A second process's additions are kept when this one next writes the index
+        IntroductionPool(directory).add("I am Oppenheimer, from another process.", b"audio", "audio/wav")
+        pool.take()
+        logger.info(f"Reopened pool entries: {len(IntroductionPool(directory)._entries)}")
+        logger.info(f"Stats: {pool.get_stats()}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    test_intro_pool()
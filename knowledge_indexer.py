@@ -0,0 +1,263 @@
+import os
+import json
+import hashlib
+import threading
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class KnowledgeBaseIndexer:
+    """
+    Keeps a Chroma collection in sync with the knowledge base text files.
+
+    A manifest stores the content hash of every source file and of every chunk
+    it produced. On sync, unchanged files are skipped without re-chunking, and
+    for changed files only chunks whose hash is new are embedded; chunks that
+    merely moved get their metadata updated and vanished chunks are deleted.
+    """
+
+    def __init__(self, collection, knowledge_files, manifest_path, splitter_factory):
+        """
+        Args:
+            collection: The Chroma collection to keep in sync.
+            knowledge_files (List[str]): Source text files to index.
+            manifest_path (str): Where the hash manifest is persisted.
+            splitter_factory (Callable): Returns a text splitter with split_text().
+        """
+        self.collection = collection
+        self.knowledge_files = knowledge_files
+        self.manifest_path = manifest_path
+        self.splitter_factory = splitter_factory
+        self._text_splitter = None
+        self._lock = threading.Lock()
+        self.watcher = None
+        # Bumped on every sync that changes the collection, after its listeners
+        # have run, for cache invalidation
+        self.version = 0
+        self._listeners = []
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        """Load the manifest from disk, or None if absent or unreadable."""
+        if not os.path.exists(self.manifest_path):
+            return None
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as file:
+                manifest = json.load(file)
+            if manifest.get("version") != MANIFEST_VERSION:
+                logger.info("Knowledge base manifest version changed, rebuilding it")
+                return None
+            return manifest
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read knowledge base manifest: {e}")
+            return None
+
+    def _save_manifest(self):
+        """Atomically write the manifest to disk."""
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self.manifest, file, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _bootstrap_file_entry(self, file_path):
+        """Rebuild a file's manifest entry from what is already in the collection."""
+        existing = self.collection.get(where={"source": file_path}, include=["documents"])
+        chunks = {
+            doc_id: _sha256(document)
+            for doc_id, document in zip(existing["ids"], existing["documents"] or [])
+        }
+        return {"sha256": None, "chunks": chunks}
+
+    def _split(self, content):
+        if self._text_splitter is None:
+            self._text_splitter = self.splitter_factory()
+        return self._text_splitter.split_text(content)
+
+    def add_listener(self, callback):
+        """Register a callback run after every sync that changed the collection."""
+        self._listeners.append(callback)
+
+    def fingerprint(self):
+        """Hash identifying the exact set of chunks currently indexed."""
+        chunk_hashes = sorted(
+            chunk_hash
+            for entry in (self.manifest or {}).get("files", {}).values()
+            for chunk_hash in entry["chunks"].values()
+        )
+        return _sha256("\n".join(chunk_hashes))
+
+    def sync(self):
+        """
+        Bring the collection in line with the files on disk.
+
+        Returns:
+            Dict[str, int]: Counts of added, moved, removed and unchanged chunks.
+        """
+        with self._lock:
+            stats = self._sync()
+            if stats["files_changed"]:
+                for callback in self._listeners:
+                    try:
+                        callback()
+                    except Exception as e:
+                        logger.error(f"Knowledge base sync listener failed: {e}")
+                # Bumped once the listeners have rebuilt their indexes, so that
+                # results cached under the new version never come from old ones
+                self.version += 1
+            return stats
+
+    def _sync(self):
+        stats = {"added": 0, "moved": 0, "removed": 0, "unchanged": 0, "files_changed": 0}
+        bootstrap = self.manifest is None
+        if bootstrap:
+            self.manifest = {"version": MANIFEST_VERSION, "files": {}}
+        files = self.manifest["files"]
+
+        tracked = set(files) | set(self.knowledge_files)
+        for file_path in sorted(tracked):
+            if bootstrap and file_path in self.knowledge_files:
+                files[file_path] = self._bootstrap_file_entry(file_path)
+            entry = files.get(file_path, {"sha256": None, "chunks": {}})
+
+            if file_path not in self.knowledge_files or not os.path.exists(file_path):
+                # Source was removed: drop every chunk it contributed
+                if entry["chunks"]:
+                    self.collection.delete(ids=list(entry["chunks"]))
+                    stats["removed"] += len(entry["chunks"])
+                    stats["files_changed"] += 1
+                    logger.info(f"Removed {len(entry['chunks'])} chunks from {file_path}")
+                files.pop(file_path, None)
+                continue
+
+            with open(file_path, "r", encoding="utf-8") as file:
+                content = file.read()
+            file_hash = _sha256(content)
+            if file_hash == entry["sha256"]:
+                stats["unchanged"] += len(entry["chunks"])
+                continue
+
+            logger.info(f"Processing {file_path}")
+            stats["files_changed"] += 1
+            files[file_path] = self._sync_file(file_path, content, file_hash, entry, stats)
+
+        self._save_manifest()
+        if stats["files_changed"]:
+            logger.info(f"Knowledge base sync: {stats}")
+        return stats
+
+    def _sync_file(self, file_path, content, file_hash, entry, stats):
+        """Diff one changed file's chunks against the manifest and apply the changes."""
+        chunks = self._split(content)
+
+        # Existing chunk ids grouped by content hash, for reuse without re-embedding
+        reusable = {}
+        for doc_id, chunk_hash in entry["chunks"].items():
+            reusable.setdefault(chunk_hash, []).append(doc_id)
+
+        file_type = os.path.basename(file_path).replace('.txt', '')
+        new_chunks = {}
+        add_ids, add_documents, add_metadatas = [], [], []
+        move_ids, move_metadatas = [], []
+
+        for i, chunk in enumerate(chunks):
+            chunk_hash = _sha256(chunk)
+            metadata = {
+                "source": file_path,
+                "chunk_id": i,
+                "file_type": file_type
+            }
+            if reusable.get(chunk_hash):
+                doc_id = reusable[chunk_hash].pop(0)
+                move_ids.append(doc_id)
+                move_metadatas.append(metadata)
+            else:
+                doc_id = f"{file_path}_{chunk_hash[:16]}"
+                suffix = 1
+                while doc_id in new_chunks or doc_id in entry["chunks"]:
+                    doc_id = f"{file_path}_{chunk_hash[:16]}_{suffix}"
+                    suffix += 1
+                add_ids.append(doc_id)
+                add_documents.append(chunk)
+                add_metadatas.append(metadata)
+            new_chunks[doc_id] = chunk_hash
+
+        stale_ids = [doc_id for ids in reusable.values() for doc_id in ids]
+        if stale_ids:
+            self.collection.delete(ids=stale_ids)
+        if add_ids:
+            self.collection.upsert(ids=add_ids, documents=add_documents, metadatas=add_metadatas)
+        if move_ids:
+            # Metadata-only update; the stored embedding is kept
+            self.collection.update(ids=move_ids, metadatas=move_metadatas)
+
+        stats["added"] += len(add_ids)
+        stats["moved"] += len(move_ids)
+        stats["removed"] += len(stale_ids)
+        logger.info(f"{file_path}: {len(add_ids)} chunks embedded, "
+                    f"{len(move_ids)} reused, {len(stale_ids)} removed")
+
+        return {"sha256": file_hash, "chunks": new_chunks}
+
+class KnowledgeBaseWatcher:
+    """Background thread that polls the knowledge base files and re-syncs on change."""
+
+    def __init__(self, on_change, knowledge_files, interval=2.0):
+        """
+        Args:
+            on_change (Callable): Called when any watched file changes.
+            knowledge_files (List[str]): Files to watch.
+            interval (float): Polling interval in seconds.
+        """
+        self.on_change = on_change
+        self.knowledge_files = knowledge_files
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._last_seen = self._snapshot()
+
+    def _snapshot(self):
+        """Cheap change signature (mtime, size) for each watched file."""
+        snapshot = {}
+        for file_path in self.knowledge_files:
+            try:
+                stat = os.stat(file_path)
+                snapshot[file_path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                snapshot[file_path] = None
+        return snapshot
+
+    def start(self):
+        """Start watching in a daemon thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="kb-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {len(self.knowledge_files)} knowledge base files for changes")
+
+    def stop(self):
+        """Stop the watcher thread."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval * 2)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            snapshot = self._snapshot()
+            if snapshot == self._last_seen:
+                continue
+            try:
+                self.on_change()
+            except Exception as e:
+                # Keep the old snapshot so the change is retried on the next poll
+                logger.error(f"Knowledge base re-index failed, retrying in {self.interval}s: {e}")
+                continue
+            self._last_seen = snapshot
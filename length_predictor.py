@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import logging
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PREDICTOR_FORMAT_VERSION = 1
+RESPONSE_TYPES = ["FACTUAL", "PHILOSOPHICAL", "NARRATIVE", "PERSONAL", "SCIENTIFIC"]
+COST_PER_CHAR_TTS = 0.000016
+
+def log_decision(path, query, history_summary, decision):
+    """Append one optimizer decision to the JSONL training log."""
+    record = {
+        "timestamp": time.time(),
+        "query": query,
+        "history_summary": history_summary,
+        "response_type": decision["response_type"],
+        "complexity_score": decision["complexity_score"],
+        "optimal_min_length": decision["optimal_min_length"],
+        "optimal_max_length": decision["optimal_max_length"],
+        "reasoning": decision.get("reasoning", ""),
+    }
+    try:
+        with open(path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(record) + "\n")
+    except OSError as e:
+        logger.warning(f"Could not log length decision: {e}")
+
+def load_decisions(path):
+    """Read logged optimizer decisions, keeping the latest one per query."""
+    if not os.path.exists(path):
+        return []
+    latest = {}
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("response_type") in RESPONSE_TYPES:
+                latest[record["query"].strip().lower()] = record
+    return list(latest.values())
+
+class LengthPredictor:
+    """
+    Local replacement for the AILengthOptimizer Gemini call.
+
+    A k-nearest-neighbour model over query embeddings of logged optimizer
+    decisions: the response type is a similarity-weighted vote of the k most
+    similar logged queries and the length range their weighted mean. The query
+    embedding comes from the RAG system, which has usually just computed it
+    for retrieval, so a prediction is a single small matrix-vector product.
+    """
+
+    def __init__(self, embeddings, labels, embed_query=None, k=5, embedder=None):
+        """
+        Args:
+            embeddings (np.ndarray): L2-normalized query embeddings, one row per label.
+            labels (List[Dict]): Logged decisions (response_type, lengths, ...).
+            embed_query (Callable): Embeds a query string, e.g. OppenheimerRAG.embed_query.
+            k (int): Neighbours consulted per prediction.
+            embedder (str): Name of the embedding model the rows came from.
+        """
+        self.embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.labels = labels
+        self.embed_query = embed_query
+        self.k = k
+        self.embedder = embedder
+        self._types = np.array([RESPONSE_TYPES.index(label["response_type"]) for label in labels])
+        self._lengths = np.array(
+            [[label["optimal_min_length"], label["optimal_max_length"]] for label in labels], dtype=np.float32
+        )
+        self._complexity = np.array([label.get("complexity_score", 5) for label in labels], dtype=np.float32)
+
+    @classmethod
+    def train(cls, decisions, embed_texts, embedder=None, k=5):
+        """Fit the predictor on logged decisions, embedding their queries in one batch."""
+        if not decisions:
+            raise ValueError("No logged length decisions to train on")
+        vectors = np.asarray(embed_texts([decision["query"] for decision in decisions]), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return cls(vectors, decisions, k=k, embedder=embedder)
+
+    def save(self, path):
+        """Persist the examples atomically."""
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            embeddings=self.embeddings,
+            labels=np.array(json.dumps(self.labels)),
+            meta=np.array(json.dumps({
+                "version": PREDICTOR_FORMAT_VERSION, "k": self.k, "embedder": self.embedder
+            })),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, embed_query=None, embedder=None):
+        """Load a trained predictor, or None if it is missing, outdated or from another embedder."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta.get("version") != PREDICTOR_FORMAT_VERSION:
+                    return None
+                if embedder is not None and meta.get("embedder") not in (None, embedder):
+                    logger.warning(f"Length predictor was trained with {meta['embedder']}, not {embedder}")
+                    return None
+                return cls(data["embeddings"], json.loads(str(data["labels"])),
+                           embed_query=embed_query, k=meta["k"], embedder=meta.get("embedder"))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load length predictor: {e}")
+            return None
+
+    def close(self):
+        """Nothing to release; present for interface parity with AILengthOptimizer."""
+
+    def predict(self, query_embedding):
+        """Predict type, complexity and length range from a query embedding."""
+        vector = np.asarray(query_embedding, dtype=np.float32).ravel()
+        vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+        similarities = self.embeddings @ vector
+        k = min(self.k, len(similarities))
+        neighbours = np.argpartition(-similarities, k - 1)[:k]
+        weights = np.maximum(similarities[neighbours], 0.0) + 1e-6
+
+        votes = np.bincount(self._types[neighbours], weights=weights, minlength=len(RESPONSE_TYPES))
+        response_type = RESPONSE_TYPES[int(np.argmax(votes))]
+        min_length, max_length = (self._lengths[neighbours] * weights[:, None]).sum(axis=0) / weights.sum()
+        complexity = float((self._complexity[neighbours] * weights).sum() / weights.sum())
+
+        # Same bounds as AILengthOptimizer._validate_optimization_response
+        min_length = max(100, min(1500, int(round(min_length, -1))))
+        max_length = max(min_length + 100, min(1500, int(round(max_length, -1))))
+        return {
+            "response_type": response_type,
+            "complexity_score": max(1, min(10, int(round(complexity)))),
+            "optimal_min_length": min_length,
+            "optimal_max_length": max_length,
+            "confidence": float(votes.max() / votes.sum()),
+            "nearest_similarity": float(similarities[neighbours].max()),
+        }
+
+    def analyze_optimal_length(self, user_query, context="", conversation_history=None):
+        """
+        Determine the optimal response length, like AILengthOptimizer.analyze_optimal_length.
+
+        Args:
+            user_query (str): The user's question
+            context (str): RAG context available (unused; kept for interface parity)
+            conversation_history (list): Previous conversation exchanges (unused)
+
+        Returns:
+            Dict: Optimization recommendations
+        """
+        prediction = self.predict(self.embed_query(user_query))
+        return {
+            "response_type": prediction["response_type"],
+            "complexity_score": prediction["complexity_score"],
+            "optimal_min_length": prediction["optimal_min_length"],
+            "optimal_max_length": prediction["optimal_max_length"],
+            "reasoning": (f"Predicted locally from {min(self.k, len(self.labels))} similar past questions "
+                          f"(confidence {prediction['confidence']:.0%})"),
+            "cost_effectiveness_score": 7,
+            "engagement_prediction": "medium",
+            "estimated_cost": prediction["optimal_max_length"] * COST_PER_CHAR_TTS,
+            "optimization_source": "local_predictor",
+        }
@@ -0,0 +1,168 @@
+import os
+import re
+import json
+import math
+import logging
+import threading
+from collections import Counter
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+
+# Common English words that carry no retrieval signal
+STOPWORDS = frozenset("""
+a an and are as at be but by did do does for from had has have he her his how i in
+is it its me my of on or our she so that the their them then there these they this
+to was we were what when where which who why will with you your about tell
+""".split())
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    """Lowercase word/number tokens, without stopwords."""
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over the knowledge base chunks.
+
+    Holds the chunk text and metadata alongside the postings so that lexical
+    search can answer queries on its own, without the embedding model. A
+    rebuild is prepared aside and swapped in under a lock, so searches running
+    meanwhile see either the old index or the new one, never a mix.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids = []
+        self.documents = []
+        self.metadatas = []
+        self.doc_lengths = []
+        self.postings = {}
+        self.avg_doc_length = 0.0
+        self.fingerprint = None
+        self._lock = threading.Lock()
+
+    def build(self, ids, documents, metadatas, fingerprint=None):
+        """Index the given chunks, replacing any previous contents."""
+        documents = list(documents)
+        doc_lengths = []
+        postings = {}
+        for doc_index, document in enumerate(documents):
+            terms = tokenize(document)
+            doc_lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                postings.setdefault(term, []).append([doc_index, frequency])
+
+        with self._lock:
+            self.ids = list(ids)
+            self.documents = documents
+            self.metadatas = [dict(metadata or {}) for metadata in metadatas]
+            self.doc_lengths = doc_lengths
+            self.postings = postings
+            self.fingerprint = fingerprint
+            self.avg_doc_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+        return self
+
+    def search(self, query, n_results=5):
+        """
+        Rank chunks against a query with Okapi BM25.
+
+        Returns:
+            List[Dict]: Up to n_results hits with id, content, metadata and score.
+        """
+        with self._lock:
+            ids, documents, metadatas = self.ids, self.documents, self.metadatas
+            doc_lengths, all_postings, avg_doc_length = self.doc_lengths, self.postings, self.avg_doc_length
+        if not ids:
+            return []
+
+        doc_count = len(ids)
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = all_postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_index, frequency in postings:
+                length_norm = 1 - self.b + self.b * doc_lengths[doc_index] / avg_doc_length
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * (
+                    frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+                )
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+        return [
+            {
+                'id': ids[doc_index],
+                'content': documents[doc_index],
+                'metadata': metadatas[doc_index],
+                'score': score
+            }
+            for doc_index, score in ranked
+        ]
+
+    def save(self, path):
+        """Persist the index atomically as JSON."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._lock:
+            data = {
+                "version": INDEX_FORMAT_VERSION,
+                "fingerprint": self.fingerprint,
+                "k1": self.k1,
+                "b": self.b,
+                "ids": self.ids,
+                "documents": self.documents,
+                "metadatas": self.metadatas,
+                "doc_lengths": self.doc_lengths,
+                "postings": self.postings,
+            }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a persisted index, or None if it is missing or in an old format."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read lexical index: {e}")
+            return None
+        if data.get("version") != INDEX_FORMAT_VERSION:
+            return None
+
+        index = cls(k1=data["k1"], b=data["b"])
+        index.fingerprint = data["fingerprint"]
+        index.ids = data["ids"]
+        index.documents = data["documents"]
+        index.metadatas = data["metadatas"]
+        index.doc_lengths = data["doc_lengths"]
+        index.postings = data["postings"]
+        index.avg_doc_length = (
+            sum(index.doc_lengths) / len(index.doc_lengths) if index.doc_lengths else 0.0
+        )
+        return index
+
+def reciprocal_rank_fusion(ranked_lists, k=60):
+    """
+    Fuse several ranked hit lists by reciprocal rank (score = sum of 1 / (k + rank)).
+
+    Hits are matched on their 'id'; the first occurrence of each hit supplies
+    its fields, and 'score' is replaced with the fused score.
+    """
+    fused = {}
+    for hits in ranked_lists:
+        for rank, hit in enumerate(hits, start=1):
+            entry = fused.setdefault(hit['id'], dict(hit, score=0.0, distance=hit.get('distance')))
+            entry['score'] += 1.0 / (k + rank)
+            if entry.get('distance') is None and hit.get('distance') is not None:
+                entry['distance'] = hit['distance']
+    return sorted(fused.values(), key=lambda hit: hit['score'], reverse=True)
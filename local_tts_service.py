@@ -1,67 +1,490 @@
+import io
 import os
-import torch
-from TTS.api import TTS
+import re
+import time
+import hashlib
+import wave
+import weakref
 import logging
 
+import numpy as np
+
+from audio_buffers import encode_audio
+from audio_cache import AudioCache, audio_key
+from config import TTS_CONFIG
+from model_registry import get_registry
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+XTTS_MODEL_NAME = "tts_models/multilingual/multi-dataset/xtts_v2"
+XTTS_SAMPLE_RATE = 24000
+# TTS_CONFIG["cpu_inference_mode"] values; CUDA always runs the model as loaded
+CPU_INFERENCE_MODES = ("fp32", "int8", "int8+compile")
+WARMUP_TEXT = "Good evening."
+
+_SENTENCE_END = re.compile(r'(?:(?<=[.!?])|(?<=[.!?]["\')\]]))\s+')
+_CLAUSE_END = re.compile(r'(?<=[,;:])\s+')
+
+def _split_long(text, max_chars):
+    """Split an over-long sentence at clause punctuation, then between words."""
+    parts = []
+    for piece in _CLAUSE_END.split(text):
+        if parts and len(parts[-1]) + 1 + len(piece) <= max_chars:
+            parts[-1] = f"{parts[-1]} {piece}"
+        elif len(piece) <= max_chars:
+            parts.append(piece)
+        else:
+            line = ""
+            for word in piece.split():
+                if line and len(line) + 1 + len(word) > max_chars:
+                    parts.append(line)
+                    line = word
+                else:
+                    line = f"{line} {word}" if line else word
+            if line:
+                parts.append(line)
+    return parts
+
+def split_into_segments(text, max_chars=None):
+    """
+    Split text into sentence segments for streaming synthesis.
+
+    Each sentence is its own segment, so the first one is short and audio can
+    start early; sentences longer than max_chars (XTTS's per-segment limit)
+    are split at commas, semicolons or colons, then between words.
+    """
+    max_chars = max_chars or TTS_CONFIG["max_segment_chars"]
+    segments = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        sentence = " ".join(sentence.split())
+        if not sentence:
+            continue
+        segments.extend([sentence] if len(sentence) <= max_chars else _split_long(sentence, max_chars))
+    return segments
+
+def file_sha256(path):
+    """Content hash of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def compute_speaker_conditioning(xtts, speaker_wav, max_seconds=None):
+    """
+    Compute XTTS conditioning from a reference clip, as tts_to_file does on every call.
+
+    Args:
+        xtts: The low-level Xtts model (TTS(...).synthesizer.tts_model).
+        speaker_wav (str): Path to the reference recording.
+        max_seconds (float): Seconds of the reference to use; None for the model default.
+
+    Returns:
+        Dict: 'gpt_cond_latent' and 'speaker_embedding' tensors.
+    """
+    config = xtts.config
+    gpt_cond_latent, speaker_embedding = xtts.get_conditioning_latents(
+        audio_path=[speaker_wav],
+        max_ref_length=max_seconds or getattr(config, "max_ref_len", 30),
+        gpt_cond_len=getattr(config, "gpt_cond_len", 30),
+        gpt_cond_chunk_len=getattr(config, "gpt_cond_chunk_len", 4),
+        sound_norm_refs=getattr(config, "sound_norm_refs", False),
+    )
+    return {"gpt_cond_latent": gpt_cond_latent, "speaker_embedding": speaker_embedding}
+
+def load_speaker_conditioning(xtts, speaker_wav, cache_dir, max_seconds=None, device="cpu"):
+    """
+    Load cached conditioning for a reference clip, computing and saving it on a miss.
+
+    The cache file is keyed by the clip's content hash and the reference
+    duration used, so editing or replacing the sample invalidates it.
+    """
+    import torch
+
+    key = f"{file_sha256(speaker_wav)[:16]}_{max_seconds or 'default'}"
+    path = os.path.join(cache_dir, f"xtts_conditioning_{key}.pt")
+    if os.path.exists(path):
+        try:
+            conditioning = torch.load(path, map_location=device)
+            logger.info(f"Loaded cached speaker conditioning: {path}")
+            return conditioning
+        except Exception as e:
+            logger.warning(f"Recomputing unreadable speaker conditioning {path}: {e}")
+
+    start = time.perf_counter()
+    conditioning = compute_speaker_conditioning(xtts, speaker_wav, max_seconds)
+    logger.info(f"Computed speaker conditioning in {time.perf_counter() - start:.2f}s")
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    torch.save({name: tensor.cpu() for name, tensor in conditioning.items()}, tmp_path)
+    os.replace(tmp_path, path)
+    return conditioning
+
+def inference_settings(xtts):
+    """Sampling settings tts_to_file would use, from the model's config."""
+    config = xtts.config
+    return {
+        "temperature": getattr(config, "temperature", 0.75),
+        "length_penalty": getattr(config, "length_penalty", 1.0),
+        "repetition_penalty": getattr(config, "repetition_penalty", 10.0),
+        "top_k": getattr(config, "top_k", 50),
+        "top_p": getattr(config, "top_p", 0.85),
+    }
+
+def _conv1d_to_linear(module):
+    """
+    Swap transformers' Conv1D layers (GPT-2 stores its projections this way)
+    for equivalent nn.Linear ones, which dynamic quantization understands.
+    """
+    import torch
+
+    swapped = 0
+    for name, child in module.named_children():
+        if type(child).__name__ == "Conv1D" and hasattr(child, "nf"):
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features)
+            with torch.no_grad():
+                linear.weight.copy_(child.weight.t())
+                linear.bias.copy_(child.bias)
+            setattr(module, name, linear)
+            swapped += 1
+        else:
+            swapped += _conv1d_to_linear(child)
+    return swapped
+
+def optimize_xtts_for_cpu(xtts, mode):
+    """
+    Apply a CPU inference mode to a loaded Xtts model in place.
+
+    "int8" quantizes the linear layers of the GPT decoder (the autoregressive
+    transformer that dominates CPU synthesis time) to dynamic int8. The
+    conditioning encoder and speaker encoder stay fp32, so cached speaker
+    conditioning is the same in every mode. "int8+compile" also runs the
+    HiFi-GAN waveform decoder through torch.compile, falling back to eager
+    mode if compilation is unavailable.
+
+    Args:
+        xtts: The low-level Xtts model (TTS(...).synthesizer.tts_model).
+        mode (str): One of CPU_INFERENCE_MODES.
+    """
+    import torch
+
+    if mode not in CPU_INFERENCE_MODES:
+        raise ValueError(f"Unknown CPU inference mode: {mode}")
+    if mode == "fp32":
+        return
+
+    transformer = xtts.gpt.gpt
+    swapped = _conv1d_to_linear(transformer)
+    torch.quantization.quantize_dynamic(transformer, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    logger.info(f"Quantized the XTTS GPT decoder to int8 ({swapped} Conv1D projections converted)")
+
+    if mode == "int8+compile":
+        decoder = xtts.hifigan_decoder
+        try:
+            decoder.waveform_decoder = torch.compile(decoder.waveform_decoder, dynamic=True)
+            logger.info("Compiled the XTTS waveform decoder with torch.compile")
+        except Exception as e:
+            logger.warning(f"torch.compile unavailable, waveform decoder stays eager: {e}")
+
+def to_pcm16(waveform):
+    """Convert a float waveform in [-1, 1] to 16-bit little-endian PCM."""
+    samples = np.clip(np.asarray(waveform, dtype=np.float32), -1.0, 1.0)
+    return (samples * 32767).astype("<i2").tobytes()
+
 class LocalTTS:
     def __init__(self):
         """Initialize the Local TTS service using Coqui TTS."""
         self.model = None
+        self._registry = get_registry()
+        self._release_model = None
+        self._release_conditioning = None
+        self._release_audio_cache = None
+        # Cached speaker conditioning; None means XTTS conditions on speaker_wav per call
+        self.conditioning = None
         self.speaker_wav = "knowledge_base/voice_samples/oppenheimer_sample.wav"
+        self.sample_rate = XTTS_SAMPLE_RATE
+        # Time to first audio, synthesis time and real-time factor of the last request
+        self.last_synthesis_stats = None
+        # Seconds spent warming up the model, if this instance did it
+        self.warmup_seconds = None
+        
+        # torch and Coqui TTS are imported here rather than at module load,
+        # so that importing this module does not delay the first page render
+        import torch
         
         # Check for CUDA availability
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        logger.info(f"Using device: {self.device}")
+        # Quantization and compilation only apply on CPU
+        self.inference_mode = TTS_CONFIG["cpu_inference_mode"] if self.device == "cpu" else "fp32"
+        if self.inference_mode not in CPU_INFERENCE_MODES:
+            raise ValueError(f"Unknown CPU inference mode: {self.inference_mode}")
+        logger.info(f"Using device: {self.device} ({self.inference_mode})")
 
         # Ensure the voice sample exists
         if not os.path.exists(self.speaker_wav):
             raise FileNotFoundError(f"Speaker WAV file not found at: {self.speaker_wav}")
 
         self._initialize_model()
+        if TTS_CONFIG["cache_speaker_latents"]:
+            self._initialize_conditioning()
+        if TTS_CONFIG["warmup_on_load"]:
+            self._warm_up()
+
+        # Finished utterances, so repeated text is never synthesized twice; one
+        # cache per directory in the process, shared by every LocalTTS
+        self.audio_cache = None
+        if TTS_CONFIG["enable_audio_cache"]:
+            audio_cache_key = f"audio_cache:{TTS_CONFIG['audio_cache_dir']}"
+            self.audio_cache = self._registry.acquire(
+                audio_cache_key,
+                lambda: AudioCache(TTS_CONFIG["audio_cache_dir"], TTS_CONFIG["audio_cache_max_bytes"])
+            )
+            self._release_audio_cache = weakref.finalize(self, self._registry.release, audio_cache_key)
+            self._speaker_hash = file_sha256(self.speaker_wav)
 
     def _initialize_model(self):
-        """Load the XTTSv2 model."""
+        """Load the XTTSv2 model, shared with every other session in this process."""
+        self.model_key = f"tts:{XTTS_MODEL_NAME}:{self.device}:{self.inference_mode}"
         try:
-            logger.info("Initializing Coqui TTS with model: tts_models/multilingual/multi-dataset/xtts_v2")
-            self.model = TTS("tts_models/multilingual/multi-dataset/xtts_v2").to(self.device)
+            logger.info(f"Initializing Coqui TTS with model: {XTTS_MODEL_NAME}")
+            self.model = self._registry.acquire(self.model_key, self._load_model)
+            self._release_model = weakref.finalize(self, self._registry.release, self.model_key)
+            synthesizer = getattr(self.model, "synthesizer", None)
+            self.sample_rate = getattr(synthesizer, "output_sample_rate", None) or XTTS_SAMPLE_RATE
             logger.info("Coqui TTS model loaded successfully.")
         except Exception as e:
             logger.error(f"Failed to initialize Coqui TTS model: {e}")
             raise
 
-    def synthesize(self, text: str, output_path: str) -> str:
+    def _initialize_conditioning(self):
+        """Get the cloned voice's conditioning, shared by sessions and persisted to disk."""
+        xtts = getattr(getattr(self.model, "synthesizer", None), "tts_model", None)
+        if xtts is None or not hasattr(xtts, "get_conditioning_latents"):
+            logger.warning("TTS model has no XTTS inference path; conditioning on speaker_wav per call")
+            return
+        max_seconds = TTS_CONFIG["reference_max_seconds"]
+        self.conditioning_key = f"tts_conditioning:{os.path.abspath(self.speaker_wav)}:{max_seconds}:{self.device}"
+
+        def load():
+            # Computing the latents runs the model, which other sessions may be using
+            with self._registry.lock_for(self.model_key):
+                return load_speaker_conditioning(
+                    xtts, self.speaker_wav, TTS_CONFIG["speaker_latents_dir"], max_seconds, self.device
+                )
+
+        try:
+            self.conditioning = self._registry.acquire(self.conditioning_key, load)
+        except Exception as e:
+            logger.warning(f"Could not prepare speaker conditioning, using speaker_wav per call: {e}")
+            return
+        self._release_conditioning = weakref.finalize(self, self._registry.release, self.conditioning_key)
+        self._xtts = xtts
+        self._inference_settings = inference_settings(xtts)
+
+    def _warm_up(self):
         """
-        Synthesize speech from text using the cloned voice.
+        Synthesize a short phrase once per loaded model, so the first real
+        request does not pay for lazy initialization, kernel selection or
+        torch.compile tracing.
+        """
+        # Held throughout, so sessions starting meanwhile wait for a warm model
+        with self._registry.lock_for(self.model_key):
+            if getattr(self.model, "_warmed_up", False):
+                return
+            self.model._warmed_up = True
+            start = time.perf_counter()
+            try:
+                self._synthesize_segment(WARMUP_TEXT)
+                self.warmup_seconds = time.perf_counter() - start
+                logger.info(f"TTS warm-up took {self.warmup_seconds:.2f}s")
+            except Exception as e:
+                logger.warning(f"TTS warm-up failed: {e}")
+
+    def _synthesize_segment(self, segment):
+        """Waveform of one segment, from the cached conditioning when available."""
+        import torch
+
+        with self._registry.lock_for(self.model_key), torch.inference_mode(self.inference_mode != "fp32"):
+            if self.conditioning is not None:
+                return self._xtts.inference(
+                    segment, "en",
+                    self.conditioning["gpt_cond_latent"],
+                    self.conditioning["speaker_embedding"],
+                    **self._inference_settings
+                )["wav"]
+            return self.model.tts(text=segment, speaker_wav=self.speaker_wav, language="en")
+
+    def _load_model(self):
+        from TTS.api import TTS
+        model = TTS(XTTS_MODEL_NAME).to(self.device)
+        if self.inference_mode != "fp32":
+            optimize_xtts_for_cpu(model.synthesizer.tts_model, self.inference_mode)
+        return model
+
+    def close(self):
+        """Release this session's references to the shared TTS model and audio cache."""
+        if self._release_model:
+            self._release_model()
+        if self._release_conditioning:
+            self._release_conditioning()
+        if self._release_audio_cache:
+            self._release_audio_cache()
+        self.model = None
+        self.conditioning = None
+
+    def synthesize_stream(self, text):
+        """
+        Synthesize speech segment by segment, yielding audio as each one finishes.
+
+        The text is split at sentence boundaries (see split_into_segments), so
+        playback can start once the first sentence is ready. The shared model
+        is locked per segment, letting other sessions interleave. With cached
+        speaker conditioning, segments go straight to XTTS inference instead
+        of re-deriving the voice from speaker_wav each time.
 
         Args:
             text (str): The text to be synthesized.
-            output_path (str): The path to save the output audio file.
+
+        Yields:
+            bytes: Mono 16-bit PCM at self.sample_rate, one chunk per segment.
+        """
+        if not self.model:
+            raise RuntimeError("TTS model is not initialized.")
+
+        segments = split_into_segments(text)
+        start = time.perf_counter()
+        first_audio = None
+        samples = 0
+        try:
+            for segment in segments:
+                chunk = to_pcm16(self._synthesize_segment(segment))
+                samples += len(chunk) // 2
+                if first_audio is None:
+                    first_audio = time.perf_counter() - start
+                yield chunk
+        finally:
+            self._record_stats(len(segments), first_audio, time.perf_counter() - start, samples)
+
+    def _record_stats(self, segments, first_audio, elapsed, samples):
+        audio_seconds = samples / self.sample_rate
+        self.last_synthesis_stats = {
+            "segments": segments,
+            "time_to_first_audio_ms": first_audio * 1000 if first_audio is not None else None,
+            "synthesis_ms": elapsed * 1000,
+            "audio_seconds": audio_seconds,
+            "real_time_factor": elapsed / audio_seconds if audio_seconds else None,
+        }
+        if first_audio is not None:
+            logger.info(f"TTS: first audio {first_audio * 1000:.0f} ms, {audio_seconds:.1f} s of audio "
+                        f"in {elapsed * 1000:.0f} ms (RTF {self.last_synthesis_stats['real_time_factor']:.2f}, "
+                        f"{segments} segments)")
+
+    def _audio_key(self, text):
+        """Cache key of an utterance: text, voice reference, model and everything shaping the audio."""
+        voice_settings = {
+            "sample_rate": self.sample_rate,
+            "inference_mode": self.inference_mode,
+            "max_segment_chars": TTS_CONFIG["max_segment_chars"],
+            "reference_max_seconds": TTS_CONFIG["reference_max_seconds"] if self.conditioning else None,
+            "inference": getattr(self, "_inference_settings", None) if self.conditioning else None,
+        }
+        return audio_key(text, self._speaker_hash, XTTS_MODEL_NAME, voice_settings)
+
+    def synthesize_wav(self, text, cancelled=None):
+        """
+        Synthesize speech into an in-memory WAV, reusing cached audio for repeated text.
+
+        Args:
+            text (str): The text to be synthesized.
+            cancelled (Callable): Checked between segments; returning True
+                abandons the audio.
 
         Returns:
-            str: The path to the generated audio file.
+            Optional[bytes]: Mono 16-bit WAV, or None if cancelled or failed.
         """
         if not self.model:
             logger.error("TTS model is not initialized.")
             return None
 
+        key = self._audio_key(text) if self.audio_cache else None
+        if key:
+            cached_path = self.audio_cache.get(key)
+            if cached_path:
+                try:
+                    with open(cached_path, "rb") as file:
+                        wav_bytes = file.read()
+                    logger.info(f"Audio cache hit for text: '{text[:50]}...'")
+                    return wav_bytes
+                except OSError as e:
+                    # Evicted since the lookup, by this or another process
+                    logger.info(f"Cached audio gone, synthesizing again: {e}")
+
         try:
             logger.info(f"Synthesizing speech for text: '{text[:50]}...'")
-            self.model.tts_to_file(
-                text=text,
-                speaker_wav=self.speaker_wav,
-                language="en",
-                file_path=output_path,
-            )
-            logger.info(f"Speech synthesized successfully to: {output_path}")
-            return output_path
+            buffer = io.BytesIO()
+            with wave.open(buffer, "wb") as wav_file:
+                wav_file.setnchannels(1)
+                wav_file.setsampwidth(2)
+                wav_file.setframerate(self.sample_rate)
+                for chunk in self.synthesize_stream(text):
+                    if cancelled and cancelled():
+                        break
+                    wav_file.writeframes(chunk)
+            if cancelled and cancelled():
+                logger.info("Speech synthesis cancelled")
+                return None
+            wav_bytes = buffer.getvalue()
+            if key:
+                self.audio_cache.put_bytes(key, wav_bytes)
+            return wav_bytes
         except Exception as e:
             logger.error(f"Error during speech synthesis: {e}")
             return None
 
+    def synthesize_audio(self, text, audio_format=None, cancelled=None):
+        """
+        Synthesize speech as in-memory bytes for playback.
+
+        Args:
+            text (str): The text to be synthesized.
+            audio_format (str): "wav", "wav16k" or "ogg" (see audio_buffers);
+                defaults to TTS_CONFIG["audio_format"].
+            cancelled (Callable): Checked between segments.
+
+        Returns:
+            Optional[Tuple[bytes, str]]: The audio and its MIME type, or None.
+        """
+        wav_bytes = self.synthesize_wav(text, cancelled)
+        if wav_bytes is None:
+            return None
+        return encode_audio(wav_bytes, audio_format or TTS_CONFIG["audio_format"])
+
+    def synthesize(self, text, output_path, cancelled=None):
+        """
+        Synthesize speech from text using the cloned voice.
+
+        Args:
+            text (str): The text to be synthesized.
+            output_path (str): The path to save the output audio file.
+            cancelled (Callable): Checked between segments; returning True
+                abandons the file.
+
+        Returns:
+            str: The path to the generated audio file.
+        """
+        wav_bytes = self.synthesize_wav(text, cancelled)
+        if wav_bytes is None:
+            return None
+        tmp_path = f"{output_path}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(wav_bytes)
+        os.replace(tmp_path, output_path)
+        logger.info(f"Speech synthesized successfully to: {output_path}")
+        return output_path
+
 def test_local_tts():
     """Test the LocalTTS service with a sample text."""
     print("Testing Local TTS...")
@@ -72,6 +495,7 @@ def test_local_tts():
         tts.synthesize(text, output_file)
         if os.path.exists(output_file):
             print(f"Test audio successfully generated at: {output_file}")
+            print(f"Synthesis stats: {tts.last_synthesis_stats}")
         else:
             print("Test audio generation failed.")
     except Exception as e:
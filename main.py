@@ -1,12 +1,17 @@
 import streamlit as st
-import os
+import uuid
+import weakref
 from datetime import datetime
 import logging
 from dotenv import load_dotenv
 
-# Import our custom modules
-from oppenheimer_persona import OppenheimerPersona
-from local_tts_service import LocalTTS
+# Import our custom modules. The persona and TTS modules pull in the heavy
+# model libraries, so they are imported when the first session is created.
+from model_registry import get_registry
+from audio_worker import AudioSynthesisWorker, AUDIO_WORKER_KEY, PRIORITY_BACKGROUND
+from audio_buffers import SessionAudioStore, EXTENSIONS, mime_for_path
+from intro_pool import IntroductionPool, INTRO_POOL_KEY
+from config import TTS_CONFIG, OPTIMIZATION_CONFIG
 
 # Load environment variables
 load_dotenv()
@@ -15,11 +20,119 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Acts as a container for our initialized services
+# Acts as a container for our initialized services.
+# Heavy models live in the process-wide registry; this only holds per-session state.
 class ConversationalTimeMachine:
     def __init__(self):
+        from oppenheimer_persona import OppenheimerPersona
+        
         self.persona = OppenheimerPersona()
-        self.tts = LocalTTS()
+        # Synthesis runs on a process-wide background worker that owns the TTS model
+        self.session_id = uuid.uuid4().hex
+        self.audio_worker = get_registry().acquire(AUDIO_WORKER_KEY, AudioSynthesisWorker)
+        # Also runs when an abandoned session is garbage collected
+        self._end_session = weakref.finalize(self, _end_audio_session, self.audio_worker, self.session_id)
+        # Ready-made introductions with audio, shared by all sessions
+        self.intro_pool = None
+        if OPTIMIZATION_CONFIG["enable_intro_pool"]:
+            self.intro_pool = get_registry().acquire(INTRO_POOL_KEY, lambda: IntroductionPool(
+                OPTIMIZATION_CONFIG["intro_pool_dir"],
+                size=OPTIMIZATION_CONFIG["intro_pool_size"],
+                max_uses=OPTIMIZATION_CONFIG["intro_pool_max_uses"]
+            ))
+            self._release_pool = weakref.finalize(self, get_registry().release, INTRO_POOL_KEY)
+        logger.info(f"Shared resources: {get_registry().get_stats()}")
+
+    def introduction(self):
+        """
+        The opening message, without waiting for Gemini or TTS.
+        
+        Returns:
+            Tuple[str, Optional[Tuple[bytes, str]]]: The text and, when it came
+            from the pool, its audio and MIME type. While the pool is empty the
+            stock introduction is used and its audio is left to the worker.
+        """
+        from oppenheimer_persona import DEFAULT_INTRODUCTION
+        
+        if self.intro_pool is None:
+            return self.persona.get_introduction(), None
+        pooled = self.intro_pool.take()
+        # Whatever was just taken or retired is replaced in the background. The refill
+        # may outlive this session, so it holds the session weakly and the worker directly
+        time_machine = weakref.ref(self)
+        audio_worker = self.audio_worker
+        self.intro_pool.refill(
+            lambda: _pool_introduction(time_machine),
+            lambda text: _synthesize_pool_introduction(audio_worker, text)
+        )
+        if pooled is None:
+            return DEFAULT_INTRODUCTION, None
+        text, audio, mime = pooled
+        return text, (audio, mime)
+
+    def close(self):
+        """Cancel this session's audio jobs and release its references to the shared models."""
+        self._end_session()
+        if self.intro_pool is not None:
+            self._release_pool()
+        self.persona.close()
+
+def _end_audio_session(audio_worker, session_id):
+    audio_worker.cancel_session(session_id)
+    get_registry().release(AUDIO_WORKER_KEY)
+
+def _pool_introduction(time_machine_ref):
+    time_machine = time_machine_ref()
+    # Nothing more is generated for a session that has been closed or collected
+    if time_machine is None or not time_machine._end_session.alive:
+        return None
+    return time_machine.persona.get_introduction(fallback=False)
+
+def _synthesize_pool_introduction(audio_worker, text):
+    # Pool jobs are queued under their own session id, so closing a session leaves them
+    # running, and behind every answer waiting for its audio
+    job_id = audio_worker.submit(text, session_id=INTRO_POOL_KEY, audio_format=TTS_CONFIG["audio_format"],
+                                 priority=PRIORITY_BACKGROUND)
+    job = audio_worker.wait(job_id)
+    audio_worker.forget(job_id)
+    if job is None or job['state'] != 'done':
+        return None
+    return job['audio'], job['mime']
+
+@st.fragment(run_every=1.0)
+def poll_audio_jobs():
+    """Collect finished audio jobs every second without blocking the rest of the page."""
+    time_machine = st.session_state.time_machine
+    worker = time_machine.audio_worker
+    messages = {message.get('id'): message for message in st.session_state.conversation_history}
+    finished = False
+    
+    for message_id, job_id in list(st.session_state.audio_job.items()):
+        job = worker.status(job_id)
+        if job is not None and job['state'] in ('queued', 'running'):
+            continue
+        
+        message = messages.get(message_id)
+        audio = job['audio'] if job is not None and job['state'] == 'done' else None
+        if message is not None:
+            message['audio'] = 'ready' if audio else None
+            if audio:
+                st.session_state.audio_buffers.put(message_id, audio, job['mime'])
+        if job is not None and job['error']:
+            logger.error(f"Audio synthesis failed: {job['error']}")
+        response_cache = time_machine.persona.response_cache
+        if audio and message is not None and message.get('cache_key') and response_cache is not None:
+            response_cache.add_audio(message['cache_key'], audio, job['synthesis_ms'], EXTENSIONS[job['mime']])
+        
+        del st.session_state.audio_job[message_id]
+        worker.forget(job_id)
+        finished = True
+    
+    if finished:
+        # Full rerun, so the new audio players appear under their messages
+        st.rerun()
+    elif st.session_state.audio_job:
+        st.caption(f"Synthesizing voice... ({len(st.session_state.audio_job)} pending)")
 
 def main():
     """Main Streamlit application with a robust streaming response implementation."""
@@ -515,11 +628,13 @@ def main():
     </style>
     """, unsafe_allow_html=True)
     
-    # Initialize session state first
-    if 'time_machine' not in st.session_state:
-        st.session_state.time_machine = ConversationalTimeMachine()
+    # Initialize session state first; the models are loaded once the header is on screen
+    if 'conversation_history' not in st.session_state:
         st.session_state.conversation_history = []
-        st.session_state.audio_job = None
+        st.session_state.audio_job = {}  # Message id -> background synthesis job id
+        # Message id -> synthesized audio bytes, in memory and under a byte budget
+        st.session_state.audio_buffers = SessionAudioStore(TTS_CONFIG["session_audio_max_bytes"])
+        st.session_state.pending_question = None  # Answered (streamed) on the next run
         st.session_state.initialized = False
         st.session_state.user_input = ""  # For clearing input after submit
     
@@ -550,15 +665,22 @@ def main():
     </div>
     """, unsafe_allow_html=True)
     
-    # Generate introduction on first run
+    if 'time_machine' not in st.session_state:
+        with st.spinner("Preparing the time machine..."):
+            st.session_state.time_machine = ConversationalTimeMachine()
+    
+    # Introduction on first run, taken from the pre-generated pool
     if not st.session_state.initialized:
         with st.spinner("Awakening the consciousness of history..."):
-            intro = st.session_state.time_machine.persona.get_introduction()
-            st.session_state.conversation_history.append({
-                'id': 'msg_intro', 'type': 'oppenheimer', 'content': intro, 'audio_path': None
-            })
-            st.session_state.initialized = True
-            st.rerun()
+            intro, intro_audio = st.session_state.time_machine.introduction()
+        if intro_audio:
+            st.session_state.audio_buffers.put('msg_intro', *intro_audio)
+        st.session_state.conversation_history.append({
+            'id': 'msg_intro', 'type': 'oppenheimer', 'content': intro,
+            'audio': 'ready' if intro_audio else 'pending'
+        })
+        st.session_state.initialized = True
+        st.rerun()
 
     # --- Clean conversation display ---
     chat_container = st.container()
@@ -583,10 +705,57 @@ def main():
                 </div>
                 """, unsafe_allow_html=True)
                 
-                # Show audio player if audio exists
-                audio_path = message.get('audio_path')
-                if audio_path and audio_path != 'pending' and os.path.exists(audio_path):
-                    st.audio(audio_path, format='audio/wav')
+                # Show audio player if audio exists (it may have been dropped to stay in budget)
+                audio = st.session_state.audio_buffers.get(message['id'])
+                if audio:
+                    st.audio(audio[0], format=audio[1])
+        
+        # Stream the answer to a just-submitted question in place, below the question
+        if st.session_state.pending_question:
+            persona = st.session_state.time_machine.persona
+            placeholder = st.empty()
+            streamed = ""
+            for delta in persona.generate_response_stream(st.session_state.pending_question):
+                streamed += delta
+                placeholder.markdown(f"""
+                <div class="message message-assistant">
+                    <div class="message-content">
+                        {streamed}▌
+                    </div>
+                </div>
+                """, unsafe_allow_html=True)
+            
+            # Show the answer as kept: trimmed for speech, or only the apology if the stream failed
+            placeholder.markdown(f"""
+            <div class="message message-assistant">
+                <div class="message-content">
+                    {persona.last_response}
+                </div>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            # Add response to history with pending audio
+            response_message = {
+                'type': 'oppenheimer', 
+                'content': persona.last_response, 
+                'audio': 'pending',
+                'id': f"msg_{len(st.session_state.conversation_history)}",
+                'cache_key': persona.last_cache_key
+            }
+            if persona.last_cached_audio:
+                # Cached answers come with their audio; keep a copy in memory so eviction can't remove it
+                try:
+                    with open(persona.last_cached_audio, 'rb') as audio_file:
+                        st.session_state.audio_buffers.put(
+                            response_message['id'], audio_file.read(), mime_for_path(persona.last_cached_audio)
+                        )
+                    response_message['audio'] = 'ready'
+                except OSError as e:
+                    # Another process evicted it since the lookup; synthesize it again
+                    logger.warning(f"Cached audio unavailable, synthesizing instead: {e}")
+            st.session_state.conversation_history.append(response_message)
+            st.session_state.pending_question = None
+            st.rerun()
         
         st.markdown('</div>', unsafe_allow_html=True)
     
@@ -616,36 +785,23 @@ def main():
         # Clear the input field for next message
         st.session_state.user_input = ""
         
-        # Show loading state while generating response
-        with st.spinner("Dr. Oppenheimer is contemplating your question..."):
-            # Generate text response
-            text_response = st.session_state.time_machine.persona.generate_response(user_input.strip())
-            
-            # Add response to history with pending audio
-            response_message = {
-                'type': 'oppenheimer', 
-                'content': text_response, 
-                'audio_path': 'pending',
-                'id': f"msg_{len(st.session_state.conversation_history)}"
-            }
-            st.session_state.conversation_history.append(response_message)
+        # The answer is streamed into the chat on the next run
+        st.session_state.pending_question = user_input.strip()
         
-        # Rerun to show the text response immediately
+        # Rerun to show the question and stream the answer
         st.rerun()
 
-    # Handle audio synthesis for pending messages
+    # Queue synthesis of new answers on the background worker; the page stays responsive
     for message in st.session_state.conversation_history:
-        if message['type'] == 'oppenheimer' and message.get('audio_path') == 'pending':
-            # Generate audio in background
-            audio_file = f"oppenheimer_response_{message['id']}.wav"
-            try:
-                with st.spinner("Synthesizing voice..."):
-                    audio_path = st.session_state.time_machine.tts.synthesize(message['content'], audio_file)
-                    message['audio_path'] = audio_path if audio_path else None
-                st.rerun()
-            except Exception as e:
-                logger.error(f"Audio synthesis failed: {e}")
-                message['audio_path'] = None
+        if (message['type'] == 'oppenheimer' and message.get('audio') == 'pending'
+                and message['id'] not in st.session_state.audio_job):
+            st.session_state.audio_job[message['id']] = st.session_state.time_machine.audio_worker.submit(
+                message['content'],
+                session_id=st.session_state.time_machine.session_id,
+                audio_format=TTS_CONFIG["audio_format"]
+            )
+    if st.session_state.audio_job:
+        poll_audio_jobs()
     
     # --- Enhanced Sidebar ---
     with st.sidebar:
@@ -666,6 +822,10 @@ def main():
         st.markdown("---")
         
         if st.button("Start Fresh Conversation", use_container_width=True):
+            if 'time_machine' in st.session_state:
+                st.session_state.time_machine.close()
+            if 'audio_buffers' in st.session_state:
+                st.session_state.audio_buffers.clear()
             # Clear all session state
             for key in list(st.session_state.keys()):
                 del st.session_state[key]
@@ -681,6 +841,43 @@ def main():
         • Response optimization for cost and quality
         </small>
         """, unsafe_allow_html=True)
+        
+        if 'time_machine' in st.session_state and st.session_state.time_machine.persona.response_cache:
+            cache_stats = st.session_state.time_machine.persona.response_cache.get_stats()
+            st.caption(
+                f"Response cache: {cache_stats['hit_rate']:.0%} hit rate "
+                f"({cache_stats['hits']}/{cache_stats['lookups']}), "
+                f"{cache_stats['latency_saved_ms'] / 1000:.1f}s saved"
+            )
+        
+        if 'time_machine' in st.session_state and st.session_state.time_machine.persona.chat is not None:
+            persona = st.session_state.time_machine.persona
+            persona_stats = persona.chat.persona_model.get_stats()
+            caption = f"Chat mode: persona {'cached' if persona_stats['cached'] else 'not cached'}"
+            if persona.last_prompt_tokens:
+                caption += f", last prompt {persona.last_prompt_tokens} tokens ({persona.last_cached_tokens} cached)"
+            st.caption(caption)
+        
+        if 'time_machine' in st.session_state and st.session_state.time_machine.audio_worker.tts.audio_cache:
+            audio_stats = st.session_state.time_machine.audio_worker.tts.audio_cache.get_stats()
+            st.caption(
+                f"Audio cache: {audio_stats['hit_rate']:.0%} hit rate, {audio_stats['entries']} files, "
+                f"{audio_stats['disk_bytes'] / 1e6:.1f} / {audio_stats['max_bytes'] / 1e6:.0f} MB"
+            )
+        
+        if 'time_machine' in st.session_state and st.session_state.time_machine.intro_pool:
+            pool_stats = st.session_state.time_machine.intro_pool.get_stats()
+            st.caption(
+                f"Introduction pool: {pool_stats['entries']} / {pool_stats['size']} ready"
+                f"{', refilling' if pool_stats['refilling'] else ''}"
+            )
+        
+        if 'audio_buffers' in st.session_state:
+            buffer_stats = st.session_state.audio_buffers.get_stats()
+            st.caption(
+                f"Session audio: {buffer_stats['messages']} clips, "
+                f"{buffer_stats['bytes'] / 1e6:.1f} / {buffer_stats['max_bytes'] / 1e6:.0f} MB in memory"
+            )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
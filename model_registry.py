@@ -0,0 +1,190 @@
+import os
+import sys
+import threading
+import time
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _current_rss_bytes():
+    """Return the resident set size of this process in bytes, if it can be read."""
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    try:
+        import resource
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+    except (ImportError, OSError):
+        return None
+
+class _RegistryEntry:
+    """Book-keeping for one shared resource."""
+
+    def __init__(self, name):
+        self.name = name
+        self.resource = None
+        self.loaded = False
+        self.ref_count = 0
+        self.load_time = 0.0
+        self.rss_delta = None
+        self.loaded_at = None
+        # Serialises the (slow) load of this entry without blocking other entries
+        self.load_lock = threading.Lock()
+        # Shared by every session using the resource, for non-thread-safe models
+        self.use_lock = threading.RLock()
+
+class ModelRegistry:
+    """
+    Process-wide registry of heavy resources (TTS model, embedding model,
+    Chroma client/collection, Gemini handles) shared by all Streamlit sessions.
+
+    Each resource is loaded once by its loader callable and handed out with a
+    reference count. Per-session state (conversation history, usage tracking)
+    stays on the session's own objects.
+    """
+
+    def __init__(self, evict_unused=False):
+        """
+        Args:
+            evict_unused (bool): Drop a resource when its reference count reaches
+                zero. By default resources stay resident so the next visitor does
+                not pay the cold load again.
+        """
+        self.evict_unused = evict_unused
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def _get_entry(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                entry = _RegistryEntry(name)
+                self._entries[name] = entry
+            return entry
+
+    def acquire(self, name, loader):
+        """
+        Get a shared resource, loading it on first use, and take a reference.
+
+        Args:
+            name (str): Unique key of the resource, e.g. "tts:xtts_v2:cpu".
+            loader (Callable): Builds the resource; only called once per process.
+
+        Returns:
+            Any: The shared resource.
+        """
+        entry = self._get_entry(name)
+
+        with entry.load_lock:
+            if not entry.loaded:
+                logger.info(f"Loading shared resource: {name}")
+                rss_before = _current_rss_bytes()
+                start = time.perf_counter()
+                entry.resource = loader()
+                entry.load_time = time.perf_counter() - start
+                rss_after = _current_rss_bytes()
+                if rss_before is not None and rss_after is not None:
+                    entry.rss_delta = rss_after - rss_before
+                entry.loaded_at = time.time()
+                entry.loaded = True
+                logger.info(f"Loaded shared resource {name} in {entry.load_time:.2f}s")
+
+            with self._lock:
+                entry.ref_count += 1
+            return entry.resource
+
+    def release(self, name):
+        """Drop one reference to a resource, evicting it if configured to."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry.ref_count == 0:
+                return
+            entry.ref_count -= 1
+            should_evict = self.evict_unused and entry.ref_count == 0
+
+        if should_evict:
+            with entry.load_lock:
+                # A new session may have grabbed it while we waited for the lock
+                if entry.ref_count == 0 and entry.loaded:
+                    logger.info(f"Evicting unused shared resource: {name}")
+                    entry.resource = None
+                    entry.loaded = False
+
+    def lock_for(self, name):
+        """Get the lock guarding concurrent use of a resource across sessions."""
+        return self._get_entry(name).use_lock
+
+    def is_loaded(self, name):
+        """Check whether a resource is currently resident."""
+        with self._lock:
+            entry = self._entries.get(name)
+            return bool(entry and entry.loaded)
+
+    def get_stats(self):
+        """Get load time, reference count and memory figures for every resource."""
+        with self._lock:
+            resources = {
+                name: {
+                    "loaded": entry.loaded,
+                    "ref_count": entry.ref_count,
+                    "load_time_seconds": round(entry.load_time, 3),
+                    "rss_delta_bytes": entry.rss_delta,
+                    "loaded_at": entry.loaded_at,
+                }
+                for name, entry in self._entries.items()
+            }
+        return {
+            "process_rss_bytes": _current_rss_bytes(),
+            "resources": resources,
+        }
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    """Get the process-wide model registry."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
+
+def test_model_registry():
+    """Test that concurrent sessions share one load of a resource."""
+    registry = ModelRegistry(evict_unused=True)
+    load_calls = []
+
+    def slow_loader():
+        load_calls.append(1)
+        time.sleep(0.1)
+        return object()
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(registry.acquire("demo", slow_loader)))
+        for _ in range(20)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"Loader calls: {len(load_calls)} (expected 1)")
+    print(f"Distinct resources handed out: {len(set(map(id, results)))} (expected 1)")
+    print(f"Stats: {registry.get_stats()}")
+
+    for _ in range(20):
+        registry.release("demo")
+    print(f"Loaded after all releases: {registry.is_loaded('demo')} (expected False)")
+
+if __name__ == "__main__":
+    test_model_registry()
@@ -0,0 +1,121 @@
+import os
+import logging
+import threading
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# sentence-transformers embeds at most 256 tokens with all-MiniLM-L6-v2
+MAX_SEQUENCE_LENGTH = 256
+
+def default_model_dir():
+    """Where ChromaDB keeps its ONNX export of all-MiniLM-L6-v2."""
+    return os.path.join(
+        os.path.expanduser("~"), ".cache", "chroma", "onnx_models", "all-MiniLM-L6-v2", "onnx"
+    )
+
+def _download_model():
+    """Fetch the ONNX export with ChromaDB's downloader (checksum-verified)."""
+    from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+    ONNXMiniLM_L6_V2()._download_model_if_not_exists()
+
+def quantize_model(model_path, quantized_path):
+    """Write a dynamically int8-quantized copy of an ONNX model (weights int8, activations float)."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    tmp_path = f"{quantized_path}.tmp"
+    quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QInt8)
+    os.replace(tmp_path, quantized_path)
+    return quantized_path
+
+class OnnxEmbeddingFunction:
+    """
+    Chroma-style embedding function running a sentence-transformers model
+    (all-MiniLM-L6-v2) through ONNX Runtime on CPU.
+
+    Mean-pools the last hidden state over the attention mask and L2-normalizes,
+    matching the sentence-transformers pipeline, so it embeds into the same
+    space as the PyTorch model. Batches are padded only to their longest text,
+    not to the full sequence length, which keeps short queries cheap.
+    """
+
+    def __init__(self, model_dir=None, quantize=False, num_threads=None, batch_size=32):
+        """
+        Args:
+            model_dir (str): Directory with model.onnx and tokenizer.json.
+                Defaults to ChromaDB's cached export, downloaded if missing.
+            quantize (bool): Run a dynamic int8-quantized copy of the model,
+                created next to the original on first use.
+            num_threads (int): Intra-op threads for ONNX Runtime; None lets it decide.
+            batch_size (int): Texts per inference call.
+        """
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.model_dir = model_dir or default_model_dir()
+        self.num_threads = num_threads
+        self.batch_size = batch_size
+        model_path = os.path.join(self.model_dir, "model.onnx")
+        if not os.path.exists(model_path) and model_dir is None:
+            logger.info("Downloading the ONNX embedding model")
+            _download_model()
+
+        self.quantized = False
+        if quantize:
+            quantized_path = os.path.join(self.model_dir, "model_int8.onnx")
+            try:
+                if not os.path.exists(quantized_path):
+                    logger.info("Quantizing the ONNX embedding model to int8")
+                    quantize_model(model_path, quantized_path)
+                model_path = quantized_path
+                self.quantized = True
+            except Exception as e:
+                logger.warning(f"Could not quantize the embedding model, using float32: {e}")
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQUENCE_LENGTH)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+        # The tokenizer is not safe to share between threads mid-batch
+        self._lock = threading.Lock()
+        dimension = self.session.get_outputs()[0].shape[-1]
+        self.dimension = dimension if isinstance(dimension, int) else None
+
+    @property
+    def runtime(self):
+        return "onnx-int8" if self.quantized else "onnx"
+
+    def embed(self, texts):
+        """Embed texts into L2-normalized float32 rows."""
+        if not texts:
+            return np.zeros((0, self.dimension or 0), dtype=np.float32)
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            with self._lock:
+                encoded = self.tokenizer.encode_batch(texts[start:start + self.batch_size])
+            input_ids = np.array([item.ids for item in encoded], dtype=np.int64)
+            attention_mask = np.array([item.attention_mask for item in encoded], dtype=np.int64)
+            inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self._input_names:
+                inputs["token_type_ids"] = np.zeros_like(input_ids)
+
+            hidden_state = self.session.run(None, inputs)[0]
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (hidden_state * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            batches.append((pooled / np.maximum(norms, 1e-12)).astype(np.float32))
+        return np.concatenate(batches)
+
+    def __call__(self, input):
+        return self.embed(list(input)).tolist()
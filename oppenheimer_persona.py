@@ -1,11 +1,21 @@
 import google.generativeai as genai
 import os
 import logging
+import time
+import weakref
 from datetime import datetime
 from dotenv import load_dotenv
+from concurrent.futures import Future, ThreadPoolExecutor
+from config import OPTIMIZATION_CONFIG, RESPONSE_CONFIG, RAG_CONFIG
+from model_registry import get_registry
 from rag_system import OppenheimerRAG
-from response_optimizer import ResponseOptimizer, ResponseType
+from response_optimizer import ResponseOptimizer
 from ai_length_optimizer import AILengthOptimizer
+from length_predictor import LengthPredictor
+from response_cache import SemanticResponseCache
+from stage_executor import StageExecutor, format_timings
+from conversation_memory import ConversationMemory, SUMMARY_POOL_KEY
+from chat_session import PersonaModel, PersonaChat, CHAT_INSTRUCTIONS, prompt_token_count, cached_token_count
 
 # Load environment variables
 load_dotenv()
@@ -14,36 +24,140 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+RESPONSE_CACHE_KEY = f"response_cache:{OPTIMIZATION_CONFIG['response_cache_dir']}"
+# Length guidance decided by Gemini, from its cache, or by the predictor trained on its decisions
+AI_GUIDANCE_SOURCES = ('ai_powered', 'ai_cached', 'local_predictor')
+# Served while no generated introduction is available
+DEFAULT_INTRODUCTION = "I am J. Robert Oppenheimer. Perhaps you know me as the man who helped bring atomic fire to this world."
+
 class OppenheimerPersona:
     def __init__(self):
         """Initialize the Oppenheimer persona with RAG system."""
         # Configure Gemini API
         genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
         
-        # Initialize the model
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        # Initialize the model (shared handle; sessions only keep their own history)
+        self.model_name = 'gemini-2.5-flash'
+        self.model_key = f"gemini:{self.model_name}"
+        registry = get_registry()
+        self.model = registry.acquire(
+            self.model_key,
+            lambda: genai.GenerativeModel(self.model_name)
+        )
+        self._release_model = weakref.finalize(self, registry.release, self.model_key)
         
         # Initialize RAG system
         self.rag = OppenheimerRAG()
         
+        # Semantic cache of answers to self-contained questions, shared by all
+        # sessions in this process and, through its directory, across processes
+        self.response_cache = None
+        if OPTIMIZATION_CONFIG["enable_response_cache"]:
+            self.response_cache = registry.acquire(
+                RESPONSE_CACHE_KEY,
+                lambda: SemanticResponseCache(
+                    OPTIMIZATION_CONFIG["response_cache_dir"],
+                    similarity_threshold=OPTIMIZATION_CONFIG["cache_similarity_threshold"],
+                    max_size=OPTIMIZATION_CONFIG["max_cache_size"],
+                    policy=OPTIMIZATION_CONFIG["cache_eviction_policy"]
+                )
+            )
+            self._release_cache = weakref.finalize(self, registry.release, RESPONSE_CACHE_KEY)
+        # Cache entry and cached audio of the last answer, for attaching its synthesized audio
+        self.last_cache_key = None
+        self.last_cached_audio = None
+        # Final text and timings of the last turn
+        self.last_response = None
+        self.last_turn_timings = None
+        self.last_stage_timings = None
+        # Prompt tokens sent for the last generated answer, and those served from cached content
+        self.last_prompt_tokens = None
+        self.last_cached_tokens = None
+        
         # Initialize response optimizer
         self.optimizer = ResponseOptimizer()
         
-        # Initialize AI-powered length optimizer
+        # Initialize AI-powered length optimizer (local predictor or Gemini)
         try:
-            self.ai_length_optimizer = AILengthOptimizer()
+            self.ai_length_optimizer = self._create_length_optimizer()
             self.use_ai_optimization = True
-            logger.info("AI length optimizer initialized successfully")
+            logger.info(f"AI length optimizer initialized successfully "
+                       f"({type(self.ai_length_optimizer).__name__})")
         except Exception as e:
             logger.warning(f"AI length optimizer failed to initialize: {e}")
             self.ai_length_optimizer = None
             self.use_ai_optimization = False
         
-        # Conversation history
+        # Thread pool running independent stages of a turn side by side
+        self.stage_executor = registry.acquire("stage_executor", StageExecutor)
+        self._release_stage_executor = weakref.finalize(self, registry.release, "stage_executor")
+        
+        # Conversation history: recent exchanges with their metadata, for the optimizers
         self.conversation_history = []
         
+        # What the prompt sees: a rolling summary of older exchanges, updated
+        # in the background, plus the latest ones verbatim within a token budget
+        summary_pool = registry.acquire(
+            SUMMARY_POOL_KEY,
+            lambda: ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+        )
+        self._release_summary_pool = weakref.finalize(self, registry.release, SUMMARY_POOL_KEY)
+        self.memory = ConversationMemory(
+            self._summarize_history,
+            recent_token_budget=RESPONSE_CONFIG["history_recent_token_budget"],
+            summary_token_budget=RESPONSE_CONFIG["history_summary_token_budget"],
+            executor=summary_pool
+        )
+        
         # Persona system prompt
         self.system_prompt = self._create_system_prompt()
+        
+        # Chat mode: the persona is the system instruction of a shared model, cached
+        # where possible, and each turn sends the past exchanges as messages plus
+        # its own context and question
+        self.chat = None
+        if OPTIMIZATION_CONFIG["chat_session_mode"]:
+            self.chat_model_key = f"gemini:{self.model_name}:persona_chat"
+            persona_model = registry.acquire(
+                self.chat_model_key,
+                lambda: PersonaModel(
+                    self.model_name,
+                    self.system_prompt + "\n" + CHAT_INSTRUCTIONS,
+                    cache_ttl=OPTIMIZATION_CONFIG["persona_cache_ttl"],
+                    token_counter=self.memory.token_counter
+                )
+            )
+            self._release_chat_model = weakref.finalize(self, registry.release, self.chat_model_key)
+            self.chat = PersonaChat(persona_model, self.memory)
+    
+    def close(self):
+        """Release this session's references to shared models."""
+        self._release_model()
+        if self.response_cache is not None:
+            self.response_cache.flush_usage()
+            self._release_cache()
+        self.rag.close()
+        if self.ai_length_optimizer:
+            self.ai_length_optimizer.close()
+        self._release_stage_executor()
+        self._release_summary_pool()
+        if self.chat is not None:
+            self._release_chat_model()
+    
+    def _create_length_optimizer(self):
+        """The local length predictor if configured and trained, otherwise the Gemini optimizer."""
+        mode = OPTIMIZATION_CONFIG["length_optimizer"]
+        if mode in ("local", "auto"):
+            predictor = LengthPredictor.load(
+                OPTIMIZATION_CONFIG["length_predictor_path"],
+                embed_query=self.rag.embed_query,
+                embedder=self.rag.embedding_function.embedder_id
+            )
+            if predictor is not None:
+                return predictor
+            if mode == "local":
+                raise ValueError("No trained length predictor; run: python evaluate_length_predictor.py --train")
+        return AILengthOptimizer()
     
     def _create_system_prompt(self):
         """Create the comprehensive system prompt for Oppenheimer persona."""
@@ -115,55 +229,239 @@ Remember: You are not an AI discussing Oppenheimer - you ARE Oppenheimer speakin
         Returns:
             str: Oppenheimer's response
         """
+        for _ in self.generate_response_stream(user_question):
+            pass
+        return self.last_response
+    
+    def generate_response_stream(self, user_question):
+        """
+        Generate a response as Oppenheimer, yielding text as Gemini produces it.
+        
+        History, usage and the response cache are updated once the answer is
+        complete. The final text (shortened for TTS if it ran far over the
+        target length) is then available as self.last_response.
+        
+        Args:
+            user_question (str): The user's question or comment
+            
+        Yields:
+            str: Successive pieces of Oppenheimer's response
+        """
+        start_time = time.perf_counter()
+        first_token_time = None
+        source = 'error'
+        self.last_response = None
+        self.last_stage_timings = None
+        self.last_cache_key = None
+        self.last_cached_audio = None
+        self.last_prompt_tokens = None
+        self.last_cached_tokens = None
+        
         try:
-            # Get relevant context from RAG system first
-            relevant_context = self.rag.get_relevant_context(user_question)
+            # Serve repeated self-contained questions from the response cache. It
+            # matches questions by embedding, so lexical retrieval (which needs no
+            # embedding model) goes without it
+            query_embedding = None
+            if self.response_cache is not None and RAG_CONFIG["retrieval_mode"] != "lexical":
+                query_embedding = self.rag.embed_query(user_question)
+                cached = self.response_cache.lookup(user_question, query_embedding)
+                if cached is not None:
+                    self.last_cache_key = cached['key']
+                    self.last_cached_audio = cached['audio_path']
+                    self._record_exchange(user_question, cached['response'], {
+                        'response_type': 'cached',
+                        'estimated_cost': 0.0,
+                        'optimization_source': 'response_cache'
+                    })
+                    source = 'response_cache'
+                    first_token_time = time.perf_counter()
+                    self.last_response = cached['response']
+                    yield cached['response']
+                    return
             
-            # Use AI-powered length optimization if available
-            if self.use_ai_optimization and self.ai_length_optimizer:
-                ai_guidance = self.ai_length_optimizer.analyze_optimal_length(
-                    user_question, 
-                    relevant_context, 
-                    self.conversation_history
-                )
-                
-                # Convert AI guidance to standard format
-                guidance = {
-                    'response_type': ResponseType.PHILOSOPHICAL,  # Will be overridden
-                    'min_length': ai_guidance['optimal_min_length'],
-                    'max_length': ai_guidance['optimal_max_length'],
-                    'detail_level': ai_guidance['response_type'].lower(),
-                    'guidance': ai_guidance['reasoning'],
-                    'estimated_cost': ai_guidance['estimated_cost'],
-                    'optimization_source': 'ai_powered'
-                }
-                
-                logger.info(f"AI optimization: {ai_guidance['response_type']} "
-                           f"({guidance['min_length']}-{guidance['max_length']} chars, "
-                           f"${guidance['estimated_cost']:.4f})")
+            relevant_context, guidance = self._run_stages(user_question, query_embedding)
+            source = guidance['optimization_source']
+            if self.chat is not None:
+                contents = self.chat.build_contents(user_question, relevant_context, self._guidance_section(guidance))
+                stream = self.chat.send_stream(contents)
+                count_locally = lambda: self.chat.count_tokens(contents)
             else:
-                # Fallback to rule-based optimization
-                guidance = self.optimizer.generate_length_guidance(
-                    user_question, 
-                    self.conversation_history
+                full_prompt = self._build_prompt(user_question, relevant_context, guidance)
+                stream = self.model.generate_content(full_prompt, stream=True)
+                count_locally = lambda: self.memory.token_counter.count(full_prompt)
+            
+            # Stream the response
+            parts = []
+            for chunk in stream:
+                text = self._chunk_text(chunk)
+                if not text:
+                    continue
+                if first_token_time is None:
+                    first_token_time = time.perf_counter()
+                parts.append(text)
+                yield text
+            
+            self.last_prompt_tokens, token_source = prompt_token_count(stream, count_locally)
+            self.last_cached_tokens = cached_token_count(stream)
+            # In chat mode a count of 0 cached means Gemini did not serve the persona from its cache
+            logger.info(f"Prompt: {self.last_prompt_tokens} tokens ({token_source})"
+                       f"{f', {self.last_cached_tokens} cached' if self.chat is not None or self.last_cached_tokens else ''}")
+            
+            oppenheimer_response = "".join(parts).strip()
+            if oppenheimer_response:
+                self.last_response = self._finish_response(
+                    user_question, oppenheimer_response, guidance, query_embedding, start_time
                 )
-                guidance['optimization_source'] = 'rule_based'
+            else:
+                self.last_response = "I'm afraid I cannot formulate a proper response at this moment. Perhaps you could rephrase your question?"
+                yield self.last_response
+                
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            self.last_response = "I find myself unable to respond clearly at this moment. The weight of memory sometimes clouds my thoughts."
+            yield self.last_response
+        finally:
+            total_ms = (time.perf_counter() - start_time) * 1000
+            first_token_ms = (first_token_time - start_time) * 1000 if first_token_time else None
+            self.last_turn_timings = {
+                'first_token_ms': first_token_ms,
+                'total_ms': total_ms,
+                'stages': self.last_stage_timings
+            }
+            logger.info(f"Turn timing ({source}): first token "
+                       f"{f'{first_token_ms:.0f} ms' if first_token_ms is not None else 'n/a'}, "
+                       f"total {total_ms:.0f} ms")
+    
+    @staticmethod
+    def _chunk_text(chunk):
+        """Text of a streamed chunk; chunks without text parts (e.g. safety stops) give ''."""
+        try:
+            return chunk.text
+        except ValueError:
+            return ""
+    
+    def _run_stages(self, user_question, query_embedding):
+        """
+        Retrieve context and decide length guidance, concurrently when enabled.
+        
+        The AI optimizer starts at once, on the question and conversation history
+        (and the retrieved context only if retrieval has already finished), and
+        its Gemini call is bounded by OPTIMIZATION_CONFIG["length_guidance_deadline"].
+        If the guidance is not ready that many seconds after the optimizer
+        started, or fails, the rule-based guidance is used.
+        """
+        def retrieve():
+            return self.rag.get_relevant_context(user_question, query_embedding=query_embedding)
+        
+        if not (self.use_ai_optimization and self.ai_length_optimizer):
+            return retrieve(), self._rule_based_guidance(user_question)
+        
+        # The local predictor answers in well under a millisecond; no need for a thread
+        if not OPTIMIZATION_CONFIG["parallel_stages"] or isinstance(self.ai_length_optimizer, LengthPredictor):
+            relevant_context = retrieve()
+            try:
+                guidance = self._get_length_guidance(user_question, relevant_context)
+            except Exception as e:
+                logger.warning(f"Length guidance failed, using rule-based guidance: {e}")
+                guidance = self._rule_based_guidance(user_question)
+            return relevant_context, guidance
+        
+        deadline = OPTIMIZATION_CONFIG["length_guidance_deadline"]
+        retrieved = Future()
+        
+        def retrieval_stage():
+            try:
+                relevant_context = retrieve()
+            except Exception as e:
+                retrieved.set_exception(e)
+                raise
+            retrieved.set_result(relevant_context)
+            return relevant_context
+        
+        def length_guidance_stage():
+            relevant_context = ""
+            if retrieved.done() and retrieved.exception() is None:
+                relevant_context = retrieved.result()
+            return self._get_length_guidance(user_question, relevant_context, timeout=deadline)
+        
+        results, timings = self.stage_executor.run(
+            {
+                'retrieval': retrieval_stage,
+                'length_guidance': length_guidance_stage,
+            },
+            deadlines={'length_guidance': deadline},
+            fallbacks={'length_guidance': lambda: self._rule_based_guidance(user_question)},
+        )
+        self.last_stage_timings = timings
+        logger.info(f"Stages: {format_timings(timings)}")
+        return results['retrieval'], results['length_guidance']
+    
+    def _rule_based_guidance(self, user_question):
+        """Rule-based length guidance from the ResponseOptimizer."""
+        guidance = self.optimizer.generate_length_guidance(
+            user_question, 
+            self.conversation_history
+        )
+        guidance['optimization_source'] = 'rule_based'
+        return guidance
+    
+    def _get_length_guidance(self, user_question, relevant_context, timeout=None):
+        """Length and detail guidance, from the AI optimizer when available."""
+        # Use AI-powered length optimization if available
+        if self.use_ai_optimization and self.ai_length_optimizer:
+            # Only the Gemini optimizer makes a call worth bounding
+            options = {'timeout': timeout} if timeout is not None else {}
+            ai_guidance = self.ai_length_optimizer.analyze_optimal_length(
+                user_question, 
+                relevant_context, 
+                self.conversation_history,
+                **options
+            )
             
-            # Build conversation history context
-            history_context = self._build_history_context()
+            # The heuristic the optimizer falls back to (e.g. on a decision cache miss) is rule-based
+            source = ai_guidance.get('optimization_source', 'ai_powered')
+            if source not in AI_GUIDANCE_SOURCES:
+                source = 'rule_based'
             
-            # Create the full prompt with length guidance
-            optimization_note = ""
-            if guidance['optimization_source'] == 'ai_powered':
-                optimization_note = f"IMPORTANT: An AI system has analyzed this query and determined the optimal response length is {guidance['min_length']}-{guidance['max_length']} characters for maximum information density and user engagement. Please aim for this length range while providing a complete, natural response."
+            # Convert AI guidance to standard format
+            guidance = {
+                'response_type': self.optimizer.classify_query(user_question),
+                'min_length': ai_guidance['optimal_min_length'],
+                'max_length': ai_guidance['optimal_max_length'],
+                'detail_level': ai_guidance['response_type'].lower(),
+                'guidance': ai_guidance['reasoning'],
+                'estimated_cost': ai_guidance['estimated_cost'],
+                'optimization_source': source
+            }
             
-            full_prompt = f"""{self.system_prompt}
-
-RESPONSE GUIDANCE:
+            logger.info(f"AI optimization: {ai_guidance['response_type']} "
+                       f"({guidance['min_length']}-{guidance['max_length']} chars, "
+                       f"${guidance['estimated_cost']:.4f}, {ai_guidance.get('optimization_source')})")
+        else:
+            # Fallback to rule-based optimization
+            guidance = self._rule_based_guidance(user_question)
+        return guidance
+    
+    def _guidance_section(self, guidance):
+        """The response guidance part of a prompt or chat message."""
+        optimization_note = ""
+        if guidance['optimization_source'] in AI_GUIDANCE_SOURCES:
+            optimization_note = f"IMPORTANT: An AI system has analyzed this query and determined the optimal response length is {guidance['min_length']}-{guidance['max_length']} characters for maximum information density and user engagement. Please aim for this length range while providing a complete, natural response."
+        
+        return f"""RESPONSE GUIDANCE:
 - Target length: {guidance['min_length']}-{guidance['max_length']} characters
 - Detail level: {guidance['detail_level']}
 - Specific guidance: {guidance['guidance']}
-{optimization_note}
+{optimization_note}"""
+    
+    def _build_prompt(self, user_question, relevant_context, guidance):
+        """Create the full prompt with length guidance."""
+        # Build conversation history context
+        history_context = self._build_history_context()
+        
+        return f"""{self.system_prompt}
+
+{self._guidance_section(guidance)}
 
 RELEVANT KNOWLEDGE CONTEXT:
 {relevant_context}
@@ -174,75 +472,92 @@ CONVERSATION HISTORY:
 USER QUESTION: {user_question}
 
 Please respond as J. Robert Oppenheimer, following the response guidance above. Draw from your knowledge, experiences, and the provided context. Maintain your characteristic speaking style, philosophical depth, and historical perspective. Provide complete, thoughtful responses - do not end mid-sentence or add trailing dots. Ensure your response feels natural and complete within the target length range, giving the user a full and satisfying answer."""
-
-            # Generate response
-            response = self.model.generate_content(full_prompt)
-            
-            if response and response.text:
-                oppenheimer_response = response.text.strip()
-                
-                # Only apply truncation if not using AI optimization or response is excessively long
-                if guidance['optimization_source'] == 'ai_powered':
-                    # AI has already optimized the prompt for ideal length, trust it more
-                    if len(oppenheimer_response) > guidance['max_length'] * 1.5:
-                        # Only truncate if extremely over target (50% over)
-                        oppenheimer_response = self.optimizer.optimize_for_tts(
-                            oppenheimer_response, 
-                            guidance['max_length']
-                        )
-                else:
-                    # Rule-based optimization needs more aggressive truncation
-                    if len(oppenheimer_response) > guidance['max_length'] * 1.2:
-                        oppenheimer_response = self.optimizer.optimize_for_tts(
-                            oppenheimer_response, 
-                            guidance['max_length']
-                        )
-                
-                # Update usage tracking
-                self.optimizer.update_usage(len(oppenheimer_response))
-                
-                # Add to conversation history
-                self.conversation_history.append({
-                    'user': user_question,
-                    'oppenheimer': oppenheimer_response,
-                    'timestamp': datetime.now().isoformat(),
-                    'length': len(oppenheimer_response),
-                    'type': guidance.get('response_type', 'unknown'),
-                    'estimated_cost': guidance['estimated_cost'],
-                    'optimization_source': guidance['optimization_source']
-                })
-                
-                # Keep only last 5 exchanges to manage context length
-                if len(self.conversation_history) > 5:
-                    self.conversation_history = self.conversation_history[-5:]
-                
-                logger.info(f"Generated {guidance.get('detail_level', 'unknown')} response: "
-                           f"{len(oppenheimer_response)} chars, "
-                           f"${guidance['estimated_cost']:.4f} estimated cost "
-                           f"({guidance['optimization_source']})")
-                
-                return oppenheimer_response
-            else:
-                return "I'm afraid I cannot formulate a proper response at this moment. Perhaps you could rephrase your question?"
-                
-        except Exception as e:
-            logger.error(f"Error generating response: {e}")
-            return "I find myself unable to respond clearly at this moment. The weight of memory sometimes clouds my thoughts."
     
-    def _build_history_context(self):
-        """Build context from recent conversation history."""
-        if not self.conversation_history:
-            return "This is the beginning of our conversation."
+    def _finish_response(self, user_question, oppenheimer_response, guidance, query_embedding, start_time):
+        """Trim an over-long answer for TTS, then record usage, history and the cache entry."""
+        # Only apply truncation if not using AI optimization or response is excessively long
+        if guidance['optimization_source'] in AI_GUIDANCE_SOURCES:
+            # AI has already optimized the prompt for ideal length, trust it more
+            if len(oppenheimer_response) > guidance['max_length'] * 1.5:
+                # Only truncate if extremely over target (50% over)
+                oppenheimer_response = self.optimizer.optimize_for_tts(
+                    oppenheimer_response, 
+                    guidance['max_length']
+                )
+        else:
+            # Rule-based optimization needs more aggressive truncation
+            if len(oppenheimer_response) > guidance['max_length'] * 1.2:
+                oppenheimer_response = self.optimizer.optimize_for_tts(
+                    oppenheimer_response, 
+                    guidance['max_length']
+                )
+        
+        # Update usage tracking
+        self.optimizer.update_usage(len(oppenheimer_response))
+        
+        self._record_exchange(user_question, oppenheimer_response, guidance)
+        
+        if self.response_cache is not None and query_embedding is not None:
+            self.last_cache_key = self.response_cache.store(
+                user_question,
+                query_embedding,
+                oppenheimer_response,
+                (time.perf_counter() - start_time) * 1000
+            )
+        
+        logger.info(f"Generated {guidance.get('detail_level', 'unknown')} response: "
+                   f"{len(oppenheimer_response)} chars, "
+                   f"${guidance['estimated_cost']:.4f} estimated cost "
+                   f"({guidance['optimization_source']})")
+        
+        return oppenheimer_response
+    
+    def _record_exchange(self, user_question, oppenheimer_response, guidance):
+        """Add an exchange to the conversation history."""
+        self.conversation_history.append({
+            'user': user_question,
+            'oppenheimer': oppenheimer_response,
+            'timestamp': datetime.now().isoformat(),
+            'length': len(oppenheimer_response),
+            'type': guidance.get('response_type', 'unknown'),
+            'estimated_cost': guidance['estimated_cost'],
+            'optimization_source': guidance['optimization_source']
+        })
+        
+        self.memory.add(self.conversation_history[-1])
         
-        history_parts = []
-        for exchange in self.conversation_history[-3:]:  # Last 3 exchanges
-            history_parts.append(f"User asked: {exchange['user']}")
-            history_parts.append(f"You responded: {exchange['oppenheimer'][:200]}...")
+        # The optimizers only look at the latest exchanges; the prompt history is self.memory
+        max_history = RESPONSE_CONFIG["max_conversation_history"]
+        if len(self.conversation_history) > max_history:
+            self.conversation_history = self.conversation_history[-max_history:]
+    
+    def _build_history_context(self):
+        """Conversation history for the prompt, bounded by the memory's token budgets."""
+        return self.memory.context()
+    
+    def _summarize_history(self, summary, older_exchanges, token_budget):
+        """Fold older exchanges into the running conversation summary (runs in the background)."""
+        prompt = f"""You keep a running summary of a conversation between a visitor and J. Robert Oppenheimer, so that he can remember it later.
+
+CURRENT SUMMARY:
+{summary or "(none yet)"}
+
+EXCHANGES TO ADD:
+{older_exchanges}
+
+Write the updated summary in under {int(token_budget * 0.75)} words, as plain prose addressed to Oppenheimer ("The visitor asked ... you said ..."). Keep the topics discussed, the visitor's interests and anything he committed to or revealed; drop wording and detail. Reply with the summary only."""
         
-        return "\n".join(history_parts)
+        response = self.model.generate_content(prompt)
+        return response.text if response and response.text else ""
     
-    def get_introduction(self):
-        """Get Oppenheimer's introduction when first meeting someone."""
+    def get_introduction(self, fallback=True):
+        """
+        Get Oppenheimer's introduction when first meeting someone.
+        
+        Args:
+            fallback (bool): Return a stock introduction if Gemini fails;
+                otherwise return None.
+        """
         intro_prompt = f"""{self.system_prompt}
 
 Please introduce yourself as J. Robert Oppenheimer to someone you're meeting for the first time. Keep it brief but characteristic of your personality and speaking style."""
@@ -252,10 +567,10 @@ Please introduce yourself as J. Robert Oppenheimer to someone you're meeting for
             if response and response.text:
                 return response.text.strip()
             else:
-                return "I am J. Robert Oppenheimer. Perhaps you know me as the man who helped bring atomic fire to this world."
+                return DEFAULT_INTRODUCTION if fallback else None
         except Exception as e:
             logger.error(f"Error generating introduction: {e}")
-            return "I am J. Robert Oppenheimer, theoretical physicist and, I suppose, the man who helped to change the world forever."
+            return "I am J. Robert Oppenheimer, theoretical physicist and, I suppose, the man who helped to change the world forever." if fallback else None
 
 def test_persona():
     """Test the Oppenheimer persona with sample questions."""
@@ -0,0 +1,210 @@
+import os
+import re
+import json
+import atexit
+import time
+import threading
+import hashlib
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+def normalize_query(query):
+    """Normalize a query so trivially different phrasings share a cache entry."""
+    query = re.sub(r'\s+', ' ', query.lower()).strip()
+    return query.rstrip('?!. ')
+
+def embedding_key(embedding):
+    """Stable hash of an embedding vector, usable as a cache key."""
+    vector = np.asarray(embedding, dtype=np.float32)
+    return hashlib.sha1(vector.tobytes()).hexdigest()
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU cache with optional TTL and hit/miss counters."""
+
+    # Clock for entry ages; monotonic, so only meaningful within this process
+    _now = staticmethod(time.monotonic)
+
+    def __init__(self, max_size=256, ttl_seconds=None):
+        """
+        Args:
+            max_size (int): Maximum number of entries before the least recently
+                used one is evicted.
+            ttl_seconds (float): Entries older than this are treated as misses.
+                None disables expiry.
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+
+            value, stored_at = item
+            if self.ttl_seconds is not None and self._now() - stored_at > self.ttl_seconds:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = (value, self._now())
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_stats(self):
+        """Get hit/miss/eviction counters and the current hit rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+class PersistentLRUCache(LRUCache):
+    """
+    LRUCache kept in a JSON file, so entries survive restarts.
+
+    Keys must be strings and values JSON-serializable. Entry ages use wall-clock
+    time so the TTL keeps counting while the process is down. Puts are written
+    in batches, like the response cache's usage: the file is rewritten
+    atomically once flush_puts puts are pending or flush_seconds have passed
+    since the last write, and at exit. Reads only reorder the in-memory LRU.
+    """
+
+    _now = staticmethod(time.time)
+
+    def __init__(self, path, max_size=256, ttl_seconds=None, flush_puts=20, flush_seconds=60.0):
+        """
+        Args:
+            path (str): JSON file holding the entries.
+            max_size (int): Maximum number of entries.
+            ttl_seconds (float): Entry lifetime; None disables expiry.
+            flush_puts (int): Pending puts that trigger a write.
+            flush_seconds (float): Age of the last write after which a put triggers a write.
+        """
+        super().__init__(max_size, ttl_seconds)
+        self.path = path
+        self.flush_puts = flush_puts
+        self.flush_seconds = flush_seconds
+        self._pending_puts = 0
+        self._saved_at = time.monotonic()
+        self._load()
+        atexit.register(self.flush)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                entries = json.load(file)["entries"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Discarding unreadable cache file {self.path}: {e}")
+            return
+        now = self._now()
+        # Entries are stored least recently used first
+        for key, value, stored_at in entries[-self.max_size:]:
+            if self.ttl_seconds is None or now - stored_at <= self.ttl_seconds:
+                self._data[key] = (value, stored_at)
+
+    def save(self):
+        with self._lock:
+            entries = [[key, value, stored_at] for key, (value, stored_at) in self._data.items()]
+            self._pending_puts = 0
+            self._saved_at = time.monotonic()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump({"entries": entries}, file)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save cache file {self.path}: {e}")
+
+    def put(self, key, value):
+        super().put(key, value)
+        with self._lock:
+            self._pending_puts += 1
+            due = (self._pending_puts >= self.flush_puts
+                   or time.monotonic() - self._saved_at >= self.flush_seconds)
+        if due:
+            self.save()
+
+    def flush(self):
+        """Write pending puts to the file."""
+        with self._lock:
+            pending = self._pending_puts
+        if pending:
+            self.save()
+
+    def clear(self):
+        super().clear()
+        self.save()
+
+class RetrievalCache:
+    """
+    Two-level cache for knowledge base retrieval.
+
+    Level one maps a normalized query to its embedding. Level two maps
+    (embedding, n_results, collection version) to the search results, and is
+    cleared whenever the collection version moves on.
+    """
+
+    def __init__(self, max_size=256, ttl_seconds=3600, results_max_size=256):
+        self.embeddings = LRUCache(max_size, ttl_seconds)
+        self.results = LRUCache(results_max_size, ttl_seconds)
+        self._version = None
+        self._version_lock = threading.Lock()
+
+    def check_version(self, version):
+        """Drop cached results if the collection changed since they were stored."""
+        with self._version_lock:
+            if version != self._version:
+                if self._version is not None:
+                    logger.info("Knowledge base changed, clearing retrieval result cache")
+                self.results.clear()
+                self._version = version
+
+    def get_stats(self):
+        return {
+            "embeddings": self.embeddings.get_stats(),
+            "results": self.results.get_stats(),
+        }
@@ -1,12 +1,16 @@
 import os
-import chromadb
-from chromadb.utils import embedding_functions
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.docstore.document import Document
-import google.generativeai as genai
+import copy
 from dotenv import load_dotenv
 import logging
-import torch
+import threading
+import weakref
+from model_registry import get_registry
+from knowledge_indexer import KnowledgeBaseIndexer, KnowledgeBaseWatcher
+from config import RAG_CONFIG
+from query_cache import RetrievalCache, normalize_query, embedding_key
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from vector_store import NumpyVectorStore
+from context_packer import ContextPacker
 
 # Load environment variables
 load_dotenv()
@@ -15,115 +19,572 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Set PyTorch to use CPU by default to avoid device issues
-# torch.set_default_device('cpu')
+# chromadb, langchain, genai and sentence-transformers (which pulls in torch)
+# are imported where they are first used, so importing this module stays cheap.
+
+CHROMA_PATH = "./chroma_db"
+NUMPY_INDEX_PATH = "./vector_index"
+COLLECTION_NAME = "oppenheimer_knowledge"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_DIMENSION = 384
+MANIFEST_FILE = "kb_manifest.json"
+LEXICAL_INDEX_FILE = "bm25_index.json"
+KNOWLEDGE_FILES = [
+    'knowledge_base/oppenheimer_biography.txt',
+    'knowledge_base/oppenheimer_quotes.txt',
+    'knowledge_base/historical_context.txt'
+]
+
+NO_CONTEXT_MESSAGE = "I don't have specific information about that topic in my knowledge base."
+
+RETRIEVAL_MODES = ("vector", "hybrid", "lexical")
+VECTOR_BACKENDS = ("chroma", "numpy")
+EMBEDDING_BACKENDS = ("onnx", "torch")
+
+def _create_onnx_embedding_function():
+    from onnx_embedder import OnnxEmbeddingFunction
+    return OnnxEmbeddingFunction(
+        quantize=RAG_CONFIG["embedding_quantize"],
+        num_threads=RAG_CONFIG["embedding_threads"]
+    )
+
+def _create_torch_embedding_function():
+    from chromadb.utils import embedding_functions
+    return embedding_functions.SentenceTransformerEmbeddingFunction(
+        model_name=EMBEDDING_MODEL_NAME,
+        device="cpu"  # Force CPU to avoid device issues
+    )
+
+def _create_embedding_function(backend=None):
+    """
+    Create the embedding function used for both indexing and querying.
+    
+    Both backends run EMBEDDING_MODEL_NAME, so falling back from one to the
+    other never mixes embedding spaces; if neither loads, this raises instead
+    of switching to a different model.
+    """
+    backend = backend or RAG_CONFIG["embedding_backend"]
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    loaders = {
+        "onnx": _create_onnx_embedding_function,
+        "torch": _create_torch_embedding_function,
+    }
+    
+    errors = []
+    for name in [backend] + [other for other in EMBEDDING_BACKENDS if other != backend]:
+        try:
+            function = loaders[name]()
+            logger.info(f"Embedding with {EMBEDDING_MODEL_NAME} on the {name} backend")
+            return function
+        except Exception as e:
+            logger.warning(f"Failed to initialize the {name} embedding backend: {e}")
+            errors.append(f"{name}: {e}")
+    raise RuntimeError(f"No embedding backend could load {EMBEDDING_MODEL_NAME} ({'; '.join(errors)})")
+
+def embedder_id():
+    """
+    Identity of the configured embedder, recorded with indexes and trained predictors.
+    
+    The torch model and the float32 ONNX export run the same weights, and their
+    embeddings agree to float rounding (see benchmark_embeddings.py), so they
+    share an id and either can serve an index built by the other. Int8
+    quantization only approximates them, so it gets an id of its own.
+    """
+    if RAG_CONFIG["embedding_quantize"]:
+        return f"{EMBEDDING_MODEL_NAME}-int8"
+    return EMBEDDING_MODEL_NAME
+
+def _create_text_splitter():
+    """Create the chunker; only called when a knowledge base file needs re-indexing."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200,
+        length_function=len,
+    )
+
+class _DeferredEmbeddingFunction:
+    """
+    Embedding function that only loads the shared embedding model when it is
+    first called, so lexical-only retrieval never pays for the model.
+    
+    Its identity (embedder_id() and dimension) is known without loading the
+    model, so indexes can be checked against it up front; the model that
+    loads is checked against it too.
+    """
+    
+    dimension = EMBEDDING_DIMENSION
+    
+    def __init__(self, registry, model_key):
+        self.embedder_id = embedder_id()
+        self._registry = registry
+        self._model_key = model_key
+        self._function = None
+        self._lock = threading.Lock()
+    
+    @property
+    def is_loaded(self):
+        return self._function is not None
+    
+    @property
+    def runtime(self):
+        """The backend actually serving embeddings, once loaded."""
+        if self._function is None:
+            return None
+        return getattr(self._function, "runtime", "torch")
+    
+    def __call__(self, input):
+        if self._function is None:
+            with self._lock:
+                if self._function is None:
+                    function = self._registry.acquire(self._model_key, _create_embedding_function)
+                    self._check_loaded(function)
+                    self._function = function
+        return self._function(input)
+    
+    def _check_loaded(self, function):
+        """Raise if the loaded model is not the embedder the indexes were checked against."""
+        embedding = function(["dimension check"])[0]
+        quantized = getattr(function, "runtime", "torch") == "onnx-int8"
+        error = None
+        if len(embedding) != self.dimension:
+            error = f"Embedding model returned {len(embedding)} dimensions, expected {self.dimension}"
+        elif quantized != self.embedder_id.endswith("-int8"):
+            # e.g. int8 configured but quantization failed, or only torch could load
+            error = (f"Embedding model loaded on the {getattr(function, 'runtime', 'torch')} runtime, "
+                     f"which does not match the configured embedder {self.embedder_id}")
+        if error:
+            self._registry.release(self._model_key)
+            raise ValueError(error)
+
+def _embedder_metadata(embedding_function):
+    """Collection metadata recording which embedder the index was built with."""
+    return {
+        "embedder": embedding_function.embedder_id,
+        "embedding_dimension": embedding_function.dimension,
+    }
+
+def _stored_dimension(collection):
+    """Dimension of the vectors already in a collection, or None if it is empty."""
+    sample = collection.get(limit=1, include=["embeddings"])
+    embeddings = sample.get("embeddings")
+    if embeddings is None or len(embeddings) == 0:
+        return None
+    return len(embeddings[0])
+
+def _check_embedder(collection, embedding_function, index_dir):
+    """
+    Verify that a collection was built with the current embedder.
+    
+    Indexes from before the embedder was recorded are stamped with it if
+    their stored vectors have the expected dimension. Any mismatch raises, so
+    queries are never embedded into a different space than the index.
+    """
+    expected = _embedder_metadata(embedding_function)
+    metadata = dict(collection.metadata or {})
+    recorded = {key: metadata.get(key) for key in expected}
+    if recorded == expected:
+        return
+    
+    if all(value is None for value in recorded.values()):
+        dimension = _stored_dimension(collection)
+        if dimension is None or dimension == expected["embedding_dimension"]:
+            metadata.update(expected)
+            # Chroma rejects distance-function keys in modify(); they are fixed at creation
+            collection.modify(metadata={
+                key: value for key, value in metadata.items() if not key.startswith("hnsw:")
+            })
+            logger.info(f"Recorded embedder {expected['embedder']} in the index metadata")
+            return
+        recorded = {"embedder": "unknown", "embedding_dimension": dimension}
+    
+    raise ValueError(
+        f"The index in {index_dir} was built with {recorded['embedder']} "
+        f"({recorded['embedding_dimension']} dimensions), but queries are embedded with "
+        f"{expected['embedder']} ({expected['embedding_dimension']} dimensions). "
+        f"Delete {index_dir} to rebuild it with the current embedder."
+    )
+
+def _rebuild_lexical_index(lexical_index, collection, indexer, path):
+    """Rebuild and persist the BM25 index from the chunks in the collection."""
+    existing = collection.get(include=["documents", "metadatas"])
+    lexical_index.build(
+        existing["ids"],
+        existing["documents"],
+        existing["metadatas"],
+        fingerprint=indexer.fingerprint()
+    )
+    lexical_index.save(path)
+    logger.info(f"Built lexical index over {len(existing['ids'])} chunks")
+
+def _release_resources(registry, resource_keys):
+    """Release shared resources held by a RAG instance."""
+    for key in resource_keys:
+        registry.release(key)
 
 class OppenheimerRAG:
-    def __init__(self):
-        """Initialize the RAG system for Oppenheimer knowledge base."""
+    def __init__(self, backend=None):
+        """
+        Initialize the RAG system for Oppenheimer knowledge base.
+        
+        Args:
+            backend (str): Vector store, "chroma" or "numpy" (memory-mapped exact
+                search). Defaults to RAG_CONFIG["vector_backend"].
+        """
+        self.backend = backend or RAG_CONFIG["vector_backend"]
+        if self.backend not in VECTOR_BACKENDS:
+            raise ValueError(f"Unknown vector backend: {self.backend}")
+        self.index_dir = CHROMA_PATH if self.backend == "chroma" else NUMPY_INDEX_PATH
+        self.lexical_index_path = os.path.join(self.index_dir, LEXICAL_INDEX_FILE)
+        
         # Configure Gemini API
+        import google.generativeai as genai
         genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
         
-        # Initialize ChromaDB
-        self.client = chromadb.PersistentClient(path="./chroma_db")
+        # Heavy resources are shared process-wide; this instance only holds references
+        self._registry = get_registry()
+        self._resource_keys = []
+        self._release = weakref.finalize(self, _release_resources, self._registry, self._resource_keys)
         
-        # Use Sentence Transformers embedding function with device handling
-        try:
-            self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-                model_name="all-MiniLM-L6-v2",
-                device="cpu"  # Force CPU to avoid device issues
+        # The model itself is only loaded on the first embedding call
+        self.embedding_function = self._acquire(
+            f"embedding:{EMBEDDING_MODEL_NAME}",
+            lambda: _DeferredEmbeddingFunction(
+                self._registry,
+                f"embedding_model:{EMBEDDING_MODEL_NAME}:cpu"
             )
-        except Exception as e:
-            logger.warning(f"Failed to initialize sentence transformer: {e}")
-            # Fallback to default embedding function
-            self.embedding_function = embedding_functions.DefaultEmbeddingFunction()
+        )
         
-        # Create or get collection
-        try:
-            self.collection = self.client.get_collection(
-                name="oppenheimer_knowledge",
-                embedding_function=self.embedding_function
+        # Initialize ChromaDB (not needed at all by the numpy backend)
+        self.client = None
+        if self.backend == "chroma":
+            self.client = self._acquire(
+                f"chroma_client:{CHROMA_PATH}",
+                self._create_chroma_client
             )
-            logger.info("Loaded existing knowledge base")
-        except:
-            self.collection = self.client.create_collection(
-                name="oppenheimer_knowledge",
-                embedding_function=self.embedding_function
+        
+        self.collection = self._acquire(
+            f"collection:{self.backend}:{self.index_dir}:{COLLECTION_NAME}",
+            self._open_collection
+        )
+        
+        # Incremental, hash-based indexing of the knowledge base files
+        self.indexer = self._acquire(
+            f"kb_indexer:{self.backend}:{self.index_dir}",
+            self._create_indexer
+        )
+        
+        # BM25 index over the same chunks, for hybrid and lexical-only retrieval
+        self.lexical_index = self._acquire(
+            f"lexical_index:{self.lexical_index_path}",
+            self._create_lexical_index
+        )
+        
+        # Query embedding and result caches, shared by all sessions
+        self.cache = self._acquire(
+            f"retrieval_cache:{self.backend}:{self.index_dir}",
+            lambda: RetrievalCache(
+                max_size=RAG_CONFIG["query_cache_size"],
+                ttl_seconds=RAG_CONFIG["query_cache_ttl_seconds"],
+                results_max_size=RAG_CONFIG["results_cache_size"]
+            )
+        )
+        
+        # Token-budgeted context packing; the tokenizer is loaded once per process
+        self.context_packer = self._acquire(
+            "context_packer",
+            lambda: ContextPacker(
+                token_budget=RAG_CONFIG["context_token_budget"],
+                relevance_cutoff=RAG_CONFIG["relevance_cutoff"],
+                mmr_lambda=RAG_CONFIG["mmr_lambda"],
+                duplicate_threshold=RAG_CONFIG["duplicate_threshold"]
             )
-            logger.info("Created new knowledge base")
-            self._load_knowledge_base()
+        )
+        self.last_context_stats = None
+        self.context_tokens_saved = 0
+        self.context_tokens_added = 0
     
-    def _load_knowledge_base(self):
-        """Load and process all knowledge base files."""
-        knowledge_files = [
-            'knowledge_base/oppenheimer_biography.txt',
-            'knowledge_base/oppenheimer_quotes.txt',
-            'knowledge_base/historical_context.txt'
-        ]
+    def _acquire(self, key, loader):
+        """Take a reference to a shared resource, remembering it for release."""
+        resource = self._registry.acquire(key, loader)
+        self._resource_keys.append(key)
+        return resource
+    
+    def _create_chroma_client(self):
+        import chromadb
+        return chromadb.PersistentClient(path=CHROMA_PATH)
+    
+    def _open_collection(self):
+        """Open the vector store for the configured backend, creating it if needed."""
+        if self.backend == "numpy":
+            logger.info(f"Opening memory-mapped vector index at {self.index_dir}")
+            collection = NumpyVectorStore(
+                self.index_dir,
+                self.embedding_function,
+                compression=RAG_CONFIG["vector_compression"],
+                projection_dim=RAG_CONFIG["projection_dim"],
+                rescore_candidates=RAG_CONFIG["rescore_candidates"]
+            )
+        else:
+            try:
+                collection = self.client.get_collection(
+                    name=COLLECTION_NAME,
+                    embedding_function=self.embedding_function
+                )
+                logger.info("Loaded existing knowledge base")
+            except:
+                collection = self.client.create_collection(
+                    name=COLLECTION_NAME,
+                    embedding_function=self.embedding_function,
+                    metadata=_embedder_metadata(self.embedding_function)
+                )
+                logger.info("Created new knowledge base")
         
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
+        _check_embedder(collection, self.embedding_function, self.index_dir)
+        return collection
+    
+    def _create_indexer(self):
+        """Create the incremental indexer, sync it once and optionally watch for edits."""
+        indexer = KnowledgeBaseIndexer(
+            self.collection,
+            KNOWLEDGE_FILES,
+            os.path.join(self.index_dir, MANIFEST_FILE),
+            _create_text_splitter
         )
+        self.indexer = indexer
+        self._load_knowledge_base()
         
-        for file_path in knowledge_files:
-            if os.path.exists(file_path):
-                logger.info(f"Processing {file_path}")
-                
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    content = file.read()
-                
-                # Split text into chunks
-                chunks = text_splitter.split_text(content)
-                
-                # Add chunks to ChromaDB
-                for i, chunk in enumerate(chunks):
-                    doc_id = f"{file_path}_{i}"
-                    metadata = {
-                        "source": file_path,
-                        "chunk_id": i,
-                        "file_type": file_path.split('/')[-1].replace('.txt', '')
-                    }
-                    
-                    self.collection.add(
-                        documents=[chunk],
-                        metadatas=[metadata],
-                        ids=[doc_id]
-                    )
-                
-                logger.info(f"Added {len(chunks)} chunks from {file_path}")
-    
-    def search_knowledge(self, query, n_results=5):
-        """Search the knowledge base for relevant information."""
-        try:
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results
+        if RAG_CONFIG["watch_knowledge_base"]:
+            watcher = KnowledgeBaseWatcher(
+                indexer.sync,
+                KNOWLEDGE_FILES,
+                interval=RAG_CONFIG["watch_interval_seconds"]
             )
+            watcher.start()
+            indexer.watcher = watcher
+        return indexer
+    
+    def _create_lexical_index(self):
+        """Load the persisted BM25 index, rebuilding it if the chunks changed."""
+        path = self.lexical_index_path
+        lexical_index = BM25Index.load(path)
+        if lexical_index is None or lexical_index.fingerprint != self.indexer.fingerprint():
+            lexical_index = BM25Index()
+            _rebuild_lexical_index(lexical_index, self.collection, self.indexer, path)
+        else:
+            logger.info("Loaded existing lexical index")
+        
+        # Keep it current whenever the knowledge base is re-indexed
+        collection, indexer = self.collection, self.indexer
+        self.indexer.add_listener(
+            lambda: _rebuild_lexical_index(lexical_index, collection, indexer, path)
+        )
+        return lexical_index
+    
+    def close(self):
+        """Release this instance's references to the shared resources."""
+        self._release()
+    
+    def _load_knowledge_base(self):
+        """Embed new or changed knowledge base chunks and drop removed ones."""
+        return self.indexer.sync()
+    
+    def sync_knowledge_base(self):
+        """Apply edits to the knowledge base files without restarting."""
+        return self._load_knowledge_base()
+    
+    def embed_query(self, query):
+        """
+        Embed a query, reusing the cached embedding for repeated questions.
+        
+        Later stages should call this instead of embedding the text themselves.
+        """
+        return self.embed_queries([query])[0]
+    
+    def embed_queries(self, queries):
+        """Embed several queries, running all cache misses through one encoder call."""
+        keys = [normalize_query(query) for query in queries]
+        embeddings = [self.cache.embeddings.get(key) for key in keys]
+        
+        # Each distinct uncached query is embedded once, in a single batch
+        missing = {}
+        for query, key, embedding in zip(queries, keys, embeddings):
+            if embedding is None and key not in missing:
+                missing[key] = query
+        if missing:
+            batch = self.embedding_function(list(missing.values()))
+            computed = {key: list(vector) for key, vector in zip(missing, batch)}
+            for key, embedding in computed.items():
+                self.cache.embeddings.put(key, embedding)
+            embeddings = [
+                embedding if embedding is not None else computed[key]
+                for key, embedding in zip(keys, embeddings)
+            ]
+        return embeddings
+    
+    def search_knowledge(self, query, n_results=5, query_embedding=None, mode=None):
+        """
+        Search the knowledge base for relevant information.
+        
+        Args:
+            query (str): The user's question.
+            n_results (int): Number of chunks to return.
+            query_embedding (list): Precomputed embedding of the query, if available.
+            mode (str): "vector" (dense only), "hybrid" (BM25 and dense fused by
+                reciprocal rank) or "lexical" (BM25 only, no embedding model).
+                Defaults to RAG_CONFIG["retrieval_mode"].
+        """
+        query_embeddings = [query_embedding] if query_embedding is not None else None
+        return self.search_knowledge_many([query], n_results, query_embeddings, mode)[0]
+    
+    def search_knowledge_many(self, queries, n_results=5, query_embeddings=None, mode=None):
+        """
+        Search the knowledge base for several queries at once.
+        
+        Uncached queries are embedded in one batched encoder call and sent to
+        Chroma as a single multi-query request.
+        
+        Args:
+            queries (list): The questions to search for.
+            n_results (int): Number of chunks to return per query.
+            query_embeddings (list): Precomputed embeddings aligned with queries.
+            mode (str): Retrieval mode, as for search_knowledge.
+        
+        Returns:
+            list: One result list per query, in input order.
+        """
+        mode = mode or RAG_CONFIG["retrieval_mode"]
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        if not queries:
+            return []
+        
+        try:
+            # Read once, so every result of this call is cached under the version it was searched at
+            version = self.indexer.version
+            self.cache.check_version(version)
+            if mode != "lexical" and query_embeddings is None:
+                query_embeddings = self.embed_queries(queries)
+            
+            results = [None] * len(queries)
+            cache_keys = []
+            for i, query in enumerate(queries):
+                if mode == "lexical":
+                    cache_key = (mode, normalize_query(query), n_results, version)
+                else:
+                    cache_key = (mode, embedding_key(query_embeddings[i]), normalize_query(query),
+                                 n_results, version)
+                cache_keys.append(cache_key)
+                cached = self.cache.results.get(cache_key)
+                if cached is not None:
+                    results[i] = copy.deepcopy(cached)
+            
+            pending = [i for i, result in enumerate(results) if result is None]
+            if not pending:
+                return results
             
-            if results['documents'] and results['documents'][0]:
-                relevant_docs = []
-                for i, doc in enumerate(results['documents'][0]):
-                    metadata = results['metadatas'][0][i] if results['metadatas'] else {}
+            if mode == "lexical":
+                computed = [self._lexical_search(queries[i], n_results) for i in pending]
+            elif mode == "hybrid":
+                candidates = max(n_results, RAG_CONFIG["hybrid_candidates"])
+                vector_hits = self._vector_search_many(
+                    [query_embeddings[i] for i in pending], candidates
+                )
+                computed = [
+                    reciprocal_rank_fusion(
+                        [hits, self._lexical_search(queries[i], candidates)],
+                        k=RAG_CONFIG["rrf_k"]
+                    )[:n_results]
+                    for i, hits in zip(pending, vector_hits)
+                ]
+            else:
+                computed = self._vector_search_many(
+                    [query_embeddings[i] for i in pending], n_results
+                )
+            
+            for i, relevant_docs in zip(pending, computed):
+                self.cache.results.put(cache_keys[i], copy.deepcopy(relevant_docs))
+                results[i] = relevant_docs
+            return results
+            
+        except Exception as e:
+            logger.error(f"Search error: {e}")
+            return [[] for _ in queries]
+    
+    def _vector_search_many(self, query_embeddings, n_results):
+        """Dense nearest-neighbour search in the vector store, one round trip."""
+        results = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results
+        )
+        
+        all_docs = []
+        for q in range(len(query_embeddings)):
+            relevant_docs = []
+            if results['documents'] and results['documents'][q]:
+                for i, doc in enumerate(results['documents'][q]):
+                    metadata = results['metadatas'][q][i] if results['metadatas'] else {}
                     relevant_docs.append({
+                        'id': results['ids'][q][i],
                         'content': doc,
                         'metadata': metadata,
-                        'distance': results['distances'][0][i] if results['distances'] else None
+                        'distance': results['distances'][q][i] if results['distances'] else None
                     })
-                return relevant_docs
-            return []
-            
-        except Exception as e:
-            logger.error(f"Search error: {e}")
-            return []
+            all_docs.append(relevant_docs)
+        return all_docs
     
-    def get_relevant_context(self, query, max_context_length=3000):
+    def _lexical_search(self, query, n_results):
+        """BM25 keyword search; exact names and dates score highly here."""
+        return [
+            dict(hit, distance=None)
+            for hit in self.lexical_index.search(query, n_results)
+        ]
+    
+    def get_cache_stats(self):
+        """Get hit, miss and eviction counters for the retrieval caches."""
+        return self.cache.get_stats()
+    
+    def get_relevant_context(self, query, max_context_length=3000, query_embedding=None):
         """Get relevant context for a query, formatted for the LLM."""
-        search_results = self.search_knowledge(query, n_results=5)
+        search_results = self.search_knowledge(
+            query, n_results=self._context_candidates(), query_embedding=query_embedding
+        )
+        return self._build_context(search_results, max_context_length)
+    
+    def get_relevant_context_many(self, queries, max_context_length=3000):
+        """Get formatted LLM context for several queries, searched as one batch."""
+        return [
+            self._build_context(search_results, max_context_length)
+            for search_results in self.search_knowledge_many(queries, n_results=self._context_candidates())
+        ]
+    
+    def _context_candidates(self):
+        # The packer merges and de-duplicates, so it starts from a wider pool
+        return RAG_CONFIG["context_candidates"] if RAG_CONFIG["pack_context"] else 5
+    
+    def _build_context(self, search_results, max_context_length):
+        """Turn search results into LLM context with the token packer or by character count."""
+        if not RAG_CONFIG["pack_context"]:
+            return self._format_context(search_results, max_context_length)
+        if not search_results:
+            return NO_CONTEXT_MESSAGE
         
+        # The character-count packer over the same candidates is the baseline for savings
+        baseline = self._format_context(search_results, max_context_length)
+        context, stats = self.context_packer.pack(search_results, baseline_context=baseline)
+        self.last_context_stats = stats
+        self.context_tokens_saved += stats["tokens_saved"]
+        self.context_tokens_added += stats["tokens_added"]
+        logger.info(f"Packed context: {stats['prompt_tokens']} tokens "
+                    f"({stats['tokens_saved']} saved, {stats['tokens_added']} added, {stats['merged_chunks']} merged, "
+                    f"{stats['dropped_duplicates']} duplicates dropped)")
+        return context or NO_CONTEXT_MESSAGE
+    
+    def _format_context(self, search_results, max_context_length):
+        """Pack search results into a context string of bounded length."""
         if not search_results:
-            return "I don't have specific information about that topic in my knowledge base."
+            return NO_CONTEXT_MESSAGE
         
         context_parts = []
         total_length = 0
@@ -142,21 +603,20 @@ class OppenheimerRAG:
         
         return "\n\n".join(context_parts)
 
+TEST_QUERIES = [
+    "What did Oppenheimer say about the Trinity test?",
+    "Tell me about Oppenheimer's childhood and education",
+    "What was Oppenheimer's role in the Manhattan Project?",
+    "What did Oppenheimer think about the hydrogen bomb?"
+]
+
 def test_rag_system():
     """Test the RAG system with sample queries."""
     rag = OppenheimerRAG()
     
-    test_queries = [
-        "What did Oppenheimer say about the Trinity test?",
-        "Tell me about Oppenheimer's childhood and education",
-        "What was Oppenheimer's role in the Manhattan Project?",
-        "What did Oppenheimer think about the hydrogen bomb?"
-    ]
-    
-    for query in test_queries:
+    for query, context in zip(TEST_QUERIES, rag.get_relevant_context_many(TEST_QUERIES)):
         print(f"\nQuery: {query}")
         print("=" * 50)
-        context = rag.get_relevant_context(query)
         print(f"Context: {context[:200]}...")
         print()
 
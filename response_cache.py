@@ -0,0 +1,394 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from lexical_index import tokenize
+from query_cache import normalize_query
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads in this process are serialized
+    fcntl = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 1
+ENTRIES_FILE = "entries.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+AUDIO_DIR = "audio"
+LOCK_FILE = ".lock"
+EVICTION_POLICIES = ("lru", "lfu")
+# Hit counts and last-used times are written in batches, not on every hit
+USAGE_FLUSH_HITS = 20
+USAGE_FLUSH_SECONDS = 60.0
+
+# Words that point back at earlier turns ("what happened after that?",
+# "tell me more") and leading connectives that continue a previous question
+_FOLLOW_UP_PATTERN = re.compile(
+    r"\b(it|its|that|this|these|those|they|them|their|he|him|his|she|her|there|then|"
+    r"also|else|more|again|another|same|earlier|before|previous|previously|said|mentioned)\b"
+    r"|^\s*(and|but|so|or|what about|how about)\b",
+    re.IGNORECASE
+)
+
+def is_context_independent(query, min_terms=2):
+    """
+    Whether a question can be answered without the conversation so far.
+
+    Follow-ups that refer back to earlier turns, or that are too short to
+    stand alone, must never be served a cached answer given in another context.
+    """
+    if _FOLLOW_UP_PATTERN.search(query):
+        return False
+    return len(tokenize(query)) >= min_terms
+
+class SemanticResponseCache:
+    """
+    Persistent cache of persona answers (and their synthesized audio), looked
+    up by query embedding similarity.
+
+    Only context-independent questions are stored or served. Entries live in
+    a directory (entries.json, an embedding matrix and audio copies) guarded
+    by a file lock, so several processes share one cache; each process
+    reloads the files when another one has changed them.
+    """
+
+    def __init__(self, path, similarity_threshold=0.85, max_size=100, policy="lru"):
+        """
+        Args:
+            path (str): Directory holding the cache.
+            similarity_threshold (float): Minimum cosine similarity between a
+                question and a cached one to reuse its answer.
+            max_size (int): Maximum number of cached answers.
+            policy (str): Eviction policy, "lru" or "lfu".
+        """
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.path = path
+        self.similarity_threshold = similarity_threshold
+        self.max_size = max_size
+        self.policy = policy
+        self.entries_path = os.path.join(path, ENTRIES_FILE)
+        self.embeddings_path = os.path.join(path, EMBEDDINGS_FILE)
+        self.audio_dir = os.path.join(path, AUDIO_DIR)
+        os.makedirs(self.audio_dir, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._loaded_signature = None
+        self.entries = []
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        # Hits not yet written: key -> [hit count, last used]
+        self._usage = {}
+        self._usage_flushed = time.monotonic()
+
+        # Statistics for this process
+        self.lookups = 0
+        self.hits = 0
+        self.skipped = 0
+        self.latency_saved_ms = 0.0
+
+        with self._locked():
+            self._refresh_if_changed()
+
+    @contextmanager
+    def _locked(self):
+        """Serialize access across threads and, where supported, processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.path, LOCK_FILE), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.entries_path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _refresh_if_changed(self):
+        """Reload the cache files if another process has written them."""
+        signature = self._signature()
+        if signature == self._loaded_signature:
+            return
+        entries, matrix = [], np.zeros((0, 0), dtype=np.float32)
+        if signature is not None:
+            try:
+                with open(self.entries_path, "r", encoding="utf-8") as file:
+                    data = json.load(file)
+                if data.get("version") == CACHE_FORMAT_VERSION:
+                    entries = data["entries"]
+                    if entries:
+                        matrix = np.load(self.embeddings_path)
+                if matrix.shape[0] != len(entries):
+                    raise ValueError("embedding rows do not match entries")
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Discarding unreadable response cache: {e}")
+                entries, matrix = [], np.zeros((0, 0), dtype=np.float32)
+        self.entries, self._matrix = entries, matrix
+        self._loaded_signature = signature
+
+    def _write(self, embeddings=True):
+        """Atomically replace the embedding matrix (if it changed), then the entry file."""
+        if embeddings and self.entries:
+            embeddings_tmp = f"{self.embeddings_path}.tmp.npy"
+            np.save(embeddings_tmp, self._matrix.astype(np.float32, copy=False))
+            os.replace(embeddings_tmp, self.embeddings_path)
+        entries_tmp = f"{self.entries_path}.tmp"
+        with open(entries_tmp, "w", encoding="utf-8") as file:
+            json.dump({"version": CACHE_FORMAT_VERSION, "entries": self.entries}, file)
+        os.replace(entries_tmp, self.entries_path)
+        self._loaded_signature = self._signature()
+
+    def _apply_usage(self):
+        """Merge this process's unwritten hits into the entries, before they are written."""
+        for entry in self.entries:
+            usage = self._usage.get(entry["key"])
+            if usage:
+                entry["hits"] += usage[0]
+                entry["last_used"] = max(entry["last_used"], usage[1])
+        self._usage.clear()
+        self._usage_flushed = time.monotonic()
+
+    def flush_usage(self):
+        """Write hit counts and last-used times recorded since the last write."""
+        with self._locked():
+            if not self._usage:
+                return
+            self._refresh_if_changed()
+            self._apply_usage()
+            self._write(embeddings=False)
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    @staticmethod
+    def _key(query):
+        return hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+
+    def _best_match(self, vector):
+        if not self.entries or self._matrix.shape[1] != vector.shape[0]:
+            return None, 0.0
+        similarities = self._matrix @ vector
+        best = int(np.argmax(similarities))
+        return best, float(similarities[best])
+
+    def _audio_path(self, entry):
+        if not entry.get("audio"):
+            return None
+        path = os.path.join(self.audio_dir, entry["audio"])
+        return path if os.path.exists(path) else None
+
+    def lookup(self, query, embedding):
+        """
+        Find a cached answer to a question.
+
+        Args:
+            query (str): The user's question.
+            embedding: The question's embedding.
+
+        Returns:
+            Optional[Dict]: key, query, response, audio_path (None if no audio
+                is cached) and similarity of the best match, or None on a miss
+                or for a context-dependent question.
+        """
+        if not is_context_independent(query):
+            with self._lock:
+                self.skipped += 1
+            return None
+
+        vector = self._normalize(embedding)
+        with self._locked():
+            self._refresh_if_changed()
+            self.lookups += 1
+            best, similarity = self._best_match(vector)
+            if best is None or similarity < self.similarity_threshold:
+                return None
+
+            entry = self.entries[best]
+            usage = self._usage.setdefault(entry["key"], [0, 0.0])
+            usage[0] += 1
+            usage[1] = time.time()
+            pending_hits = sum(hits for hits, _ in self._usage.values())
+            if pending_hits >= USAGE_FLUSH_HITS or time.monotonic() - self._usage_flushed >= USAGE_FLUSH_SECONDS:
+                self._apply_usage()
+                self._write(embeddings=False)
+
+            audio_path = self._audio_path(entry)
+            self.hits += 1
+            self.latency_saved_ms += entry["generation_ms"]
+            if audio_path:
+                self.latency_saved_ms += entry.get("synthesis_ms") or 0.0
+            logger.info(f"Response cache hit ({similarity:.3f}) for: {query}")
+            return {
+                "key": entry["key"],
+                "query": entry["query"],
+                "response": entry["response"],
+                "audio_path": audio_path,
+                "similarity": similarity,
+            }
+
+    def store(self, query, embedding, response, generation_ms):
+        """
+        Cache the answer to a context-independent question.
+
+        Returns:
+            Optional[str]: The entry key, for attaching audio later, or None if
+                the question depends on the conversation and was not cached.
+        """
+        if not is_context_independent(query):
+            return None
+
+        vector = self._normalize(embedding)
+        key = self._key(query)
+        now = time.time()
+        with self._locked():
+            self._refresh_if_changed()
+            self._apply_usage()
+            positions = {entry["key"]: i for i, entry in enumerate(self.entries)}
+            if key in positions:
+                self._remove(positions[key])
+
+            self.entries.append({
+                "key": key,
+                "query": query,
+                "response": response,
+                "audio": None,
+                "hits": 0,
+                "created": now,
+                "last_used": now,
+                "generation_ms": generation_ms,
+                "synthesis_ms": None,
+            })
+            self._matrix = (
+                np.vstack([self._matrix, vector[None, :]]) if self._matrix.size else vector[None, :]
+            )
+            while len(self.entries) > self.max_size:
+                self._remove(self._eviction_candidate())
+            self._write()
+        return key
+
+    def add_audio(self, key, audio, synthesis_ms, extension=".wav"):
+        """
+        Store synthesized audio in the cache next to the answer it speaks.
+
+        Args:
+            key (str): The entry key returned by store().
+            audio: Audio bytes, or the path of an audio file to copy.
+            synthesis_ms (float): How long synthesis took.
+            extension (str): File extension for audio bytes (".wav", ".ogg").
+
+        Returns:
+            Optional[str]: The cached audio path, or None if the entry is gone.
+        """
+        is_path = isinstance(audio, str)
+        with self._locked():
+            self._refresh_if_changed()
+            self._apply_usage()
+            entry = next((entry for entry in self.entries if entry["key"] == key), None)
+            if entry is None or (is_path and not os.path.exists(audio)):
+                return None
+            if is_path:
+                extension = os.path.splitext(audio)[1] or extension
+            filename = f"{key}{extension}"
+            cached_path = os.path.join(self.audio_dir, filename)
+            tmp_path = f"{cached_path}.tmp"
+            if is_path:
+                shutil.copyfile(audio, tmp_path)
+            else:
+                with open(tmp_path, "wb") as file:
+                    file.write(audio)
+            os.replace(tmp_path, cached_path)
+            if entry.get("audio") and entry["audio"] != filename:
+                try:
+                    os.remove(os.path.join(self.audio_dir, entry["audio"]))
+                except OSError:
+                    pass
+            entry["audio"] = filename
+            entry["synthesis_ms"] = synthesis_ms
+            self._write(embeddings=False)
+            return cached_path
+
+    def _eviction_candidate(self):
+        if self.policy == "lfu":
+            return min(range(len(self.entries)),
+                       key=lambda i: (self.entries[i]["hits"], self.entries[i]["last_used"]))
+        return min(range(len(self.entries)), key=lambda i: self.entries[i]["last_used"])
+
+    def _remove(self, position):
+        entry = self.entries.pop(position)
+        self._matrix = np.delete(self._matrix, position, axis=0)
+        if entry.get("audio"):
+            try:
+                os.remove(os.path.join(self.audio_dir, entry["audio"]))
+            except OSError:
+                pass
+
+    def clear(self):
+        """Remove every cached answer and its audio."""
+        with self._locked():
+            self._refresh_if_changed()
+            while self.entries:
+                self._remove(len(self.entries) - 1)
+            self._usage.clear()
+            self._write()
+
+    def get_stats(self):
+        """Hit rate and latency saved by this process, and the shared cache size."""
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "max_size": self.max_size,
+                "policy": self.policy,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "skipped_follow_ups": self.skipped,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "latency_saved_ms": self.latency_saved_ms,
+            }
+
+def test_response_cache():
+    """Exercise the cache with synthetic embeddings."""
+    import tempfile
+
+    directory = tempfile.mkdtemp(prefix="response_cache_")
+    try:
+        cache = SemanticResponseCache(directory, similarity_threshold=0.85, max_size=2)
+        rng = np.random.default_rng(0)
+        trinity = rng.normal(size=384)
+
+        cache.store("What do you remember about the Trinity test?", trinity, "It was a sunrise.", 2400.0)
+        logger.info(f"Near-duplicate: {cache.lookup('What do you remember of the Trinity test?', trinity + 0.1)}")
+        logger.info(f"Follow-up: {cache.lookup('What happened after that?', trinity)}")
+        logger.info(f"Unrelated: {cache.lookup('Describe Göttingen physics', rng.normal(size=384))}")
+
+        # A second instance sees the same entries through the files
+        other = SemanticResponseCache(directory, max_size=2)
+        logger.info(f"Other process sees {len(other.entries)} entries")
+        cache.flush_usage()
+        other.flush_usage()
+        other._refresh_if_changed()
+        logger.info(f"Hits after flushing: {[entry['hits'] for entry in other.entries]}")
+        logger.info(f"Stats: {cache.get_stats()}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    test_response_cache()
@@ -1,8 +1,11 @@
 import re
 import logging
+from functools import lru_cache
 from typing import Dict, Tuple, List
 from enum import Enum
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
 class ResponseType(Enum):
@@ -14,39 +17,200 @@ class ResponseType(Enum):
     SCIENTIFIC_EXPLANATION = "scientific" # Technical details
     GREETING = "greeting"                # Introduction/casual
 
+# Keyword groups that indicate each response type; a query scores one point
+# per whole-word occurrence of a keyword, per group
+RESPONSE_KEYWORDS = {
+    ResponseType.SIMPLE_FACT: [
+        ('when', 'where', 'who', 'what year', 'how old', 'born', 'died'),
+        ('yes questions', 'no questions'),
+        ('name', 'date', 'location')
+    ],
+    ResponseType.PHILOSOPHICAL: [
+        ('think', 'feel', 'believe', 'philosophy', 'moral', 'ethics', 'regret'),
+        ('bhagavad', 'gita', 'meaning', 'purpose', 'responsibility'),
+        ('why', 'should', 'ought', 'right', 'wrong')
+    ],
+    ResponseType.HISTORICAL_NARRATIVE: [
+        ('tell me about', 'describe', 'what happened', 'story', 'experience'),
+        ('trinity', 'los alamos', 'manhattan project', 'bomb', 'war'),
+        ('relationship', 'worked with', 'knew')
+    ],
+    ResponseType.PERSONAL_REFLECTION: [
+        ('how did you feel', 'personal', 'private', 'family', 'emotions'),
+        ('guilt', 'pride', 'fear', 'hope', 'regret', 'memory')
+    ],
+    ResponseType.SCIENTIFIC_EXPLANATION: [
+        ('physics', 'quantum', 'nuclear', 'atoms', 'science', 'theory'),
+        ('explain', 'how does', 'mechanism', 'process')
+    ],
+    ResponseType.GREETING: [
+        ('hello', 'hi', 'who are you', 'introduce', 'meet')
+    ]
+}
+
+# Keyword groups of simple (short answer) and complex (long answer) questions
+SIMPLE_KEYWORDS = [
+    ('when', 'where', 'who', 'what year', 'how old', 'born', 'died'),
+    ('yes', 'no'),
+    ('name', 'date', 'location')
+]
+COMPLEX_KEYWORDS = [
+    ('why', 'how', 'explain', 'describe', 'tell me about'),
+    ('relationship', 'experience', 'thoughts', 'feelings', 'philosophy'),
+    ('compare', 'contrast', 'difference', 'similar')
+]
+
+# Complexity indicators that are not keywords
+_SINGLE_WORD_QUESTION = re.compile(r'^(who|what|when|where)\s+\w+\s*\?*$')
+_WHAT_WAS_LIKE = re.compile(r'\bwhat was.*like\b')
+_MULTIPLE_QUESTIONS = re.compile(r'\?.*\?')
+
+def _keyword_pattern(keywords: Tuple[str, ...]) -> str:
+    return r'\b(' + '|'.join(re.escape(keyword) for keyword in keywords) + r')\b'
+
+def _trie_pattern(keywords) -> str:
+    """
+    Alternation of keywords with shared prefixes factored out ("wh(?:en|ere|o...)").
+    
+    The regex engine then rejects most positions after one character instead
+    of trying every keyword, and greedy optional suffixes still prefer the
+    longest keyword ("who are you" over "who").
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return '(?:' + body + ')?' if '' in node else body
+    
+    return build(trie)
+
+class QueryClassifier:
+    """
+    Scores queries against every response type and both complexity classes
+    in a single regex scan.
+
+    All keywords are compiled into one prefix-factored alternation, and each
+    keyword maps to a precomputed row of points: the matches every keyword
+    group finds inside it, so "how did you feel" also counts "how" and "feel".
+    Score columns are the ResponseTypes in RESPONSE_KEYWORDS order, then
+    'simple' and 'complex'.
+    """
+    
+    def __init__(self):
+        self.response_types = list(RESPONSE_KEYWORDS)
+        self.simple_column = len(self.response_types)
+        self.complex_column = self.simple_column + 1
+        
+        groups = [(column, group) for column, response_type in enumerate(self.response_types)
+                  for group in RESPONSE_KEYWORDS[response_type]]
+        groups += [(self.simple_column, group) for group in SIMPLE_KEYWORDS]
+        groups += [(self.complex_column, group) for group in COMPLEX_KEYWORDS]
+        
+        keywords = sorted({keyword for _, group in groups for keyword in group})
+        group_patterns = [(column, re.compile(_keyword_pattern(group))) for column, group in groups]
+        self._rows = {keyword: row for row, keyword in enumerate(keywords)}
+        self._points = np.zeros((len(keywords) + 1, self.complex_column + 1), dtype=np.int32)
+        for keyword, row in self._rows.items():
+            for column, pattern in group_patterns:
+                self._points[row, column] += len(pattern.findall(keyword))
+        # A whitespace-delimited "and" joins several questions into one
+        self._conjunction_row = len(keywords)
+        self._points[self._conjunction_row, self.complex_column] = 1
+        # Sparse (column, points) pairs per row, for scoring a single query without NumPy overhead
+        self._sparse_points = [
+            [(int(column), int(points[column])) for column in np.flatnonzero(points)] for points in self._points
+        ]
+        
+        self._scanner = re.compile(
+            r'\b(?P<keyword>' + _trie_pattern(keywords) + r')\b'
+            r'|(?<=\s)(?P<conjunction>and)(?=\s)'
+        )
+    
+    def _row(self, match) -> int:
+        if match.lastgroup == 'conjunction':
+            return self._conjunction_row
+        return self._rows[match.group()]
+    
+    def _structural_points(self, query: str, query_lower: str) -> Tuple[int, int]:
+        """Simple and complex points from sentence shape and length."""
+        simple = 1 if _SINGLE_WORD_QUESTION.search(query_lower) else 0
+        complex_points = len(_WHAT_WAS_LIKE.findall(query_lower)) + len(_MULTIPLE_QUESTIONS.findall(query_lower))
+        if len(query) > 100:
+            complex_points += 1
+        elif len(query) < 20:
+            simple += 1
+        return simple, complex_points
+    
+    def score(self, query: str) -> np.ndarray:
+        """Score one query; returns one row of points."""
+        query_lower = query.lower()
+        scores = [0] * self._points.shape[1]
+        for match in self._scanner.finditer(query_lower):
+            for column, points in self._sparse_points[self._row(match)]:
+                scores[column] += points
+        simple, complex_points = self._structural_points(query, query_lower)
+        scores[self.simple_column] += simple
+        scores[self.complex_column] += complex_points
+        return np.array(scores, dtype=np.int32)
+    
+    def score_many(self, queries: List[str]) -> np.ndarray:
+        """Score many queries with one scan over all of them; returns one row per query."""
+        lowered = [query.lower() for query in queries]
+        # NUL is neither a word nor a whitespace character, so matches cannot span queries
+        text = '\0'.join(lowered)
+        starts = np.cumsum([0] + [len(query) + 1 for query in lowered[:-1]])
+        
+        matches = list(self._scanner.finditer(text))
+        scores = np.zeros((len(queries), self._points.shape[1]), dtype=np.int32)
+        if matches:
+            positions = np.fromiter((match.start() for match in matches), dtype=np.int64, count=len(matches))
+            rows = np.fromiter((self._row(match) for match in matches), dtype=np.int64, count=len(matches))
+            np.add.at(scores, np.searchsorted(starts, positions, side='right') - 1, self._points[rows])
+        
+        structural = np.array(
+            [self._structural_points(query, query_lower) for query, query_lower in zip(queries, lowered)],
+            dtype=np.int32
+        ).reshape(len(queries), 2)
+        scores[:, self.simple_column:] += structural
+        return scores
+    
+    def response_type(self, scores: np.ndarray) -> ResponseType:
+        """Highest scoring type (first on ties), or HISTORICAL_NARRATIVE if nothing matched."""
+        type_scores = scores[:self.simple_column].tolist()
+        best = max(type_scores)
+        if best == 0:
+            return ResponseType.HISTORICAL_NARRATIVE
+        return self.response_types[type_scores.index(best)]
+    
+    def complexity(self, scores: np.ndarray) -> str:
+        """'simple', 'complex' or 'medium' from the two complexity columns."""
+        simple, complex_points = scores[self.simple_column:self.complex_column + 1].tolist()
+        if complex_points > simple:
+            return 'complex'
+        elif simple > complex_points:
+            return 'simple'
+        else:
+            return 'medium'
+
+@lru_cache(maxsize=1)
+def get_query_classifier() -> QueryClassifier:
+    """The process-wide classifier; its patterns are compiled once."""
+    return QueryClassifier()
+
 class ResponseOptimizer:
     """Optimizes response length and detail based on query type and context."""
     
     def __init__(self):
-        # Keywords that indicate different response types
-        self.response_patterns = {
-            ResponseType.SIMPLE_FACT: [
-                r'\b(when|where|who|what year|how old|born|died)\b',
-                r'\b(yes|no)\b questions',
-                r'\b(name|date|location)\b'
-            ],
-            ResponseType.PHILOSOPHICAL: [
-                r'\b(think|feel|believe|philosophy|moral|ethics|regret)\b',
-                r'\b(bhagavad|gita|meaning|purpose|responsibility)\b',
-                r'\b(why|should|ought|right|wrong)\b'
-            ],
-            ResponseType.HISTORICAL_NARRATIVE: [
-                r'\b(tell me about|describe|what happened|story|experience)\b',
-                r'\b(trinity|los alamos|manhattan project|bomb|war)\b',
-                r'\b(relationship|worked with|knew)\b'
-            ],
-            ResponseType.PERSONAL_REFLECTION: [
-                r'\b(how did you feel|personal|private|family|emotions)\b',
-                r'\b(guilt|pride|fear|hope|regret|memory)\b'
-            ],
-            ResponseType.SCIENTIFIC_EXPLANATION: [
-                r'\b(physics|quantum|nuclear|atoms|science|theory)\b',
-                r'\b(explain|how does|mechanism|process)\b'
-            ],
-            ResponseType.GREETING: [
-                r'\b(hello|hi|who are you|introduce|meet)\b'
-            ]
-        }
+        # Keyword scanner shared by every optimizer in the process
+        self.classifier = get_query_classifier()
         
         # Target lengths for different response types (in characters)
         self.target_lengths = {
@@ -65,67 +229,32 @@ class ResponseOptimizer:
     
     def classify_query(self, query: str) -> ResponseType:
         """Classify the query to determine appropriate response type."""
-        query_lower = query.lower()
-        
-        # Score each response type
-        scores = {}
-        for response_type, patterns in self.response_patterns.items():
-            score = 0
-            for pattern in patterns:
-                matches = len(re.findall(pattern, query_lower))
-                score += matches
-            scores[response_type] = score
-        
-        # Return the highest scoring type, default to HISTORICAL_NARRATIVE
-        if max(scores.values()) == 0:
-            return ResponseType.HISTORICAL_NARRATIVE
-        
-        return max(scores, key=scores.get)
+        return self.classifier.response_type(self.classifier.score(query))
     
     def _analyze_query_complexity(self, query: str) -> str:
         """Analyze query complexity to determine appropriate response length."""
-        query_lower = query.lower()
-        
-        # Simple questions (short answers needed)
-        simple_indicators = [
-            r'\b(when|where|who|what year|how old|born|died)\b',
-            r'\b(yes|no)\b',
-            r'\b(name|date|location)\b',
-            r'^(who|what|when|where)\s+\w+\s*\?*$'  # Single word questions
-        ]
-        
-        # Complex questions (longer answers needed)
-        complex_indicators = [
-            r'\b(why|how|explain|describe|tell me about|what was.*like)\b',
-            r'\b(relationship|experience|thoughts|feelings|philosophy)\b',
-            r'\b(compare|contrast|difference|similar)\b',
-            r'\s+and\s+',  # Multiple questions joined with "and"
-            r'\?.*\?'      # Multiple question marks
-        ]
-        
-        simple_score = sum(len(re.findall(pattern, query_lower)) for pattern in simple_indicators)
-        complex_score = sum(len(re.findall(pattern, query_lower)) for pattern in complex_indicators)
-        
-        # Length-based complexity
-        if len(query) > 100:
-            complex_score += 1
-        elif len(query) < 20:
-            simple_score += 1
-            
-        if complex_score > simple_score:
-            return 'complex'
-        elif simple_score > complex_score:
-            return 'simple'
-        else:
-            return 'medium'
+        return self.classifier.complexity(self.classifier.score(query))
+    
+    def classify_many(self, queries: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score a batch of queries, e.g. from a request log, in one scan.
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Type scores (one column per
+                ResponseType, in self.classifier.response_types order) and
+                complexity scores (columns 'simple', 'complex'), one row per query.
+        """
+        scores = self.classifier.score_many(queries)
+        return scores[:, :self.classifier.simple_column], scores[:, self.classifier.simple_column:]
     
     def generate_length_guidance(self, query: str, conversation_history: List = None) -> Dict:
         """Generate guidance for response length and detail level."""
-        response_type = self.classify_query(query)
+        scores = self.classifier.score(query)
+        response_type = self.classifier.response_type(scores)
         min_length, max_length = self.target_lengths[response_type]
         
         # Analyze query complexity for smarter length adjustment
-        query_complexity = self._analyze_query_complexity(query)
+        query_complexity = self.classifier.complexity(scores)
         
         # Adjust based on query complexity
         if query_complexity == 'simple':
@@ -7,20 +7,29 @@ This handles the streamlit command and provides helpful error messages.
 import subprocess
 import sys
 import os
+from importlib import metadata
 from pathlib import Path
 
+# Distributions the app needs; checked through package metadata so that
+# nothing is imported just to find out whether it is installed
+REQUIRED_DISTRIBUTIONS = ["streamlit", "google-generativeai", "chromadb"]
+
 def check_dependencies():
     """Check if required dependencies are installed."""
-    try:
-        import streamlit
-        import google.generativeai
-        import chromadb
-        print("✓ All required dependencies found")
-        return True
-    except ImportError as e:
-        print(f"✗ Missing dependency: {e}")
+    missing = []
+    for name in REQUIRED_DISTRIBUTIONS:
+        try:
+            metadata.version(name)
+        except metadata.PackageNotFoundError:
+            missing.append(name)
+    
+    if missing:
+        print(f"✗ Missing dependency: {', '.join(missing)}")
         print("Run: pip install -r requirements.txt")
         return False
+    
+    print("✓ All required dependencies found")
+    return True
 
 def check_environment():
     """Check if environment variables are set."""
@@ -0,0 +1,137 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class StageExecutor:
+    """
+    Runs the independent stages of a turn concurrently on a shared thread pool.
+
+    Each stage is a zero-argument callable. A stage may have a deadline
+    (seconds after the stage itself started running) and a fallback: if it has
+    not finished by then, or raises, the fallback's result is used instead. A
+    stage still waiting for a worker when its deadline has passed is cancelled
+    without running; one already running is left to finish and its result is
+    discarded.
+
+    Every run reports per-stage timings (start/end offsets, duration, status)
+    and the critical path, the stage whose result arrived last.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="turn-stage")
+
+    def run(self, stages, deadlines=None, fallbacks=None):
+        """
+        Run stages concurrently and wait for all of them (or their fallbacks).
+
+        Args:
+            stages (Dict[str, Callable]): Stage name to callable.
+            deadlines (Dict[str, float]): Seconds to wait for a stage once it is
+                running (and at most as long again for it to start).
+            fallbacks (Dict[str, Callable]): Used when a stage misses its deadline
+                or fails; stages without one re-raise their exception.
+
+        Returns:
+            Tuple[Dict[str, Any], Dict]: Results by stage name, and timings with
+                a 'stages' entry per stage plus 'critical_path' and 'total_ms'.
+        """
+        deadlines = deadlines or {}
+        fallbacks = fallbacks or {}
+        start = time.perf_counter()
+        started = {}
+        finished = {}
+        running = {name: threading.Event() for name in stages}
+
+        def timed(name, function):
+            def call():
+                started[name] = time.perf_counter()
+                running[name].set()
+                try:
+                    return function()
+                finally:
+                    finished[name] = time.perf_counter()
+            return call
+
+        futures = {name: self._pool.submit(timed(name, function)) for name, function in stages.items()}
+
+        results = {}
+        stage_timings = {}
+        for name, future in futures.items():
+            status = "ok"
+            try:
+                timeout = None
+                if name in deadlines:
+                    if not running[name].wait(deadlines[name]):
+                        raise FutureTimeoutError()
+                    timeout = max(0.0, deadlines[name] - (time.perf_counter() - started[name]))
+                results[name] = future.result(timeout=timeout)
+            except FutureTimeoutError:
+                status = "timeout"
+                # Skipped if no worker has picked it up yet
+                future.cancel()
+            except Exception as e:
+                if name not in fallbacks:
+                    raise
+                logger.warning(f"Stage {name} failed, using its fallback: {e}")
+                status = "error"
+
+            if status != "ok":
+                fallback_start = time.perf_counter()
+                results[name] = fallbacks[name]()
+                finished_at = time.perf_counter()
+                stage_timings[name] = {
+                    "start_ms": (started.get(name, fallback_start) - start) * 1000,
+                    "end_ms": (finished_at - start) * 1000,
+                    "status": status,
+                }
+            else:
+                stage_timings[name] = {
+                    "start_ms": (started[name] - start) * 1000,
+                    "end_ms": (finished[name] - start) * 1000,
+                    "status": status,
+                }
+            stage_timings[name]["duration_ms"] = stage_timings[name]["end_ms"] - stage_timings[name]["start_ms"]
+
+        critical_path = max(stage_timings, key=lambda name: stage_timings[name]["end_ms"]) if stage_timings else None
+        timings = {
+            "stages": stage_timings,
+            "critical_path": critical_path,
+            "total_ms": (time.perf_counter() - start) * 1000,
+        }
+        return results, timings
+
+    def shutdown(self):
+        """Stop accepting stages; running ones finish in the background."""
+        self._pool.shutdown(wait=False)
+
+def format_timings(timings):
+    """One-line summary of stage timings for the logs."""
+    parts = [
+        f"{name} {stage['duration_ms']:.0f} ms" + (f" ({stage['status']})" if stage["status"] != "ok" else "")
+        for name, stage in timings["stages"].items()
+    ]
+    return f"{', '.join(parts)}; critical path: {timings['critical_path']} ({timings['total_ms']:.0f} ms)"
+
+def test_stage_executor():
+    """Run a fast stage next to one that misses its deadline."""
+    executor = StageExecutor()
+    results, timings = executor.run(
+        {
+            "retrieval": lambda: time.sleep(0.05) or "context",
+            "length_guidance": lambda: time.sleep(1.0) or "ai guidance",
+        },
+        deadlines={"length_guidance": 0.2},
+        fallbacks={"length_guidance": lambda: "rule-based guidance"},
+    )
+    logger.info(f"Results: {results}")
+    logger.info(f"Timings: {format_timings(timings)}")
+    executor.shutdown()
+
+if __name__ == "__main__":
+    test_stage_executor()
@@ -0,0 +1,360 @@
+import os
+import json
+import threading
+import logging
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNKS_FILE = "chunks.json"
+COMPACT_FILE = "embeddings_int8.npz"
+
+class CompactEmbeddings:
+    """
+    Per-vector-scaled int8 codes of the embeddings, optionally after a PCA
+    projection fitted on the indexed vectors. Used for a cheap first-pass scan
+    whose top candidates are then re-scored exactly in float32.
+    """
+
+    def __init__(self, codes, scales, mean=None, components=None):
+        self.codes = codes
+        self.scales = scales
+        self.mean = mean
+        self.components = components
+
+    @classmethod
+    def fit(cls, matrix, projection_dim=None):
+        """Quantize a float32 matrix, projecting it to projection_dim dimensions first if given."""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        mean = components = None
+        if projection_dim and projection_dim < matrix.shape[1]:
+            mean = matrix.mean(axis=0)
+            # Principal axes of the centered vectors; the rank caps the usable dimensions
+            _, _, vt = np.linalg.svd(matrix - mean, full_matrices=False)
+            components = vt[:projection_dim].astype(np.float32)
+            matrix = (matrix - mean) @ components.T
+
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales = np.maximum(scales, 1e-12).astype(np.float32)
+        codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        return cls(codes, scales, mean, components)
+
+    @property
+    def dimension(self):
+        return self.codes.shape[1]
+
+    @property
+    def nbytes(self):
+        """Bytes scanned per query (codes and scales)."""
+        return self.codes.nbytes + self.scales.nbytes
+
+    def scores(self, queries, block_rows=8192):
+        """
+        Approximate similarity of every stored vector to each query.
+
+        Codes are widened to float32 one block at a time, so the scan never
+        holds a full-precision copy of the matrix. With a projection, the mean
+        term is the same for every stored vector and is dropped, so the scores
+        rank correctly but are not cosines.
+        """
+        if self.components is not None:
+            queries = queries @ self.components.T
+        queries = queries.astype(np.float32)
+        scores = np.empty((queries.shape[0], self.codes.shape[0]), dtype=np.float32)
+        for start in range(0, self.codes.shape[0], block_rows):
+            block = self.codes[start:start + block_rows].astype(np.float32)
+            scores[:, start:start + block_rows] = queries @ block.T
+        return scores * self.scales
+
+    def save(self, path):
+        arrays = {"codes": self.codes, "scales": self.scales}
+        if self.components is not None:
+            arrays.update(mean=self.mean, components=self.components)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(
+                data["codes"], data["scales"],
+                data["mean"] if "mean" in data else None,
+                data["components"] if "components" in data else None
+            )
+
+class NumpyVectorStore:
+    """
+    Exact-search vector store backed by a memory-mapped NumPy matrix.
+
+    Implements the subset of the Chroma collection API that the RAG system and
+    the knowledge base indexer use (get, upsert, update, delete, query, count),
+    so it can replace the Chroma collection as the retrieval backend.
+
+    Embeddings are L2-normalized and stored as one float32 .npy matrix opened
+    with mmap_mode="r", so every process serving the knowledge base shares the
+    same page-cache pages. Chunk text and metadata live in a JSON side file.
+    A query is a single matrix-vector (or matrix-matrix) product.
+
+    With compression="int8" the first pass scans compact int8 codes instead
+    (optionally PCA-projected), and only the best rescore_candidates rows of
+    the float32 matrix are read to re-score them exactly.
+    """
+
+    def __init__(self, path, embedding_function=None, compression=None, projection_dim=None,
+                 rescore_candidates=20):
+        """
+        Args:
+            path (str): Directory holding the embedding matrix and chunk file.
+            embedding_function: Chroma-style callable embedding a list of texts,
+                used when chunks are upserted with documents only.
+            compression (str): None for a float32 scan, or "int8".
+            projection_dim (int): PCA dimensions to keep before int8 quantization.
+            rescore_candidates (int): First-pass candidates re-scored in float32.
+        """
+        if compression not in (None, "int8"):
+            raise ValueError(f"Unknown embedding compression: {compression}")
+        self.path = path
+        self.embedding_function = embedding_function
+        self.compression = compression
+        self.projection_dim = projection_dim
+        self.rescore_candidates = rescore_candidates
+        self.embeddings_path = os.path.join(path, EMBEDDINGS_FILE)
+        self.chunks_path = os.path.join(path, CHUNKS_FILE)
+        self.compact_path = os.path.join(path, COMPACT_FILE)
+        self.compact = None
+        self._lock = threading.RLock()
+        self._loaded_signature = None
+        self._matrix = None
+        self.ids = []
+        self.documents = []
+        self.metadatas = []
+        # Collection-level metadata, like Chroma's collection.metadata
+        self.metadata = None
+        self._positions = {}
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.chunks_path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _load(self):
+        """(Re)open the memory-mapped matrix and the chunk side file."""
+        signature = self._signature()
+        ids, documents, metadatas, matrix, metadata = [], [], [], None, None
+        if signature is not None:
+            with open(self.chunks_path, "r", encoding="utf-8") as file:
+                chunks = json.load(file)
+            ids, documents, metadatas = chunks["ids"], chunks["documents"], chunks["metadatas"]
+            metadata = chunks.get("metadata")
+            if ids:
+                matrix = np.load(self.embeddings_path, mmap_mode="r")
+                if matrix.shape[0] != len(ids):
+                    # Caught another process between its two file replacements;
+                    # keep serving the previous snapshot and retry on the next call
+                    logger.warning("Vector store files are mid-update, keeping previous snapshot")
+                    return
+
+        self._matrix = matrix
+        self.ids, self.documents, self.metadatas = ids, documents, metadatas
+        self.metadata = metadata
+        self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self._loaded_signature = signature
+        self.compact = self._load_compact() if self.compression else None
+
+    def _load_compact(self):
+        """Load the int8 codes matching the current matrix, refitting them if stale."""
+        if self._matrix is None:
+            return None
+        rows, dimension = self._matrix.shape
+        projected = bool(self.projection_dim and self.projection_dim < dimension)
+        expected_dim = min(self.projection_dim, rows, dimension) if projected else dimension
+        compact = CompactEmbeddings.load(self.compact_path)
+        if (compact is None or compact.codes.shape[0] != rows
+                or compact.dimension != expected_dim
+                or (compact.components is not None) != projected):
+            compact = CompactEmbeddings.fit(self._matrix, self.projection_dim)
+            compact.save(self.compact_path)
+        return compact
+
+    def _refresh_if_changed(self):
+        """Pick up writes made by another process since the files were opened."""
+        if self._signature() != self._loaded_signature:
+            self._load()
+
+    def _write(self, matrix=None):
+        """Atomically replace the chunk file (and the matrix, if given), then remap."""
+        if matrix is not None:
+            embeddings_tmp = f"{self.embeddings_path}.tmp.npy"
+            np.save(embeddings_tmp, matrix.astype(np.float32, copy=False))
+            os.replace(embeddings_tmp, self.embeddings_path)
+            if self.compression and len(matrix):
+                # Refit at ingest time so the projection tracks the corpus
+                CompactEmbeddings.fit(matrix, self.projection_dim).save(self.compact_path)
+        # The chunk file is replaced last; readers key their refresh on it
+        chunks_tmp = f"{self.chunks_path}.tmp"
+        with open(chunks_tmp, "w", encoding="utf-8") as file:
+            json.dump({
+                "ids": self.ids,
+                "documents": self.documents,
+                "metadatas": self.metadatas,
+                "metadata": self.metadata,
+            }, file)
+        os.replace(chunks_tmp, self.chunks_path)
+        self._load()
+
+    def _matrix_copy(self, dimension=0):
+        if self._matrix is None:
+            return np.zeros((0, dimension), dtype=np.float32)
+        return np.array(self._matrix, dtype=np.float32)
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def count(self):
+        with self._lock:
+            self._refresh_if_changed()
+            return len(self.ids)
+
+    def get(self, ids=None, where=None, include=None, limit=None):
+        """Fetch chunks by id and/or exact-match metadata filter."""
+        include = include or ["documents", "metadatas"]
+        with self._lock:
+            self._refresh_if_changed()
+            positions = (
+                [self._positions[doc_id] for doc_id in ids if doc_id in self._positions]
+                if ids is not None else range(len(self.ids))
+            )
+            if where:
+                positions = [
+                    i for i in positions
+                    if all(self.metadatas[i].get(key) == value for key, value in where.items())
+                ]
+            positions = list(positions)[:limit]
+            result = {"ids": [self.ids[i] for i in positions]}
+            result["documents"] = [self.documents[i] for i in positions] if "documents" in include else None
+            result["metadatas"] = [self.metadatas[i] for i in positions] if "metadatas" in include else None
+            result["embeddings"] = (
+                [self._matrix[i].tolist() for i in positions] if "embeddings" in include else None
+            )
+            return result
+
+    def modify(self, metadata=None):
+        """Replace the collection-level metadata."""
+        with self._lock:
+            self._refresh_if_changed()
+            self.metadata = dict(metadata) if metadata is not None else None
+            self._write()
+
+    def upsert(self, ids, documents, metadatas, embeddings=None):
+        """Insert or replace chunks, embedding the documents if no vectors are given."""
+        if embeddings is None:
+            embeddings = self.embedding_function(documents)
+        vectors = self._normalize(embeddings)
+
+        with self._lock:
+            self._refresh_if_changed()
+            matrix = self._matrix_copy(vectors.shape[1])
+            new_rows = []
+            for doc_id, document, metadata, vector in zip(ids, documents, metadatas, vectors):
+                position = self._positions.get(doc_id)
+                if position is None:
+                    self._positions[doc_id] = len(self.ids)
+                    self.ids.append(doc_id)
+                    self.documents.append(document)
+                    self.metadatas.append(dict(metadata))
+                    new_rows.append(vector)
+                else:
+                    self.documents[position] = document
+                    self.metadatas[position] = dict(metadata)
+                    matrix[position] = vector
+            if new_rows:
+                matrix = np.vstack([matrix, np.stack(new_rows)])
+            self._write(matrix)
+
+    def update(self, ids, metadatas):
+        """Replace the metadata of existing chunks, keeping their embeddings."""
+        with self._lock:
+            self._refresh_if_changed()
+            for doc_id, metadata in zip(ids, metadatas):
+                position = self._positions.get(doc_id)
+                if position is not None:
+                    self.metadatas[position] = dict(metadata)
+            self._write()
+
+    def delete(self, ids):
+        """Remove chunks by id."""
+        with self._lock:
+            self._refresh_if_changed()
+            doomed = {self._positions[doc_id] for doc_id in ids if doc_id in self._positions}
+            if not doomed:
+                return
+            keep = [i for i in range(len(self.ids)) if i not in doomed]
+            matrix = self._matrix_copy()[keep]
+            self.ids = [self.ids[i] for i in keep]
+            self.documents = [self.documents[i] for i in keep]
+            self.metadatas = [self.metadatas[i] for i in keep]
+            self._write(matrix)
+
+    def query(self, query_embeddings, n_results=10, **_):
+        """
+        Exact top-k search by cosine similarity.
+
+        Returns results in the Chroma layout (one inner list per query), with
+        squared L2 distances between the normalized vectors.
+        """
+        queries = self._normalize(query_embeddings)
+        with self._lock:
+            self._refresh_if_changed()
+            matrix, compact = self._matrix, self.compact
+            ids, documents, metadatas = self.ids, self.documents, self.metadatas
+
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if matrix is None or not ids:
+            for key in result:
+                result[key] = [[] for _ in queries]
+            return result
+
+        k = min(n_results, len(ids))
+        if compact is not None:
+            # Cheap int8 first pass over every chunk for all queries at once
+            first_pass = compact.scores(queries)
+            shortlist_size = min(len(ids), max(k, self.rescore_candidates))
+        else:
+            # One matrix product scores every chunk against every query
+            first_pass = queries @ np.asarray(matrix).T
+
+        for row, query in enumerate(queries):
+            if compact is not None:
+                # Exact float32 re-scoring, reading only the shortlisted rows
+                shortlist = np.argpartition(-first_pass[row], shortlist_size - 1)[:shortlist_size]
+                shortlist.sort()
+                similarities = np.asarray(matrix[shortlist]) @ query
+                candidates = shortlist
+            else:
+                similarities = first_pass[row]
+                candidates = np.arange(len(ids))
+
+            top = np.argpartition(-similarities, k - 1)[:k]
+            top = top[np.argsort(-similarities[top])]
+            order = candidates[top]
+            result["ids"].append([ids[i] for i in order])
+            result["documents"].append([documents[i] for i in order])
+            result["metadatas"].append([metadatas[i] for i in order])
+            result["distances"].append([float(2.0 - 2.0 * similarities[j]) for j in top])
+        return result